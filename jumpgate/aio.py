@@ -0,0 +1,650 @@
+"""asyncio based HTTP/1.1 server for the jumpgate WSGI application.
+
+The event loop owns every connection: it accepts them, parses requests,
+keeps idle keep-alive connections open and writes responses, none of which
+needs a thread. Falcon handlers are synchronous and block on SoftLayer API
+calls, so each request is handed to a bounded thread pool. Thousands of
+connections can be open and queued while only `workers` threads block on
+the API; past `max_pending` queued requests new ones get a 503.
+
+What this makes cheap is connections, idle or waiting for a thread, not
+requests in flight: at most `workers` requests are being handled at any
+time. With admission enabled, [admission] max_requests caps them as well
+and [admission] threads has to equal `workers`, so that requests of lower
+classes running or queued for admission can't take the threads reserved
+for higher ones. Raising `workers` (--threads) only lets more requests run
+once both are raised along with it.
+
+A client has header_timeout seconds from the first byte of a request
+until its headers are complete, so one sending them slowly can't hold a
+connection open for ever. Likewise a handler waiting body_timeout seconds
+for more of the request body fails the read and the connection is closed,
+so a client trickling its body can't hold a thread for ever.
+
+jumpgate --asyncio takes these limits from the [asyncio] section of the
+configuration.
+
+Request bodies are fed to the handler as they arrive and response bodies
+are written as the application yields them, with flow control in both
+directions, so large image transfers still run in constant memory.
+
+Requires Python 3.4 or later.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import logging
+import sys
+import threading
+from urllib.parse import unquote
+from wsgiref.handlers import format_date_time
+import time
+
+LOG = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 64 * 1024
+# Stop reading from a client once this much request body is waiting for
+# the handler, and start again when it drops below the low water mark
+BODY_HIGH_WATER = 256 * 1024
+BODY_LOW_WATER = 64 * 1024
+# Response data a handler may queue for the event loop before waiting
+WRITE_HIGH_WATER = 256 * 1024
+
+REASONS = {
+    400: 'Bad Request',
+    408: 'Request Timeout',
+    413: 'Request Entity Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class ConnectionClosed(IOError):
+    pass
+
+
+class BodyTimeout(ConnectionClosed):
+    pass
+
+
+class BodyReader(io.RawIOBase):
+    """wsgi.input for a request whose body is still arriving. The event
+    loop feeds decoded body data; the handler thread reads it, blocking
+    until enough has arrived.
+    """
+
+    def __init__(self, protocol):
+        super(BodyReader, self).__init__()
+        self.protocol = protocol
+        self._cond = threading.Condition()
+        self._chunks = deque()
+        self._buffered = 0
+        self._eof = False
+        self._error = False
+        self._paused = False
+
+    def readable(self):
+        return True
+
+    # Called from the event loop
+
+    def feed(self, data):
+        with self._cond:
+            self._chunks.append(data)
+            self._buffered += len(data)
+            self._cond.notify_all()
+            if self._buffered > BODY_HIGH_WATER and not self._paused:
+                self._paused = True
+                self.protocol.pause_body()
+
+    def feed_eof(self):
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            self._error = True
+            self._cond.notify_all()
+
+    # Called from the handler thread
+
+    def read(self, size=-1):
+        if size == 0:
+            return b''
+        whole = size is None or size < 0
+        parts = []
+        wanted = size
+        with self._cond:
+            while True:
+                if self._error:
+                    raise ConnectionClosed('Client went away')
+                while self._chunks and (whole or wanted > 0):
+                    chunk = self._chunks.popleft()
+                    if not whole and len(chunk) > wanted:
+                        self._chunks.appendleft(chunk[wanted:])
+                        chunk = chunk[:wanted]
+                    parts.append(chunk)
+                    self._buffered -= len(chunk)
+                    if not whole:
+                        wanted -= len(chunk)
+
+                if self._paused and self._buffered < BODY_LOW_WATER:
+                    self._paused = False
+                    self.protocol.resume_body()
+                if self._eof or (parts and not whole):
+                    return b''.join(parts)
+                if not self._cond.wait(self.protocol.server.body_timeout):
+                    self._error = True
+                    self.protocol.close_soon()
+                    raise BodyTimeout('Timed out reading the request body')
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        # Only here for completeness; JSON bodies are read whole
+        line = []
+        while size < 0 or len(line) < size:
+            c = self.read(1)
+            if not c:
+                break
+            line.append(c)
+            if c == b'\n':
+                break
+        return b''.join(line)
+
+
+class BodyDecoder(object):
+    """Incrementally decodes a Content-Length or chunked request body."""
+
+    def __init__(self, length=None, chunked=False):
+        self.remaining = length or 0
+        self.chunked = chunked
+        self.state = 'size' if chunked else 'data'
+        self.done = not chunked and not length
+
+    def decode(self, buf):
+        """Consume framing from buf and return (body data, unused bytes)."""
+        out = []
+        while buf and not self.done:
+            if self.state == 'data':
+                data = buf[:self.remaining]
+                buf = buf[len(data):]
+                self.remaining -= len(data)
+                out.append(data)
+                if not self.remaining:
+                    if self.chunked:
+                        self.state = 'crlf'
+                    else:
+                        self.done = True
+            elif self.state in ('size', 'crlf', 'trailer'):
+                end = buf.find(b'\r\n')
+                if end < 0:
+                    if len(buf) > MAX_HEADER_SIZE:
+                        raise ValueError('Chunk header too long')
+                    break
+                line, buf = buf[:end], buf[end + 2:]
+                if self.state == 'crlf':
+                    self.state = 'size'
+                elif self.state == 'trailer':
+                    if not line:
+                        self.done = True
+                else:
+                    size = int(line.split(b';', 1)[0].strip(), 16)
+                    if size:
+                        self.remaining = size
+                        self.state = 'data'
+                    else:
+                        self.state = 'trailer'
+        return b''.join(out), buf
+
+
+class HTTPProtocol(asyncio.Protocol):
+    """Serves the requests of one connection, one at a time."""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = server.loop
+        self.transport = None
+        self._buffer = b''
+        self._decoder = None
+        self._reader = None
+        self._busy = False
+        self._closed = False
+        self._eof = False
+        self._timer = None
+        self._reading_headers = False
+        self._reading_paused = False
+        self._write_cond = threading.Condition()
+        self._write_paused = False
+        self._queued = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections.add(self)
+        self._wait_idle()
+
+    def connection_lost(self, exc):
+        self._closed = True
+        self._cancel_timer()
+        self.server.connections.discard(self)
+        with self._write_cond:
+            self._write_cond.notify_all()
+        if self._reader is not None:
+            self._reader.abort()
+
+    def data_received(self, data):
+        self._buffer += data
+        self._process()
+
+    def eof_received(self):
+        self._eof = True
+        if self._reader is not None and self._decoder is not None:
+            self._reader.abort()
+        # Keep the transport open to send a response still being handled
+        return self._busy
+
+    def pause_writing(self):
+        with self._write_cond:
+            self._write_paused = True
+
+    def resume_writing(self):
+        with self._write_cond:
+            self._write_paused = False
+            self._write_cond.notify_all()
+
+    def _wait_idle(self):
+        self._cancel_timer()
+        timeout = self.server.keep_alive_timeout
+        if timeout:
+            self._timer = self.loop.call_later(timeout, self.transport.close)
+
+    def _wait_headers(self):
+        """Give the client header_timeout seconds to complete the headers
+        of the request it started sending.
+        """
+        if self._reading_headers:
+            return
+        self._reading_headers = True
+        self._cancel_timer()
+        timeout = self.server.header_timeout
+        if timeout:
+            self._timer = self.loop.call_later(timeout, self._error, 408)
+
+    def _cancel_timer(self):
+        self._reading_headers = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def pause_body(self):
+        self.loop.call_soon_threadsafe(self._pause_reading)
+
+    def close_soon(self):
+        self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        if not self._closed:
+            self.transport.close()
+
+    def resume_body(self):
+        self.loop.call_soon_threadsafe(self._resume_reading)
+
+    def _pause_reading(self):
+        if not self._closed and not self._reading_paused:
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def _resume_reading(self):
+        if not self._closed and self._reading_paused:
+            self._reading_paused = False
+            self.transport.resume_reading()
+
+    def _process(self):
+        if self._decoder is not None and not self._feed_body():
+            # The handler may be writing its response already, so drop the
+            # connection rather than answer it
+            self._buffer = b''
+            self.transport.close()
+            return
+        if self._busy:
+            if len(self._buffer) > MAX_HEADER_SIZE:
+                # Pipelined requests pile up; wait for the current one
+                self._pause_reading()
+            return
+
+        if not self._buffer:
+            return
+        end = self._buffer.find(b'\r\n\r\n')
+        if end < 0:
+            if len(self._buffer) > MAX_HEADER_SIZE:
+                self._error(431)
+            else:
+                self._wait_headers()
+            return
+        self._cancel_timer()
+        head, self._buffer = self._buffer[:end], self._buffer[end + 4:]
+
+        try:
+            environ = self._make_environ(head)
+            length, chunked = self._body_framing(environ)
+        except ValueError:
+            return self._error(400)
+        if length is not None and length > self.server.max_body_size:
+            return self._error(413)
+
+        if self.server.pending >= self.server.max_pending:
+            self.server.rejected += 1
+            return self._error(503, keep_alive=False)
+
+        self._busy = True
+        self._reader = BodyReader(self)
+        self._decoder = BodyDecoder(length, chunked)
+        environ['wsgi.input'] = self._reader
+        if not self._feed_body():
+            self._busy = False
+            self._reader = None
+            return self._error(400)
+
+        self.server.pending += 1
+        future = self.loop.run_in_executor(self.server.executor,
+                                           self._run, environ)
+        future.add_done_callback(self._request_done)
+
+    def _feed_body(self):
+        """Hand the body data buffered to the handler. Returns False, with
+        the reader aborted, when the body is malformed.
+        """
+        try:
+            data, self._buffer = self._decoder.decode(self._buffer)
+        except ValueError:
+            self._reader.abort()
+            self._decoder = None
+            return False
+        if data:
+            self._reader.feed(data)
+        if self._decoder.done:
+            self._reader.feed_eof()
+            self._decoder = None
+        return True
+
+    def _request_done(self, future):
+        self.server.pending -= 1
+        self._busy = False
+        keep_alive = future.result() if not future.exception() else False
+        if self._decoder is not None:
+            # The handler didn't read the whole body; the connection can't
+            # be reused
+            keep_alive = False
+            self._decoder = None
+        self._reader = None
+
+        if self._closed:
+            return
+        if not keep_alive or self._eof:
+            self.transport.close()
+            return
+        self._resume_reading()
+        if self._buffer:
+            self._process()
+        else:
+            self._wait_idle()
+
+    @staticmethod
+    def _body_framing(environ):
+        """Return the (Content-Length, chunked) of a request's body.
+
+        Requests a proxy in front of the server could frame differently
+        are refused with a ValueError, as they would let a client smuggle
+        a request past it: duplicate or malformed Content-Length headers,
+        a Transfer-Encoding whose last coding isn't chunked and both
+        headers at once.
+        """
+        length = environ.get('CONTENT_LENGTH')
+        encoding = environ.get('HTTP_TRANSFER_ENCODING')
+        if encoding is not None:
+            if length is not None:
+                raise ValueError('Both Transfer-Encoding and Content-Length')
+            codings = [coding.strip().lower()
+                       for coding in encoding.split(',')]
+            if codings[-1] != 'chunked':
+                raise ValueError('Unsupported Transfer-Encoding %s' %
+                                 encoding)
+            return None, True
+        if length is None or length == '':
+            return None, False
+        if not length.isdigit():
+            raise ValueError('Invalid Content-Length %s' % length)
+        return int(length), False
+
+    def _make_environ(self, head):
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, version = lines[0].split(' ', 2)
+        if not version.startswith('HTTP/1.'):
+            raise ValueError('Unsupported version %s' % version)
+
+        path, _, query = target.partition('?')
+        environ = dict(self.server.base_environ)
+        environ.update({
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(path),
+            'QUERY_STRING': query,
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': (self.transport.get_extra_info('peername') or
+                            ('',))[0],
+            'wsgi.errors': sys.stderr,
+            'jumpgate.request_start': time.time(),
+        })
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise ValueError('Malformed header line')
+            name = name.strip().upper().replace('-', '_')
+            value = value.strip()
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                if name in environ:
+                    raise ValueError('Duplicate %s header' % name)
+                environ[name] = value
+            else:
+                key = 'HTTP_' + name
+                if key in environ:
+                    value = environ[key] + ',' + value
+                environ[key] = value
+        return environ
+
+    def _error(self, code, keep_alive=False):
+        body = REASONS[code].encode('latin-1')
+        headers = [('Content-Type', 'text/plain'),
+                   ('Content-Length', str(len(body)))]
+        if code == 503:
+            headers.append(('Retry-After', '1'))
+        self.transport.write(self._head(
+            'HTTP/1.1', '%s %s' % (code, REASONS[code]), headers,
+            keep_alive) + body)
+        if not keep_alive:
+            self._buffer = b''
+            self.transport.close()
+
+    @staticmethod
+    def _head(version, status, headers, keep_alive):
+        lines = ['%s %s' % (version, status)]
+        lines.extend('%s: %s' % header for header in headers)
+        lines.append('Date: %s' % format_date_time(time.time()))
+        lines.append('Connection: %s' % ('keep-alive' if keep_alive
+                                         else 'close'))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    # Called from the handler thread
+
+    def _write(self, data):
+        with self._write_cond:
+            while not self._closed and (self._write_paused or
+                                        self._queued > WRITE_HIGH_WATER):
+                self._write_cond.wait()
+            if self._closed:
+                raise ConnectionClosed('Client went away')
+            self._queued += len(data)
+        self.loop.call_soon_threadsafe(self._transport_write, data)
+
+    def _transport_write(self, data):
+        if not self._closed:
+            self.transport.write(data)
+        with self._write_cond:
+            self._queued -= len(data)
+            self._write_cond.notify_all()
+
+    def _run(self, environ):
+        """Run the application for one request and return whether the
+        connection may be kept open.
+        """
+        version = environ['SERVER_PROTOCOL']
+        connection = environ.get('HTTP_CONNECTION', '').lower()
+        if version == 'HTTP/1.0':
+            keep_alive = connection == 'keep-alive'
+        else:
+            keep_alive = connection != 'close'
+        keep_alive = keep_alive and self.server.keep_alive
+        state = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and 'sent' in state:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['status'] = status
+            state['headers'] = headers
+            return send
+
+        def send(data):
+            if 'sent' not in state:
+                headers = list(state['headers'])
+                names = set(name.lower() for name, _ in headers)
+                if 'content-length' not in names:
+                    if version == 'HTTP/1.1':
+                        state['chunked'] = True
+                        headers.append(('Transfer-Encoding', 'chunked'))
+                    else:
+                        state['keep_alive'] = False
+                self._write(self._head(
+                    version, state['status'], headers,
+                    state.get('keep_alive', keep_alive)))
+                state['sent'] = True
+            if not data or environ['REQUEST_METHOD'] == 'HEAD':
+                return
+            if state.get('chunked'):
+                data = b''.join([('%x\r\n' % len(data)).encode('latin-1'),
+                                 data, b'\r\n'])
+            self._write(data)
+
+        try:
+            result = self.server.app(environ, start_response)
+            try:
+                for data in result:
+                    send(data)
+                send(b'')
+                if state.get('chunked') and \
+                        environ['REQUEST_METHOD'] != 'HEAD':
+                    self._write(b'0\r\n\r\n')
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except ConnectionClosed:
+            return False
+        except Exception:
+            LOG.exception('Error handling %s %s', environ['REQUEST_METHOD'],
+                          environ['PATH_INFO'])
+            if 'sent' in state:
+                return False
+            state['status'] = '500 Internal Server Error'
+            state['headers'] = [('Content-Type', 'text/plain'),
+                                ('Content-Length', '0')]
+            state['keep_alive'] = False
+            try:
+                send(b'')
+            except ConnectionClosed:
+                pass
+            return False
+        return state.get('keep_alive', keep_alive)
+
+
+class AsyncServer(object):
+    """Serves a WSGI application from an asyncio event loop.
+
+    :param app: The WSGI application.
+    :param workers: Number of threads running handlers.
+    :param max_pending: Requests allowed to wait for or occupy a thread
+                        before new ones are rejected with a 503.
+    :param keep_alive_timeout: Seconds an idle connection is kept open.
+    :param header_timeout: Seconds a client has to send the headers of a
+                           request once it started it.
+    :param body_timeout: Seconds a handler waits for more of the request
+                         body.
+    """
+
+    def __init__(self, app, host='127.0.0.1', port=5000, workers=32,
+                 max_pending=4096, max_body_size=10 * 1024 ** 3,
+                 keep_alive=True, keep_alive_timeout=75, header_timeout=10,
+                 body_timeout=60, loop=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.max_body_size = max_body_size
+        self.keep_alive = keep_alive
+        self.keep_alive_timeout = keep_alive_timeout
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.loop = loop or asyncio.get_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.connections = set()
+        self.pending = 0
+        self.rejected = 0
+        self.server = None
+        self.base_environ = {
+            'SERVER_NAME': host,
+            'SERVER_PORT': str(port),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    def start(self, sock=None):
+        """Start listening, on sock if given. Returns the bound port."""
+        if sock is not None:
+            coro = self.loop.create_server(lambda: HTTPProtocol(self),
+                                           sock=sock)
+        else:
+            coro = self.loop.create_server(lambda: HTTPProtocol(self),
+                                           self.host, self.port,
+                                           reuse_address=True)
+        self.server = self.loop.run_until_complete(coro)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_environ['SERVER_PORT'] = str(port)
+        return port
+
+    def serve_forever(self):
+        try:
+            self.loop.run_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.server = None
+        for protocol in list(self.connections):
+            protocol.transport.close()
+        self.executor.shutdown(wait=False)
+
+
+def serve(app, host='127.0.0.1', port=5000, workers=32, **kwargs):
+    server = AsyncServer(app, host=host, port=port, workers=workers, **kwargs)
+    server.start()
+    server.serve_forever()
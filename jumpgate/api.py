@@ -4,12 +4,17 @@ import logging
 from falcon import API
 
 from jumpgate.config import CONF
+from jumpgate.common import tracing
 from jumpgate.common.utils import wrap_handler_with_hooks
 from jumpgate.common.hooks import APIHooks
 from jumpgate.common.nyi import NYI
-from jumpgate.common.dispatcher import Dispatcher
-from jumpgate.common.exceptions import ResponseException, InvalidTokenError
+from jumpgate.common.dispatcher import Dispatcher, RoutedResource
+from jumpgate.common.exceptions import (ResponseException, InvalidTokenError,
+                                        ServiceUnavailable)
 from jumpgate.common.error_handling import compute_fault
+from jumpgate.common.metrics import MetricsResource
+from jumpgate.common.profiling import ProfileResource
+from jumpgate.common.timing import TimingResource
 
 LOG = logging.getLogger(__name__)
 
@@ -47,21 +52,35 @@ class Jumpgate(object):
         self.before_hooks.extend(self.hooks.optional_request_hooks())
         self.after_hooks.extend(self.hooks.optional_response_hooks())
 
-        api = API(before=self.before_hooks, after=self.after_hooks)
+        # Traces cover every other hook
+        before_hooks = ([tracing.start_trace] +
+                        self.hooks.instrument_hooks(self.before_hooks))
+        after_hooks = (self.hooks.instrument_hooks(self.after_hooks) +
+                       [tracing.finish_trace])
+        api = API(before=before_hooks, after=after_hooks)
 
         # Set the default route to the NYI object
-        api.add_sink(self.default_route or NYI(before=self.before_hooks,
-                                               after=self.after_hooks))
+        api.add_sink(self.default_route or NYI(before=before_hooks,
+                                               after=after_hooks))
 
         # Add Error Handlers - ordered generic to more specific
         built_in_handlers = [(Exception, handle_unexpected_errors),
                              (ResponseException, ResponseException.handle),
-                             (InvalidTokenError, InvalidTokenError.handle)]
+                             (InvalidTokenError, InvalidTokenError.handle),
+                             (ServiceUnavailable, ServiceUnavailable.handle)]
 
         for ex, handler in built_in_handlers + self._error_handlers:
             api.add_error_handler(ex,
                                   wrap_handler_with_hooks(handler,
-                                                          self.after_hooks))
+                                                          after_hooks))
+
+        if self.config['metrics_endpoint']:
+            api.add_route('/metrics',
+                          RoutedResource(MetricsResource(), '/metrics'))
+        api.add_route('/admin/timing',
+                      RoutedResource(TimingResource(), '/admin/timing'))
+        api.add_route('/admin/profile',
+                      RoutedResource(ProfileResource(), '/admin/profile'))
 
         # Add all the routes collected thus far
         for _, disp in self._dispatchers.items():
@@ -1,12 +1,22 @@
 import os
 import argparse
+import multiprocessing
+import sys
 from wsgiref.simple_server import make_server
 
 from jumpgate.wsgi import make_api
 
 
-def main():
-    description = 'Start a single-threaded instance of jumpgate.'
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        return serve(argv[1:])
+    if argv and argv[0] == 'fake-softlayer':
+        return fake_softlayer(argv[1:])
+
+    description = ('Start a single-threaded instance of jumpgate. Use '
+                   '"jumpgate serve" to run a production server.')
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('--config',
                         default=os.environ.get('JUMPGATE_CONFIG'),
@@ -18,15 +28,191 @@ def main():
                         type=int,
                         default=5000,
                         help='port to listen on')
+    parser.add_argument('--asyncio',
+                        action='store_true',
+                        help='serve from an asyncio event loop (Python 3.4+)')
+    parser.add_argument('--threads',
+                        type=int,
+                        help='threads running handlers in asyncio mode, '
+                             'which caps the requests in flight; defaults '
+                             'to [asyncio] threads')
+
+    args = parser.parse_args(argv)
+    if args.asyncio:
+        return serve_asyncio(args)
 
-    args = parser.parse_args()
-    httpd = make_server(args.host, args.port, make_api(args.config))
+    from jumpgate.server import SimpleRequestHandler
+
+    httpd = make_server(args.host, args.port, make_api(args.config),
+                        handler_class=SimpleRequestHandler)
     print("Starting server on (%s:%s)" % (args.host, args.port))
     print("""
 Warning: This is currently a test server for Jumpgate and not fit for
 production since it is single-threaded. Use the WSGI application directly
 along with a better wsgi server like gunicorn or uwsgi:
-    jumpgate.wsgi:make_api()""")
+    jumpgate.wsgi:make_api()
+Shedding queued requests under those needs a proxy setting X-Request-Start
+and [admission] trust_request_start.""")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("Exiting...")
+
+
+def serve_asyncio(args):
+    try:
+        from jumpgate import aio
+    except ImportError:
+        raise SystemExit('asyncio mode requires Python 3.4 or later')
+
+    from jumpgate.config import CONF
+
+    app = make_api(args.config)
+    conf = CONF['asyncio']
+    threads = args.threads or conf['threads']
+    print("Starting asyncio server on (%s:%s) with %s handler threads; at "
+          "most %s requests are handled at a time" %
+          (args.host, args.port, threads, threads))
+    admission = CONF['admission']
+    if admission['enabled'] and admission['threads'] != threads:
+        print("Note: [admission] threads (%s) should match the %s handler "
+              "threads for reserved capacity to hold" %
+              (admission['threads'], threads))
+    try:
+        aio.serve(app, args.host, args.port, workers=threads,
+                  max_pending=conf['max_pending'],
+                  header_timeout=conf['header_timeout'],
+                  body_timeout=conf['body_timeout'])
+    except KeyboardInterrupt:
+        print("Exiting...")
+
+
+def serve(argv):
+    from jumpgate import server
+
+    parser = argparse.ArgumentParser(
+        prog='jumpgate serve',
+        description='Run jumpgate with pre-forked, multi-threaded workers. '
+                    'Send HUP to the master for a graceful restart.')
+    parser.add_argument('--config',
+                        default=os.environ.get('JUMPGATE_CONFIG'),
+                        help='Jumpgate config location')
+    parser.add_argument('--host',
+                        default='127.0.0.1',
+                        help='host to listen on')
+    parser.add_argument('--port',
+                        type=int,
+                        default=5000,
+                        help='port to listen on')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--threads',
+                        type=int,
+                        default=16,
+                        help='threads serving connections in each worker')
+    parser.add_argument('--keep-alive',
+                        type=float,
+                        default=5,
+                        help='seconds to keep idle connections open')
+    parser.add_argument('--graceful-timeout',
+                        type=float,
+                        default=30,
+                        help='seconds workers get to finish their requests '
+                             'when stopping')
+    parser.add_argument('--backlog',
+                        type=int,
+                        default=2048,
+                        help='listen queue size')
+
+    args = parser.parse_args(argv)
+    print("Starting server on (%s:%s) with %s workers" %
+          (args.host, args.port, args.workers))
+    server.serve(lambda: make_api(args.config), args.host, args.port,
+                 workers=args.workers, threads=args.threads,
+                 keep_alive_timeout=args.keep_alive,
+                 graceful_timeout=args.graceful_timeout,
+                 backlog=args.backlog)
+
+
+def fake_softlayer(argv):
+    from jumpgate.fakesl.account import Account
+    from jumpgate.fakesl.app import FakeSoftLayer, make_fake_server
+
+    parser = argparse.ArgumentParser(
+        prog='jumpgate fake-softlayer',
+        description='Serve a synthetic SoftLayer account over XML-RPC and '
+                    'REST for testing jumpgate offline.')
+    parser.add_argument('--host',
+                        default='127.0.0.1',
+                        help='host to listen on')
+    parser.add_argument('--port',
+                        type=int,
+                        default=5001,
+                        help='port to listen on')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='seed of the generated account')
+    for name, default in [('guests', 100), ('images', 20), ('subnets', 10),
+                          ('vlans', 5), ('ssh-keys', 10), ('dns-zones', 5),
+                          ('records', 10), ('events', 200)]:
+        parser.add_argument('--' + name,
+                            type=int,
+                            default=default,
+                            help='number of %s' % name.replace('-', ' '))
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.0,
+                        help='seconds every call takes')
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=0.0,
+                        help='most seconds added at random to the latency')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0.0,
+                        help='share of calls failing with an API fault')
+    parser.add_argument('--unavailable-rate',
+                        type=float,
+                        default=0.0,
+                        help='share of calls failing with an HTTP 503')
+    parser.add_argument('--method-latency',
+                        action='append',
+                        default=[],
+                        metavar='SERVICE.METHOD=SECONDS',
+                        help='latency of one method; may be repeated')
+    parser.add_argument('--method-error-rate',
+                        action='append',
+                        default=[],
+                        metavar='SERVICE.METHOD=RATE',
+                        help='error rate of one method; may be repeated')
+
+    args = parser.parse_args(argv)
+    account = Account(guests=args.guests, images=args.images,
+                      subnets=args.subnets, vlans=args.vlans,
+                      ssh_keys=args.ssh_keys, dns_zones=args.dns_zones,
+                      records=args.records, events=args.events,
+                      seed=args.seed)
+    app = FakeSoftLayer(
+        account, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, unavailable_rate=args.unavailable_rate,
+        method_latencies=dict(pair.split('=', 1)
+                              for pair in args.method_latency),
+        method_error_rates=dict(pair.split('=', 1)
+                                for pair in args.method_error_rate),
+        seed=args.seed)
+    httpd = make_fake_server(app, args.host, args.port)
+    print("Fake SoftLayer API on (%s:%s)" % (args.host, args.port))
+    print("""
+    [softlayer]
+    endpoint = http://%s:%s/xmlrpc/v3
+
+Username: %s
+API key:  %s
+Password: %s""" % (args.host, args.port, account.username, account.api_key,
+                   account.password))
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
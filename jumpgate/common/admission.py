@@ -0,0 +1,321 @@
+"""Admission of requests by priority class.
+
+Every route belongs to a priority class: critical, normal or bulk. At most
+max_requests requests run at a time, and some of that capacity is reserved
+for the classes above, so a class may only start a request while fewer than
+max_requests less what's reserved for the classes above it are running.
+Requests that can't start wait in a bounded queue of their own class, and
+a finished request hands its slot to the highest class with a request
+waiting. Authentication therefore keeps going while listings pile up:
+a full queue is refused with a 503 and a request still waiting at its
+deadline gets a 504.
+
+Admission happens in the responder, so running and queued requests alike
+hold one of the threads of the server. The same reservations therefore
+apply to threads: a class may only run or queue a request while its class
+and those below hold fewer than threads less what's reserved for the
+classes above, and is refused with a 503 otherwise. However many bulk
+requests arrive, the threads reserved for critical ones stay free.
+
+In front of that, requests which already spent too long queueing before
+jumpgate got to them are shed with a 503 and Retry-After, CoDel style. The
+queueing delay of a request is the time since the server accepted it, or
+since the proxy in front received it when that sets an X-Request-Start
+header and trust_request_start says it does. Servers which don't tell when
+they accepted a request, like gunicorn, need that header to shed. While
+the lowest delay seen in an interval stays above the target there is a
+standing queue, and requests which waited longer than the target are shed
+until the queue drains; otherwise only those which waited longer than a
+whole interval are.
+"""
+from collections import deque
+import threading
+import time
+
+from jumpgate.common import metrics
+from jumpgate.common import timing
+from jumpgate.common.deadline import get_deadline
+from jumpgate.common.exceptions import DeadlineExceeded, ServiceUnavailable
+from jumpgate.common.utils import on_reset, propagate_argspec
+from jumpgate.config import CONF
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+BULK = 'bulk'
+# Highest first
+PRIORITIES = (CRITICAL, NORMAL, BULK)
+
+REQUEST_START_HEADER = 'X-REQUEST-START'
+# Seconds a request may claim to have waited in the proxy, against clock skew
+MAX_REQUEST_START_AGE = 60.0
+
+IN_FLIGHT = metrics.gauge(
+    'jumpgate_admitted_requests',
+    'Requests running, by priority class',
+    ['priority'])
+QUEUED = metrics.gauge(
+    'jumpgate_queued_requests',
+    'Requests waiting to be admitted, by priority class',
+    ['priority'])
+ADMISSION_WAIT = metrics.summary(
+    'jumpgate_admission_wait_seconds',
+    'Time requests waited to be admitted, by priority class',
+    ['priority'])
+QUEUE_DELAY = metrics.summary(
+    'jumpgate_request_queue_delay_seconds',
+    'Time requests waited before jumpgate started handling them')
+IN_FLIGHT_REQUESTS = metrics.gauge(
+    'jumpgate_in_flight_requests',
+    'Requests being handled')
+REJECTED = metrics.counter(
+    'jumpgate_rejected_requests',
+    'Requests refused admission, by priority class and reason',
+    ['priority', 'reason'])
+
+
+def request_start(req):
+    """Return when the request arrived: the X-Request-Start header set by a
+    trusted proxy in front, else when the server accepted it, else now.
+    """
+    now = time.time()
+    header = req.headers.get(REQUEST_START_HEADER)
+    if header and CONF['admission']['trust_request_start']:
+        try:
+            start = float(header.split('t=')[-1])
+        except ValueError:
+            pass
+        else:
+            # Proxies send seconds, milliseconds or microseconds
+            while start > 1e11:
+                start /= 1000.0
+            return min(max(start, now - MAX_REQUEST_START_AGE), now)
+    return req.env.get('jumpgate.request_start') or now
+
+
+class QueueDelayController(object):
+    def __init__(self, target, interval, clock=time.time):
+        self.target = target
+        self.interval = interval
+        self.clock = clock
+        self.overloaded = False
+        self.in_flight = 0
+        self.min_delay = None
+        self.interval_end = clock() + interval
+        self._lock = threading.Lock()
+
+    def admit(self, delay):
+        """Admit a request which waited delay seconds to be handled, or
+        raise ServiceUnavailable when it should be shed.
+        """
+        delay = max(0.0, delay)
+        QUEUE_DELAY.observe(delay)
+        with self._lock:
+            now = self.clock()
+            if now >= self.interval_end:
+                self.overloaded = (self.min_delay is not None and
+                                   self.min_delay > self.target)
+                self.min_delay = None
+                self.interval_end = now + self.interval
+            if self.min_delay is None or delay < self.min_delay:
+                self.min_delay = delay
+
+            limit = self.target if self.overloaded else self.interval
+            if delay > limit:
+                REJECTED.labels('any', 'queue_delay').inc()
+                raise ServiceUnavailable(
+                    details='Request queued for %.3f seconds' % delay,
+                    retry_after=max(1, self.interval))
+            self.in_flight += 1
+        IN_FLIGHT_REQUESTS.inc()
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+        IN_FLIGHT_REQUESTS.dec()
+
+
+class _Waiter(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class PriorityAdmission(object):
+    def __init__(self, capacity, reserved=None, queue_lengths=None,
+                 default_queue_length=0, threads=None):
+        self.capacity = capacity
+        self.threads = threads
+        self.reserved = reserved or {}
+        self.queue_lengths = queue_lengths or {}
+        self.default_queue_length = default_queue_length
+        self.in_flight = dict((priority, 0) for priority in PRIORITIES)
+        self._queues = dict((priority, deque()) for priority in PRIORITIES)
+        self._lock = threading.Lock()
+
+    def limit(self, priority):
+        """Return how many requests may be running for a request of the
+        priority to start.
+        """
+        return self.capacity - self._reserved_above(priority)
+
+    def thread_limit(self, priority):
+        """Return how many threads the priority and those below it may hold
+        for a request of the priority to run or queue, or None without a
+        thread count.
+        """
+        if self.threads is None:
+            return None
+        return self.threads - self._reserved_above(priority)
+
+    def running(self):
+        return sum(self.in_flight.values())
+
+    def holding(self, priority):
+        """Return how many requests of the priority and below are running
+        or queued, each holding a thread.
+        """
+        lower = PRIORITIES[PRIORITIES.index(priority):]
+        return sum(self.in_flight[p] + len(self._queues[p]) for p in lower)
+
+    def acquire(self, priority, deadline=None):
+        """Admit a request of the priority, waiting in its queue until the
+        deadline if necessary. Returns the seconds waited.
+        """
+        start_time = time.time()
+        with self._lock:
+            thread_limit = self.thread_limit(priority)
+            if (thread_limit is not None and
+                    self.holding(priority) >= thread_limit):
+                REJECTED.labels(priority, 'threads').inc()
+                raise ServiceUnavailable(
+                    details='Too many %s requests in progress' % priority)
+            if (self.running() < self.limit(priority) and
+                    not self._waiting(priority)):
+                self._admit(priority)
+                return 0.0
+
+            queue = self._queues[priority]
+            if len(queue) >= int(self.queue_lengths.get(
+                    priority, self.default_queue_length)):
+                REJECTED.labels(priority, 'queue_full').inc()
+                raise ServiceUnavailable(
+                    details='Too many %s requests queued' % priority)
+            waiter = _Waiter()
+            queue.append(waiter)
+        QUEUED.labels(priority).inc()
+
+        try:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.time())
+            if not waiter.event.wait(timeout):
+                with self._lock:
+                    if not waiter.granted:
+                        queue.remove(waiter)
+                        REJECTED.labels(priority, 'deadline').inc()
+                        raise DeadlineExceeded(
+                            details='Timed out waiting to be admitted')
+        finally:
+            QUEUED.labels(priority).dec()
+
+        waited = time.time() - start_time
+        ADMISSION_WAIT.labels(priority).observe(waited)
+        return waited
+
+    def release(self, priority):
+        with self._lock:
+            self.in_flight[priority] -= 1
+            IN_FLIGHT.labels(priority).dec()
+            self._dispatch()
+
+    def queued(self):
+        """Return the number of waiting requests of each class."""
+        with self._lock:
+            return dict((priority, len(queue))
+                        for priority, queue in self._queues.items())
+
+    def _reserved_above(self, priority):
+        higher = PRIORITIES[:PRIORITIES.index(priority)]
+        return sum(int(self.reserved.get(p, 0)) for p in higher)
+
+    def _waiting(self, priority):
+        """Whether a request of the priority or above is already waiting."""
+        higher = PRIORITIES[:PRIORITIES.index(priority) + 1]
+        return any(self._queues[p] for p in higher)
+
+    def _admit(self, priority):
+        self.in_flight[priority] += 1
+        IN_FLIGHT.labels(priority).inc()
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self.running() < self.limit(priority):
+                waiter = queue.popleft()
+                self._admit(priority)
+                waiter.granted = True
+                waiter.event.set()
+
+
+class PrioritizedResource(object):
+    """Wraps a resource so its responders only run once admitted in their
+    priority class.
+    """
+
+    def __init__(self, resource, priority, admission=None):
+        self.resource = resource
+        self.priority = priority
+        self.admission = admission
+
+    def __getattr__(self, name):
+        attr = getattr(self.resource, name)
+        if not name.startswith('on_') or not callable(attr):
+            return attr
+
+        def responder(req, resp, **kwargs):
+            admission = self.admission or get_admission()
+            waited = admission.acquire(self.priority, get_deadline(req))
+            if timing.enabled():
+                # Part of the responder phase
+                timing.record(req, 'responder.admission', waited)
+            try:
+                attr(req, resp, **kwargs)
+            finally:
+                admission.release(self.priority)
+
+        propagate_argspec(responder, attr)
+        return responder
+
+
+_admission = None
+_delay_controller = None
+
+
+@on_reset
+def _reset():
+    global _admission, _delay_controller
+    _admission = None
+    _delay_controller = None
+
+
+def get_delay_controller():
+    global _delay_controller
+    if _delay_controller is None:
+        conf = CONF['admission']
+        _delay_controller = QueueDelayController(
+            conf['queue_delay_target'], conf['queue_delay_interval'])
+    return _delay_controller
+
+
+def get_admission():
+    global _admission
+    if _admission is None:
+        conf = CONF['admission']
+        _admission = PriorityAdmission(
+            conf['max_requests'],
+            threads=conf['threads'],
+            reserved=dict((priority, int(count)) for priority, count in
+                          conf['reserved'].items()),
+            queue_lengths=dict((priority, int(length)) for priority, length
+                               in conf['queue_lengths'].items()))
+    return _admission
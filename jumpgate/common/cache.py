@@ -0,0 +1,401 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import errno
+import fcntl
+import hashlib
+import mmap
+import os
+import os.path
+import struct
+import threading
+import time
+
+from six.moves import cPickle as pickle
+
+from jumpgate.common import metrics
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+OVERSIZED_ENTRIES = metrics.counter(
+    'jumpgate_shared_cache_oversized',
+    'Entries not stored because they were larger than a slot of a shared '
+    'cache',
+    ['cache'])
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Each entry carries the size it was stored with and an optional TTL.
+    Inserting past the byte budget evicts the least recently used entries
+    until the new entry fits; entries larger than the whole budget are not
+    stored at all.
+    """
+
+    def __init__(self, max_bytes, clock=time.time):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.current_bytes = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+
+            value, size, expires = entry
+            if expires is not None and expires <= self.clock():
+                self.current_bytes -= size
+                return default
+
+            # Re-inserting moves the entry to the most recently used end
+            self._data[key] = entry
+            return value
+
+    def set(self, key, value, size, ttl=None):
+        if size > self.max_bytes:
+            self.delete(key)
+            return False
+
+        expires = None
+        if ttl is not None:
+            expires = self.clock() + ttl
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            while self._data and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+            self._data[key] = (value, size, expires)
+            self.current_bytes += size
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+        return entry is not None
+
+    def invalidate(self, predicate):
+        """Remove every entry whose key matches predicate and return the
+        number of entries removed.
+        """
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for key in keys:
+                self.current_bytes -= self._data.pop(key)[1]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+
+class NamespacedCache(object):
+    """View of a cache where every key is prefixed with a namespace, so
+    several users can share one store without seeing each other's entries.
+    """
+
+    def __init__(self, cache, namespace):
+        self.cache = cache
+        self.namespace = namespace
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        return self.cache.get((self.namespace, key), default)
+
+    def set(self, key, value, size, ttl=None):
+        return self.cache.set((self.namespace, key), value, size, ttl=ttl)
+
+    def delete(self, key):
+        return self.cache.delete((self.namespace, key))
+
+    def invalidate(self, predicate):
+        return self.cache.invalidate(
+            lambda key: key[0] == self.namespace and predicate(key[1]))
+
+    def clear(self):
+        return self.invalidate(lambda key: True)
+
+
+# Layout of the shared cache file: a header followed by fixed size slots,
+# each starting with a slot header and holding the pickled key and value.
+SHARED_MAGIC = b'JGCACHE1'
+SHARED_HEADER = struct.Struct('=8sII')
+SHARED_HEADER_SIZE = 64
+# used, key hash, expires, last used, key length, value length
+SLOT_HEADER = struct.Struct('=B7xQddII')
+# Room left in slots sized for a given entry size for its key, pickling
+# and anything stored along with it
+SLOT_OVERHEAD = 8192
+
+
+class SharedCache(object):
+    """Cache shared by every process on a host through a memory-mapped
+    file holding a fixed number of fixed size slots.
+
+    Keys hash to a window of `probes` adjacent slots. A full window evicts
+    its least recently used slot, so the cache as a whole is approximately
+    LRU. Values are pickled, so they are always returned as copies and
+    must not be larger than a slot.
+
+    Processes coordinate with fcntl byte-range locks on the slots they
+    touch and threads within a process with a lock, which keeps lookups
+    for unrelated keys from contending across workers. The file is
+    created with mode 0600 since anyone able to write it could make
+    workers unpickle arbitrary data.
+    """
+
+    def __init__(self, path, slots=4096, slot_size=16384, probes=8,
+                 clock=time.time, name=None):
+        if slot_size <= SLOT_HEADER.size:
+            raise ValueError('slot_size must be larger than %s' %
+                             SLOT_HEADER.size)
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.probes = max(1, min(probes, slots))
+        self.clock = clock
+        self.evictions = 0
+        self.size = SHARED_HEADER_SIZE + slots * slot_size
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._map = self._open_map()
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _open_map(self):
+        header = SHARED_HEADER.pack(SHARED_MAGIC, self.slots, self.slot_size)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            current = b''
+            if os.fstat(self._fd).st_size == self.size:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                current = os.read(self._fd, SHARED_HEADER.size)
+            if current != header:
+                # New file or one laid out differently; start from scratch
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, header)
+            return mmap.mmap(self._fd, self.size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _offset(self, slot):
+        return SHARED_HEADER_SIZE + slot * self.slot_size
+
+    @contextmanager
+    def _locked(self, first, count=1, exclusive=True):
+        start = self._offset(first)
+        length = count * self.slot_size
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH,
+                        length, start, os.SEEK_SET)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start,
+                            os.SEEK_SET)
+
+    def _hash(self, key_data):
+        return struct.unpack('=Q', hashlib.sha1(key_data).digest()[:8])[0]
+
+    def _window(self, key_hash):
+        return key_hash % (self.slots - self.probes + 1)
+
+    def _header(self, slot):
+        return SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+
+    def _clear_slot(self, slot):
+        offset = self._offset(slot)
+        self._map[offset:offset + 1] = b'\x00'
+
+    def _read_key(self, slot, key_length):
+        start = self._offset(slot) + SLOT_HEADER.size
+        return self._map[start:start + key_length]
+
+    def _read_value(self, slot, key_length, value_length):
+        start = self._offset(slot) + SLOT_HEADER.size + key_length
+        return pickle.loads(self._map[start:start + value_length])
+
+    def _find(self, first, key_hash, key_data):
+        for slot in range(first, first + self.probes):
+            used, slot_hash, _, _, key_length, _ = self._header(slot)
+            if (used and slot_hash == key_hash and
+                    self._read_key(slot, key_length) == key_data):
+                return slot
+        return None
+
+    def __len__(self):
+        now = self.clock()
+        count = 0
+        with self._locked(0, self.slots, exclusive=False):
+            for slot in range(self.slots):
+                used, _, expires, _, _, _ = self._header(slot)
+                if used and (not expires or expires > now):
+                    count += 1
+        return count
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        key_data = pickle.dumps(key, 2)
+        key_hash = self._hash(key_data)
+        first = self._window(key_hash)
+        with self._locked(first, self.probes):
+            slot = self._find(first, key_hash, key_data)
+            if slot is None:
+                return default
+
+            now = self.clock()
+            _, _, expires, _, key_length, value_length = self._header(slot)
+            if expires and expires <= now:
+                self._clear_slot(slot)
+                return default
+
+            SLOT_HEADER.pack_into(self._map, self._offset(slot), 1, key_hash,
+                                  expires, now, key_length, value_length)
+            return self._read_value(slot, key_length, value_length)
+
+    def set(self, key, value, size=None, ttl=None):
+        """Store a value. size is accepted for compatibility with LRUCache;
+        the limit that applies is the size of a slot.
+        """
+        key_data = pickle.dumps(key, 2)
+        value_data = pickle.dumps(value, 2)
+        if SLOT_HEADER.size + len(key_data) + len(value_data) > self.slot_size:
+            OVERSIZED_ENTRIES.labels(self.name).inc()
+            self.delete(key)
+            return False
+
+        key_hash = self._hash(key_data)
+        first = self._window(key_hash)
+        now = self.clock()
+        expires = now + ttl if ttl is not None else 0.0
+        with self._locked(first, self.probes):
+            slot = self._find(first, key_hash, key_data)
+            if slot is None:
+                slot = self._free_slot(first, now)
+
+            offset = self._offset(slot)
+            start = offset + SLOT_HEADER.size
+            self._map[start:start + len(key_data)] = key_data
+            start += len(key_data)
+            self._map[start:start + len(value_data)] = value_data
+            SLOT_HEADER.pack_into(self._map, offset, 1, key_hash, expires, now,
+                                  len(key_data), len(value_data))
+        return True
+
+    def _free_slot(self, first, now):
+        oldest, oldest_used = first, None
+        for slot in range(first, first + self.probes):
+            used, _, expires, last_used, _, _ = self._header(slot)
+            if not used or (expires and expires <= now):
+                return slot
+            if oldest_used is None or last_used < oldest_used:
+                oldest, oldest_used = slot, last_used
+        self.evictions += 1
+        return oldest
+
+    def delete(self, key):
+        key_data = pickle.dumps(key, 2)
+        key_hash = self._hash(key_data)
+        first = self._window(key_hash)
+        with self._locked(first, self.probes):
+            slot = self._find(first, key_hash, key_data)
+            if slot is not None:
+                self._clear_slot(slot)
+        return slot is not None
+
+    def invalidate(self, predicate):
+        """Remove every entry whose key matches predicate and return the
+        number of entries removed. This scans the whole file.
+        """
+        count = 0
+        for slot in range(self.slots):
+            with self._locked(slot):
+                used, _, _, _, key_length, _ = self._header(slot)
+                if not used:
+                    continue
+                if predicate(pickle.loads(self._read_key(slot, key_length))):
+                    self._clear_slot(slot)
+                    count += 1
+        return count
+
+    def clear(self):
+        with self._locked(0, self.slots):
+            for slot in range(self.slots):
+                self._clear_slot(slot)
+
+
+_shared_caches = {}
+
+
+@on_reset
+def _reset():
+    for cache in _shared_caches.values():
+        cache.close()
+    _shared_caches.clear()
+
+
+def shared_cache(name, max_bytes=None, max_entry_bytes=None):
+    """Return the process wide SharedCache stored in the file of the given
+    name under [cache] shared_path.
+
+    Given max_entry_bytes, the slots are sized to hold entries of that size
+    and there are as many as fit in max_bytes. Otherwise the cache has
+    [cache] shared_slots slots of shared_slot_size bytes.
+    """
+    cache = _shared_caches.get(name)
+    if cache is None:
+        conf = CONF['cache']
+        try:
+            os.makedirs(conf['shared_path'], 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        slots, slot_size = conf['shared_slots'], conf['shared_slot_size']
+        if max_entry_bytes is not None:
+            slot_size = max_entry_bytes + SLOT_OVERHEAD
+            slots = max(1, (max_bytes or slots * slot_size) // slot_size)
+        cache = SharedCache(os.path.join(conf['shared_path'], name),
+                            slots=slots, slot_size=slot_size, name=name)
+        _shared_caches[name] = cache
+    return cache
+
+
+def make_cache(name, max_bytes, max_entry_bytes=None):
+    """Return a cache for the given purpose using the configured backend:
+    a per-process LRUCache bounded by max_bytes or a SharedCache with room
+    for entries of up to max_entry_bytes.
+    """
+    if CONF['cache']['backend'] == 'shared':
+        return shared_cache(name, max_bytes, max_entry_bytes)
+    return LRUCache(max_bytes)
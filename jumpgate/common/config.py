@@ -12,17 +12,239 @@ FILE_OPTIONS = {
         cfg.StrOpt('log_level', default='INFO',
                    help='Log level to report. '
                         'Options: DEBUG, INFO, WARNING, ERROR, CRITICAL'),
+        cfg.StrOpt('log_format', default='text',
+                   help='Format of log records. Options: text or json (one '
+                        'object per record)'),
+        cfg.BoolOpt('buffered_logging', default=True,
+                    help='Write logs from a background thread so requests '
+                         'never wait on the log output'),
+        cfg.IntOpt('log_queue_size', default=10000,
+                   help='Log records waiting to be written before more are '
+                        'dropped'),
+        cfg.IntOpt('log_batch_size', default=100,
+                   help='Most log records written at a time'),
+        cfg.FloatOpt('log_flush_interval', default=0.5,
+                     help='Seconds the log writer waits to fill a batch'),
         cfg.StrOpt('secret_key',
                    default='SET ME',
                    help='Secret key used to encrypt tokens'),
         cfg.ListOpt('request_hooks', default=[]),
         cfg.ListOpt('response_hooks', default=[]),
-        cfg.StrOpt('default_domain', default='jumpgate.com')
+        cfg.StrOpt('default_domain', default='jumpgate.com'),
+        cfg.IntOpt('request_timeout', default=120,
+                   help='Seconds a request may take unless the client asks '
+                        'for less or more with X-Request-Deadline'),
+        cfg.IntOpt('max_request_timeout', default=600,
+                   help='Longest deadline in seconds a client may ask for'),
+        cfg.FloatOpt('min_request_timeout', default=1.0,
+                     help='Shortest deadline in seconds a client may ask '
+                          'for; shorter ones are refused with a 400'),
+        cfg.BoolOpt('metrics_endpoint', default=False,
+                    help='Serve the metrics registry at /metrics, without '
+                         'authentication; only turn it on where no one '
+                         'but the scraper can reach jumpgate directly'),
+        cfg.BoolOpt('phase_timing', default=False,
+                    help='Time every hook and responder from the start; '
+                         'admins can switch it with PUT /admin/timing'),
     ],
     'softlayer': [
         cfg.StrOpt('endpoint', default=API_PUBLIC_ENDPOINT),
         cfg.StrOpt('proxy', default=None),
         cfg.StrOpt('catalog_template_file', default='identity.templates'),
+        cfg.BoolOpt('memoize_calls', default=True,
+                    help='Reuse the results of identical read-only API '
+                         'calls made while handling a single request'),
+        cfg.BoolOpt('coalesce_calls', default=True,
+                    help='Share read-only API calls with identical calls for '
+                         'the same credentials already in flight'),
+        cfg.BoolOpt('cache_calls', default=False,
+                    help='Cache the results of read-only API calls listed in '
+                         'cache_policies for each tenant'),
+        cfg.DictOpt('cache_policies',
+                    default={'Account.getSubnets': '60',
+                             'Account.getNetworkVlans': '60',
+                             'Account.getPrivateBlockDeviceTemplateGroups':
+                                 '30',
+                             'Account.getDomains': '60',
+                             'Account.getSshKeys': '60',
+                             'Virtual_Guest.getCreateObjectOptions': '3600'},
+                    help='Seconds to cache each Service.method call'),
+        cfg.IntOpt('cache_tenant_max_bytes', default=4 * 1024 * 1024,
+                   help='Approximate size limit of cached results per '
+                        'tenant'),
+        cfg.IntOpt('cache_max_tenants', default=1000,
+                   help='Number of tenants to keep cached results for'),
+        cfg.IntOpt('fanout_threads', default=32,
+                   help='Threads shared by every request for making '
+                        'independent API calls concurrently'),
+        cfg.BoolOpt('hedge_calls', default=False,
+                    help='Repeat slow read-only calls listed in '
+                         'hedge_percentiles and use whichever answer '
+                         'arrives first'),
+        cfg.DictOpt('hedge_percentiles',
+                    default={'Account.getVirtualGuests': '95',
+                             'Account.getHourlyVirtualGuests': '95',
+                             'Account.getPrivateBlockDeviceTemplateGroups':
+                                 '95',
+                             'Virtual_Guest.getObject': '95',
+                             'Virtual_Guest_Block_Device_Template_Group.'
+                             'getPublicImages': '95'},
+                    help='Percentile of the recent latency of each '
+                         'Service.method call after which it is repeated'),
+        cfg.FloatOpt('hedge_budget', default=0.05,
+                     help='Largest fraction of hedgeable calls which may '
+                          'be repeated'),
+        cfg.BoolOpt('fair_scheduling', default=True,
+                    help='Share the outbound API concurrency fairly '
+                         'between tenants'),
+        cfg.IntOpt('outbound_concurrency', default=32,
+                   help='Number of API calls a process makes at a time '
+                        'when fair_scheduling is enabled'),
+        cfg.DictOpt('tenant_weights', default={},
+                    help='Share of the outbound concurrency of each tenant '
+                         'relative to the others, which default to 1'),
+        cfg.BoolOpt('circuit_breaker', default=False,
+                    help='Fail calls to a service quickly while it is '
+                         'failing or too slow, instead of tying up '
+                         'workers waiting on it'),
+        cfg.IntOpt('breaker_window', default=20,
+                   help='Number of recent calls to a service the error '
+                        'rate is measured over'),
+        cfg.FloatOpt('breaker_failure_ratio', default=0.5,
+                     help='Fraction of failed recent calls which opens the '
+                          'breaker of a service'),
+        cfg.IntOpt('breaker_reset_timeout', default=30,
+                   help='Seconds an open breaker waits before letting a '
+                        'trial call through'),
+        cfg.BoolOpt('adaptive_concurrency', default=False,
+                    help='Also limit the concurrent calls to each service '
+                         'with circuit_breaker, shrinking the limit while '
+                         'calls fail or slow down'),
+        cfg.IntOpt('concurrency_limit', default=20,
+                   help='Initial number of concurrent calls allowed to '
+                        'each service with adaptive_concurrency'),
+        cfg.IntOpt('max_concurrency_limit', default=100,
+                   help='Largest number of concurrent calls the adaptive '
+                        'limit of a service may grow to'),
+        cfg.FloatOpt('latency_tolerance', default=2.0,
+                     help='Calls slower than this many times the moving '
+                          'average latency of their method shrink the '
+                          'concurrency limit of their service'),
+    ],
+    'cache': [
+        cfg.StrOpt('backend', default='memory',
+                   help='Where caches keep their entries. Options: memory '
+                        '(per process) or shared (memory-mapped files '
+                        'shared by every worker on the host)'),
+        cfg.StrOpt('shared_path', default='/var/lib/jumpgate/cache',
+                   help='Directory holding the shared cache files'),
+        cfg.IntOpt('shared_slots', default=4096,
+                   help='Number of entries the shared SoftLayer API cache '
+                        'file holds. The response cache has as many slots '
+                        'of [openstack] cache_max_entry_bytes as fit in '
+                        'its cache_max_bytes'),
+        cfg.IntOpt('shared_slot_size', default=16384,
+                   help='Largest entry in bytes the shared SoftLayer API '
+                        'cache can hold'),
+        cfg.BoolOpt('invalidation_bus', default=False,
+                    help='Broadcast cache invalidations to the other '
+                         'workers on the host'),
+        cfg.StrOpt('invalidation_bus_path', default='/var/run/jumpgate/bus',
+                   help='Directory holding the sockets of the invalidation '
+                        'bus'),
+    ],
+    'admission': [
+        cfg.BoolOpt('enabled', default=False,
+                    help='Admit requests by the priority class of their '
+                         'route'),
+        cfg.IntOpt('max_requests', default=16,
+                   help='Requests allowed to run at a time in each worker; '
+                        'keep it at most threads, or queued requests of '
+                        'lower classes are refused sooner'),
+        cfg.IntOpt('threads', default=16,
+                   help='Handler threads of each worker: jumpgate serve '
+                        '--threads or [asyncio] threads. Running and '
+                        'queued requests each hold one, and reserved '
+                        'applies to them too'),
+        cfg.DictOpt('reserved', default={'critical': '4', 'normal': '2'},
+                    help='Part of max_requests and of threads only the '
+                         'given priority class and the classes above it '
+                         'may use'),
+        cfg.DictOpt('queue_lengths',
+                    default={'critical': '64', 'normal': '8', 'bulk': '2'},
+                    help='Requests of each priority class allowed to wait '
+                         'for admission before more are refused'),
+        cfg.BoolOpt('trust_request_start', default=False,
+                    help='Take when requests arrived from their '
+                         'X-Request-Start header. Only turn it on behind a '
+                         'proxy which sets the header on every request; '
+                         'under gunicorn, which does not tell when it '
+                         'accepted a request, shedding needs it'),
+        cfg.BoolOpt('shed_queued_requests', default=False,
+                    help='Refuse requests which queued too long before '
+                         'being handled with a 503'),
+        cfg.FloatOpt('queue_delay_target', default=0.5,
+                     help='Seconds of queueing delay tolerated while '
+                          'requests keep queueing'),
+        cfg.FloatOpt('queue_delay_interval', default=5.0,
+                     help='Seconds over which the lowest queueing delay is '
+                          'compared to the target; also the longest delay '
+                          'tolerated otherwise'),
+    ],
+    'asyncio': [
+        cfg.IntOpt('threads', default=32,
+                   help='Threads running handlers under jumpgate --asyncio. '
+                        'Each request holds one until it is answered, so '
+                        'this is the most requests in flight'),
+        cfg.IntOpt('max_pending', default=4096,
+                   help='Requests waiting for or holding a thread before '
+                        'new ones are refused with a 503'),
+        cfg.FloatOpt('header_timeout', default=10,
+                     help='Seconds a client has to send the headers of a '
+                          'request'),
+        cfg.FloatOpt('body_timeout', default=60,
+                     help='Seconds a handler waits for more of a request '
+                          'body before the connection is closed'),
+    ],
+    'profiling': [
+        cfg.IntOpt('sample_rate', default=0,
+                   help='Profile one in this many requests when the '
+                        'profile hooks are loaded; 0 turns sampling off'),
+        cfg.DictOpt('route_sample_rates', default={},
+                    help='Sample rates of routes, by route template, e.g. '
+                         '/compute/v2/{tenant_id}/servers/detail:10'),
+    ],
+    'tracing': [
+        cfg.BoolOpt('enabled', default=False,
+                    help='Trace sampled requests'),
+        cfg.FloatOpt('sample_ratio', default=0.01,
+                     help='Share of requests that are traced, unless a '
+                          'trusted traceparent header decides'),
+        cfg.BoolOpt('trust_traceparent', default=False,
+                    help='Trace requests by the sampled flag of their '
+                         'traceparent header. Only turn it on when every '
+                         'caller able to send the header is trusted, as '
+                         'each sampled request is exported'),
+        cfg.StrOpt('export_path', default='/var/log/jumpgate/traces.jsonl',
+                   help='File finished traces are appended to, one JSON '
+                        'span per line'),
+    ],
+    'slow_requests': [
+        cfg.FloatOpt('threshold', default=10.0,
+                     help='Seconds after which requests are logged as slow; '
+                          '0 turns the log off'),
+        cfg.DictOpt('route_thresholds', default={},
+                    help='Thresholds of routes, by route template, e.g. '
+                         '/compute/v2/{tenant_id}/servers/detail:30'),
+        cfg.IntOpt('repeated_calls', default=5,
+                   help='Times one request may make the same SoftLayer '
+                        'call before it is flagged'),
+        cfg.DictOpt('call_budgets', default={},
+                    help='Most SoftLayer calls a route may make, by route '
+                         'template'),
+        cfg.BoolOpt('enforce_call_budgets', default=False,
+                    help='Fail requests going over their call budget '
+                         'instead of logging them; meant for tests'),
     ],
     'identity': [
         cfg.StrOpt('driver', default='jumpgate.identity.drivers.sl'),
@@ -52,6 +274,13 @@ FILE_OPTIONS = {
     'image': [
         cfg.StrOpt('driver', default='jumpgate.image.drivers.sl'),
         cfg.StrOpt('mount', default='/image'),
+        cfg.StrOpt('store_driver', default='jumpgate.image.drivers.core.'
+                   'FileImageStoreDriver'),
+        cfg.StrOpt('store_path', default='/var/lib/jumpgate/images',
+                   help='Directory used by the file image store driver'),
+        cfg.IntOpt('chunk_size', default=65536,
+                   help='Bytes moved per read/write when streaming image '
+                        'files'),
     ],
     'block_storage': [
         cfg.StrOpt('driver', default='jumpgate.block_storage.drivers.sl'),
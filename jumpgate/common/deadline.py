@@ -0,0 +1,56 @@
+"""Request deadlines.
+
+Every request gets a deadline when it arrives: request_timeout seconds from
+then, or the number of seconds given in an X-Request-Deadline header, up to
+max_request_timeout. A header value which isn't a number of seconds, or is
+below min_request_timeout, fails the request with a 400. The time left is
+the timeout of each SoftLayer API call made for the request, so a worker
+stops waiting on the API once the client has given up.
+"""
+import math
+import time
+
+from jumpgate.common.exceptions import DeadlineExceeded, ResponseException
+from jumpgate.config import CONF
+
+DEADLINE_HEADER = 'X-REQUEST-DEADLINE'
+
+
+def from_request(req, now=None):
+    """Return the time by which the request has to be answered."""
+    timeout = CONF['request_timeout']
+    header = req.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            timeout = float(header)
+        except ValueError:
+            timeout = None
+        if (timeout is None or math.isnan(timeout) or
+                timeout < CONF['min_request_timeout']):
+            raise ResponseException('Invalid X-Request-Deadline header',
+                                    error_type='badRequest', code=400)
+        timeout = min(timeout, CONF['max_request_timeout'])
+    return (now or time.time()) + timeout
+
+
+def get_deadline(req):
+    return req.env.get('request_deadline')
+
+
+def remaining(req, limit=None):
+    """Return the seconds left before the deadline of the request, at most
+    limit. Returns limit if the request has no deadline.
+    """
+    deadline = get_deadline(req)
+    if deadline is None:
+        return limit
+    left = max(0.0, deadline - time.time())
+    if limit is not None:
+        left = min(left, limit)
+    return left
+
+
+def check(deadline):
+    """Raise DeadlineExceeded once a deadline has passed."""
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded()
@@ -1,17 +1,71 @@
 from collections import OrderedDict
 import logging
+
+from jumpgate.common import metrics
+from jumpgate.common import timing
+from jumpgate.common import tracing
+from jumpgate.common.admission import NORMAL, PRIORITIES, PrioritizedResource
+from jumpgate.common.utils import propagate_argspec
+from jumpgate.config import CONF
+
 LOG = logging.getLogger(__name__)
 
+ROUTE_IN_FLIGHT = metrics.gauge(
+    'jumpgate_route_in_flight_requests',
+    'Requests being handled, by route',
+    ['route'])
+
+
+class RoutedResource(object):
+    """Wraps the resource of an endpoint so requests know which route
+    they're served by and are counted while in flight.
+    """
+
+    def __init__(self, resource, route):
+        self.resource = resource
+        self.route = route
+
+    def __getattr__(self, name):
+        attr = getattr(self.resource, name)
+        if not name.startswith('on_') or not callable(attr):
+            return attr
+
+        in_flight = ROUTE_IN_FLIGHT.labels(self.route)
+        timed_attr = tracing.traced('responder',
+                                    timing.timed('responder', attr))
+
+        def responder(req, resp, **kwargs):
+            req.env['jumpgate.route'] = self.route
+            in_flight.inc()
+            try:
+                timed_attr(req, resp, **kwargs)
+            finally:
+                in_flight.dec()
+
+        propagate_argspec(responder, attr)
+        return responder
+
 
 class Dispatcher(object):
     def __init__(self, mount=None):
         self._endpoints = OrderedDict()
+        self._priorities = {}
         self.mount = mount
 
-    def add_endpoint(self, nickname, endpoint):
+    def add_endpoint(self, nickname, endpoint, priority=NORMAL):
         if self.mount:
             endpoint = self.mount + endpoint
         self._endpoints[nickname] = (endpoint, None)
+        self.set_priority(nickname, priority)
+
+    def get_priority(self, nickname):
+        return self._priorities.get(nickname, NORMAL)
+
+    def set_priority(self, nickname, priority):
+        if priority not in PRIORITIES:
+            raise ValueError("Unsupported priority '%s' specified." %
+                             priority)
+        self._priorities[nickname] = priority
 
     def get_endpoint_path(self, req, nickname, **kwargs):
         path = ''
@@ -52,8 +106,10 @@ class Dispatcher(object):
 
     def get_routes(self):
         endpoints = []
-        for endpoint, h in self._endpoints.values():
+        for nickname, (endpoint, h) in self._endpoints.items():
             if h:
-                endpoints.append((endpoint, h))
+                if CONF['admission']['enabled']:
+                    h = PrioritizedResource(h, self.get_priority(nickname))
+                endpoints.append((endpoint, RoutedResource(h, endpoint)))
 
         return endpoints
@@ -23,6 +23,10 @@ def duplicate(resp, message, details=None, code=409):
     error(resp, 'duplicate', message, details=details, code=code)
 
 
+def range_not_satisfiable(resp, message, details=None, code=416):
+    error(resp, 'rangeNotSatisfiable', message, details=details, code=code)
+
+
 def error(resp, error_type, message, details=None, code=500):
     error_dict = {
         'code': str(code),
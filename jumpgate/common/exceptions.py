@@ -27,6 +27,15 @@ class Unauthorized(ResponseException):
     code = 401
 
 
+class Forbidden(ResponseException):
+    error_type = 'forbidden'
+    code = 403
+
+    def __init__(self, msg='Forbidden', details=None):
+        ResponseException.__init__(self, msg, error_type=self.error_type,
+                                   details=details)
+
+
 class InvalidTokenError(Unauthorized):
 
     @staticmethod
@@ -35,3 +44,28 @@ class InvalidTokenError(Unauthorized):
         error(resp, ex.error_type, "The token is either malformed, "
               "expired or not valid for the given user/tenant pair",
               details=ex.details, code=ex.code)
+
+
+class DeadlineExceeded(ResponseException):
+    error_type = 'computeFault'
+    code = 504
+
+    def __init__(self, msg='Request deadline exceeded', details=None):
+        ResponseException.__init__(self, msg, error_type=self.error_type,
+                                   details=details)
+
+
+class ServiceUnavailable(ResponseException):
+    error_type = 'computeFault'
+    code = 503
+
+    def __init__(self, msg='Service Unavailable', details=None,
+                 retry_after=1):
+        ResponseException.__init__(self, msg, error_type=self.error_type,
+                                   details=details)
+        self.retry_after = retry_after
+
+    @staticmethod
+    def handle(ex, req, resp, params):
+        resp.set_header('Retry-After', str(int(ex.retry_after)))
+        ResponseException.handle(ex, req, resp, params)
@@ -1,7 +1,13 @@
 import importlib
 import logging
+import sys
+
+from six.moves import reload_module
 
 from jumpgate.common.config import CONF
+from jumpgate.common import timing
+from jumpgate.common import tracing
+from jumpgate.common.utils import on_reset
 
 
 LOG = logging.getLogger(__name__)
@@ -15,10 +21,13 @@ class APIHooks(object):
         def __init__(self):
             self.reset()
 
-        def reset(self):
+        def reset(self, reload_modules=False):
             self._req_hooks = {'optional': [], 'required': []}
             self._res_hooks = {'optional': [], 'required': []}
             self._loaded = False
+            # Hook modules register their hooks when imported, so modules
+            # imported already have to be reloaded to register them again
+            self._reload_modules = reload_modules
 
         def load_hooks(self):
             if not self._loaded:
@@ -31,7 +40,10 @@ class APIHooks(object):
 
         def _load_module(self, module):
             try:
-                importlib.import_module(module)
+                if self._reload_modules and module in sys.modules:
+                    reload_module(sys.modules[module])
+                else:
+                    importlib.import_module(module)
             except ImportError:
                 raise ImportError("Failed to import hook module '%s'. "
                                   "Verify it exists in PYTHONPATH" % (module))
@@ -66,6 +78,15 @@ class APIHooks(object):
             self.load_hooks()
             return list(self._res_hooks['optional'])
 
+        def instrument_hooks(self, hooks):
+            """Wrap hooks so their time is recorded while phase timing is
+            on and they run in a span of traced requests.
+            """
+            return [tracing.traced(timing.phase_name(hook),
+                                   timing.timed(timing.phase_name(hook),
+                                                hook))
+                    for hook in hooks]
+
     instance = None
 
     def __new__(cls):
@@ -80,6 +101,11 @@ class APIHooks(object):
         return setattr(self.instance, name)
 
 
+@on_reset
+def _reset():
+    APIHooks().reset(reload_modules=True)
+
+
 def request_hook(optional=True):
     """Decorator for request hook functions.
     Request hook functions should take 3 arguments:
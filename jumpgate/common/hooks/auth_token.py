@@ -7,12 +7,13 @@ from jumpgate.identity.drivers import core as identity
 
 
 LOG = logging.getLogger(__name__)
-NOAUTH = [re.compile(e) for e in ['GET:/$', 'GET:\/v[\d]+[\/]?$',
-                                  'GET:\/v[\d]+.[\d]+[\/]?$',
-                                  'POST:\/v[\d]+\/tokens$',
-                                  'POST:\/v[\d]+.[\d]+\/tokens$',
-                                  'GET:\/v[\d]+\/tokens/\w+$',
-                                  'GET:\/v[\d]+.[\d]+\/tokens/\w+$']]
+NOAUTH = [re.compile(e) for e in ['GET:/$', r'GET:\/v[\d]+[\/]?$',
+                                  r'GET:\/v[\d]+.[\d]+[\/]?$',
+                                  r'POST:\/v[\d]+\/tokens$',
+                                  r'POST:\/v[\d]+.[\d]+\/tokens$',
+                                  r'GET:\/v[\d]+\/tokens/\w+$',
+                                  r'GET:\/v[\d]+.[\d]+\/tokens/\w+$',
+                                  r'GET:\/metrics$']]
 
 
 def protected(target):
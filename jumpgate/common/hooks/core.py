@@ -1,9 +1,35 @@
 import json
+import time
 import uuid
 
 import falcon.status_codes
 
+from jumpgate.common import admission
+from jumpgate.common import deadline
+from jumpgate.common import metrics
+from jumpgate.common import slowlog
 from jumpgate.common.hooks import request_hook, response_hook
+from jumpgate.config import CONF
+
+# Requests which never reached a route
+UNMATCHED = 'unmatched'
+# Methods get their own label; clients may send any token as the method
+METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                     'OPTIONS'])
+OTHER_METHOD = 'other'
+
+REQUEST_DURATION = metrics.histogram(
+    'jumpgate_request_duration_seconds',
+    'Time from the arrival of requests to their response, by route',
+    ['method', 'route'])
+REQUESTS = metrics.counter(
+    'jumpgate_requests',
+    'Requests answered, by route and status code',
+    ['method', 'route', 'status'])
+SL_CALL_DURATION = metrics.histogram(
+    'jumpgate_sl_call_duration_seconds',
+    'Duration of SoftLayer API calls, by service and method',
+    ['call'])
 
 
 @response_hook(False)
@@ -21,6 +47,58 @@ def hook_format(req, resp):
     resp.set_header('X-Compute-Request-Id', req.env['REQUEST_ID'])
 
 
+@response_hook(False)
+def hook_finish_request(req, resp):
+    if req.env.pop('admitted', False):
+        admission.get_delay_controller().finish()
+
+
+@response_hook(False)
+def hook_record_request(req, resp):
+    route = req.env.get('jumpgate.route', UNMATCHED)
+    method = req.method if req.method in METHODS else OTHER_METHOD
+    start_time = req.env.get('jumpgate.request_start')
+    if start_time is not None:
+        REQUEST_DURATION.labels(method, route).observe(
+            time.time() - start_time)
+    REQUESTS.labels(method, route, str(resp.status).split(' ')[0]).inc()
+
+    # Calls logged by a TimedClient; entries starting with [ are time spent
+    # around the calls, not calls
+    client = req.env.get('sl_client')
+    for call, _, duration in getattr(client, 'last_calls', None) or []:
+        if not call.startswith('['):
+            SL_CALL_DURATION.labels(call).observe(duration)
+
+
+@response_hook(False)
+def hook_log_slow_request(req, resp):
+    start_time = req.env.get('jumpgate.request_start')
+    if start_time is None:
+        return
+    client = req.env.get('sl_client')
+    slowlog.get_log().record(req, req.env.get('jumpgate.route', UNMATCHED),
+                             start_time, time.time() - start_time,
+                             getattr(client, 'last_calls', None) or [])
+
+
 @request_hook(False)
 def hook_set_uuid(req, resp, kwargs):
     req.env['REQUEST_ID'] = 'req-' + str(uuid.uuid1())
+
+
+@request_hook(False)
+def hook_set_deadline(req, resp, kwargs):
+    req.env['request_deadline'] = deadline.from_request(req)
+    deadline.check(req.env['request_deadline'])
+
+
+@request_hook(False)
+def hook_admit(req, resp, kwargs):
+    # Servers record when they accepted the request
+    req.env.setdefault('jumpgate.request_start', time.time())
+    if not CONF['admission']['shed_queued_requests']:
+        return
+    delay = time.time() - admission.request_start(req)
+    admission.get_delay_controller().admit(delay)
+    req.env['admitted'] = True
@@ -1,4 +1,5 @@
 import logging
+import time
 
 from jumpgate.common.hooks import response_hook
 
@@ -7,9 +8,21 @@ LOG = logging.getLogger(__name__)
 
 @response_hook(True)
 def log_request(req, resp):
+    fields = {
+        'request_id': req.env['REQUEST_ID'],
+        'method': req.method,
+        'path': req.path,
+        'query': req.query_string,
+        'status': str(resp.status).split(' ')[0],
+        'route': req.env.get('jumpgate.route'),
+    }
+    start_time = req.env.get('jumpgate.request_start')
+    if start_time is not None:
+        fields['duration'] = time.time() - start_time
     LOG.info('%s %s %s %s [ReqId: %s]',
              req.method,
              req.path,
              req.query_string,
              resp.status,
-             req.env['REQUEST_ID'])
+             req.env['REQUEST_ID'],
+             extra={'fields': fields})
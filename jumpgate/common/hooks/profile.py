@@ -0,0 +1,28 @@
+import cProfile
+
+from jumpgate.common import profiling
+from jumpgate.common.hooks import request_hook, response_hook
+from jumpgate.common.hooks.core import UNMATCHED
+
+
+@request_hook(True)
+def start_profile(req, resp, kwargs):
+    if not profiling.get_sampler().sample(req.path):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running on this thread
+        return
+    req.env['jumpgate.profiler'] = profiler
+
+
+@response_hook(True)
+def stop_profile(req, resp):
+    profiler = req.env.pop('jumpgate.profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    profiling.get_store().add(req.env.get('jumpgate.route', UNMATCHED),
+                              profiler)
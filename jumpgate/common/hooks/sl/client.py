@@ -1,7 +1,9 @@
 import SoftLayer
 from oslo.config import cfg
+from jumpgate.common.deadline import get_deadline
 from jumpgate.common.hooks import request_hook
 from jumpgate.common.sl.auth import get_auth
+from jumpgate.common.sl.client import wrap_client
 
 
 @request_hook(True)
@@ -13,9 +15,12 @@ def bind_client(req, resp, kwargs):
     client = SoftLayer.Client(endpoint_url=cfg.CONF['softlayer']['endpoint'],
                               **extra_args)
     client.auth = None
-    req.env['sl_client'] = client
 
     auth_token = req.env.get('auth', None)
 
     if auth_token is not None:
         client.auth = get_auth(auth_token)
+
+    req.env['sl_client'] = wrap_client(client,
+                                       tenant_id=req.env.get('tenant_id'),
+                                       deadline=get_deadline(req))
@@ -1,8 +1,10 @@
 import time
 from SoftLayer import TimedClient
 from oslo.config import cfg
+from jumpgate.common.deadline import get_deadline
 from jumpgate.common.hooks import request_hook
 from jumpgate.common.sl.auth import get_auth
+from jumpgate.common.sl.client import wrap_client
 
 
 @request_hook(True)
@@ -11,9 +13,12 @@ def bind_client(req, resp, kwargs):
     client = TimedClient(endpoint_url=cfg.CONF['softlayer']['endpoint'],
                          proxy=cfg.CONF['softlayer']['proxy'])
     client.auth = None
-    req.env['sl_client'] = client
 
     auth_token = req.env.get('auth', None)
 
     if auth_token is not None:
         client.auth = get_auth(auth_token)
+
+    req.env['sl_client'] = wrap_client(client,
+                                       tenant_id=req.env.get('tenant_id'),
+                                       deadline=get_deadline(req))
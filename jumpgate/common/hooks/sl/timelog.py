@@ -1,6 +1,9 @@
 import time
 import logging
+from jumpgate.common import timing
 from jumpgate.common.hooks import response_hook
+from jumpgate.common.sl.fanout import BRANCH_PREFIX
+from jumpgate.common.sl.scheduler import QUEUE_PREFIX
 
 LOG = logging.getLogger(__name__)
 
@@ -16,20 +19,42 @@ def log_request(req, resp):
     timed_client = req.env['sl_client']
     overall = end_time - start_time
     sl_total = 0
+    queue_total = 0
     for call, time_stamp, duration in timed_client.get_last_calls():
-        LOG.info(
+        LOG.debug(
             "[ReqId: %s] %s %s %s",
             req.env['REQUEST_ID'],
             call,
             time_stamp,
             duration)
-        sl_total = sl_total + duration
+        if call.startswith(QUEUE_PREFIX):
+            queue_total = queue_total + duration
+        elif not call.startswith(BRANCH_PREFIX):
+            sl_total = sl_total + duration
+    # Phases recorded so far, when phase timing is on
+    phases = ''.join(', %s: %s' % (phase, duration)
+                     for phase, duration in timing.get_timings(req))
+    fields = {
+        'request_id': req.env['REQUEST_ID'],
+        'method': req.method,
+        'path': req.path,
+        'total': overall,
+        'sl_call': sl_total,
+        'sl_queue': queue_total,
+        'jumpgate': overall - sl_total - queue_total,
+        'phases': dict(timing.get_timings(req)),
+    }
     LOG.info(
-        "[ReqId: %s] %s %s Total: %s, SL Call: %s, Jumpgate: %s",
+        "[ReqId: %s] %s %s Total: %s, SL Call: %s, SL Queue: %s, "
+        "Jumpgate: %s%s",
         req.env['REQUEST_ID'],
         req.method,
         req.path,
         overall,
         sl_total,
+        queue_total,
         overall -
-        sl_total)
+        sl_total -
+        queue_total,
+        phases,
+        extra={'fields': fields})
@@ -0,0 +1,227 @@
+import errno
+import glob
+import json
+import logging
+import os
+import os.path
+import select
+import socket
+import threading
+import time
+
+from jumpgate.common import metrics
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+MAX_MESSAGE_SIZE = 64 * 1024
+# Sent by a bus when it starts so the others add it to their peers at once
+JOIN_TOPIC = '[join]'
+
+MESSAGES = metrics.counter(
+    'jumpgate_invalidation_messages',
+    'Cache invalidation messages exchanged between workers',
+    ['topic', 'direction'])
+DROPPED_MESSAGES = metrics.counter(
+    'jumpgate_invalidation_dropped',
+    'Cache invalidation messages which could not be delivered to a worker')
+
+
+class InvalidationBus(object):
+    """Broadcasts cache invalidations between the worker processes on a
+    host over Unix datagram sockets.
+
+    Every worker binds a socket in a common directory and listens on it
+    from a daemon thread. Publishing sends a small JSON message to every
+    other socket without waiting, so a slow or dead worker can never hold
+    up a request; a message that can't be delivered right away is dropped.
+    Receivers hand each message to the handlers subscribed to its topic.
+
+    The sockets of the other workers are listed once at start and then
+    every refresh_interval seconds from the listening thread, so publishing
+    never touches the directory. A starting worker also announces itself
+    to the others.
+    """
+
+    def __init__(self, path, handlers=None, refresh_interval=5.0):
+        self.path = path
+        self.pid = os.getpid()
+        self.address = os.path.join(path, '%s.sock' % self.pid)
+        self.handlers = handlers if handlers is not None else {}
+        self.refresh_interval = refresh_interval
+        self._peers = []
+        self._sock = None
+        self._thread = None
+
+    def subscribe(self, topic, handler):
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def start(self):
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._unlink(self.address)
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.address)
+        self.refresh_peers()
+        self._send(JOIN_TOPIC, [self.address])
+        self._thread = threading.Thread(target=self._listen,
+                                        args=(self._sock,),
+                                        name='invalidation-bus')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        # Wake the listening thread and let it stop before the socket goes
+        try:
+            sock.sendto(b'', socket.MSG_DONTWAIT, self.address)
+        except socket.error:
+            pass
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(1)
+        self._unlink(self.address)
+        sock.close()
+
+    def peers(self):
+        return list(self._peers)
+
+    def refresh_peers(self):
+        self._peers = [
+            address
+            for address in glob.glob(os.path.join(self.path, '*.sock'))
+            if address != self.address]
+
+    def publish(self, topic, *args):
+        """Send an invalidation to every other worker. args must be JSON
+        serializable and are passed to the subscribed handlers.
+        """
+        if self._send(topic, args):
+            MESSAGES.labels(topic, 'sent').inc()
+
+    def _send(self, topic, args):
+        sock = self._sock
+        if sock is None:
+            return False
+        message = json.dumps({'topic': topic, 'args': args}).encode('utf-8')
+        if len(message) > MAX_MESSAGE_SIZE:
+            LOG.warning('Invalidation for %s too large to publish', topic)
+            return False
+
+        for address in self._peers:
+            try:
+                sock.sendto(message, socket.MSG_DONTWAIT, address)
+            except socket.error as e:
+                DROPPED_MESSAGES.inc()
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # Nobody listens there anymore; the worker is gone
+                    self._unlink(address)
+                    self._peers = [peer for peer in self._peers
+                                   if peer != address]
+                else:
+                    LOG.debug('Unable to notify %s: %s', address, e)
+        return True
+
+    def _listen(self, sock):
+        refresh_at = time.time() + self.refresh_interval
+        while self._sock is sock:
+            try:
+                readable, _, _ = select.select(
+                    [sock], [], [], max(0, refresh_at - time.time()))
+                if self._sock is not sock:
+                    return
+                data = sock.recv(MAX_MESSAGE_SIZE) if readable else None
+            except (socket.error, select.error, ValueError, TypeError):
+                if self._sock is not sock:
+                    return
+                LOG.exception('Invalidation bus receive failed')
+                continue
+            if data is not None:
+                self.handle(data)
+            if time.time() >= refresh_at:
+                self.refresh_peers()
+                refresh_at = time.time() + self.refresh_interval
+
+    def handle(self, data):
+        try:
+            message = json.loads(data.decode('utf-8'))
+            topic, args = message['topic'], message['args']
+        except (ValueError, KeyError, TypeError):
+            LOG.warning('Ignoring malformed invalidation message')
+            return
+
+        if topic == JOIN_TOPIC:
+            if args and args[0] not in self._peers:
+                self._peers = self._peers + [args[0]]
+            return
+
+        MESSAGES.labels(topic, 'received').inc()
+        for handler in self.handlers.get(topic, []):
+            try:
+                handler(*args)
+            except Exception:
+                LOG.exception('Invalidation handler for %s failed', topic)
+
+    @staticmethod
+    def _unlink(address):
+        try:
+            os.unlink(address)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+_bus = None
+# Handlers subscribed in this process, shared with its bus
+_handlers = {}
+# The process, if any, which leaves starting buses to its forked workers
+_deferred_pid = None
+
+
+@on_reset
+def _reset():
+    # The caches subscribe again when they are made
+    _handlers.clear()
+
+
+def defer():
+    """Don't run a bus in the current process. Used by the master of
+    'jumpgate serve', whose workers call get_bus() once forked.
+    """
+    global _deferred_pid
+    _deferred_pid = os.getpid()
+
+
+def get_bus():
+    """Return the bus of the current process, or None when disabled. A
+    worker forked from a process with a bus gets its own, keeping the
+    subscriptions made before the fork.
+    """
+    global _bus
+    conf = CONF['cache']
+    if not conf['invalidation_bus'] or os.getpid() == _deferred_pid:
+        return None
+
+    if _bus is None or _bus.pid != os.getpid():
+        _bus = InvalidationBus(conf['invalidation_bus_path'], _handlers)
+        _bus.start()
+    return _bus
+
+
+def publish(topic, *args):
+    bus = get_bus()
+    if bus is not None:
+        bus.publish(topic, *args)
+
+
+def subscribe(topic, handler):
+    _handlers.setdefault(topic, []).append(handler)
+    # Start listening
+    get_bus()
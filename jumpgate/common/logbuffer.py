@@ -0,0 +1,147 @@
+"""Logging off the request thread.
+
+BufferedHandler formats a record where it's logged, which is cheap, and
+queues the line for a writer thread that writes whatever has queued up in
+one go. A slow terminal or disk then holds up the writer instead of the
+requests. The queue holds at most queue_size lines; lines logged while it's
+full are dropped, counted in jumpgate_dropped_log_records and reported in
+the log once there's room again.
+
+JsonFormatter writes each record as one JSON object, with the fields a
+record was logged with as extra={'fields': {...}} merged in.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from six.moves import queue
+
+from jumpgate.common import metrics
+
+DROPPED_RECORDS = metrics.counter(
+    'jumpgate_dropped_log_records',
+    'Log records dropped because the log queue was full')
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BufferedHandler(logging.Handler):
+    """Writes formatted records to a stream from a background thread.
+
+    :param stream: File-like object to write to
+    :param queue_size: Most lines waiting to be written
+    :param batch_size: Most lines written at a time
+    :param flush_interval: Seconds the writer waits to fill a batch
+    """
+
+    def __init__(self, stream, queue_size=10000, batch_size=100,
+                 flush_interval=0.5):
+        logging.Handler.__init__(self)
+        self.stream = stream
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _writer(self):
+        """Return the queue of the writer of this process. Threads don't
+        survive a fork, so a forked worker starts its own.
+        """
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.queue_size)
+                    self._thread = threading.Thread(target=self._write,
+                                                    name='log-writer')
+                    self._thread.daemon = True
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self._writer().put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED_RECORDS.inc()
+
+    def _next_batch(self, first):
+        batch = [first]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            timeout = deadline - time.time()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self):
+        while True:
+            batch = self._next_batch(self._queue.get())
+            stop = batch[-1] is _STOP
+            lines = [line for line in batch if line is not _STOP]
+            dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append('%d log records were dropped' % dropped)
+            try:
+                if lines:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+            except Exception:
+                # Nowhere left to report it
+                pass
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _running(self):
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def flush(self, timeout=5):
+        """Wait for the queued lines to be written, for at most timeout
+        seconds.
+        """
+        deadline = time.time() + timeout
+        while (self._running() and self._queue.unfinished_tasks and
+               time.time() < deadline):
+            time.sleep(0.01)
+
+    def close(self):
+        if self._running():
+            try:
+                self._queue.put(_STOP, timeout=5)
+                self._thread.join(5)
+            except queue.Full:
+                pass
+            self._pid = None
+        logging.Handler.close(self)
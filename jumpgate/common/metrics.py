@@ -0,0 +1,282 @@
+"""A small in-process metrics registry.
+
+Each labelled sample has its own lock, so recording only contends with
+other threads recording into the same sample, and collecting copies the
+samples without stopping anything else. The registry is served in the
+Prometheus text format at /metrics.
+"""
+import bisect
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0)
+INF = float('inf')
+
+
+class _Value(object):
+    """A single labelled sample guarded by its own lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.count += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+
+    def set(self, value):
+        with self._lock:
+            self.count = value
+
+
+class _HistogramValue(_Value):
+    def __init__(self, buckets):
+        _Value.__init__(self)
+        self.buckets = buckets
+        # The last one counts observations above every bucket
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.bucket_counts[index] += 1
+
+    def read(self):
+        with self._lock:
+            return self.count, self.sum, list(self.bucket_counts)
+
+
+class Metric(object):
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _new_value(self):
+        return _Value()
+
+    def labels(self, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError('Expected labels %s for metric %s' %
+                             (self.labelnames, self.name))
+
+        labelvalues = tuple(str(v) for v in labelvalues)
+        value = self._values.get(labelvalues)
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(labelvalues,
+                                                self._new_value())
+        return value
+
+    def samples(self):
+        """Return a list of (suffix, labels, value) tuples."""
+        raise NotImplementedError()
+
+    def _items(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, k)), v) for k, v in items]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [('_total', labels, value.count)
+                for labels, value in self._items()]
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def samples(self):
+        return [('', labels, value.count)
+                for labels, value in self._items()]
+
+
+class Summary(Metric):
+    type = 'summary'
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        results = []
+        for labels, value in self._items():
+            results.append(('_count', labels, value.count))
+            results.append(('_sum', labels, value.sum))
+        return results
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        results = []
+        for labels, value in self._items():
+            count, total, bucket_counts = value.read()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (INF,),
+                                           bucket_counts):
+                cumulative += bucket_count
+                results.append(('_bucket', dict(labels, le=bound),
+                                cumulative))
+            results.append(('_count', labels, count))
+            results.append(('_sum', labels, total))
+        return results
+
+
+def _format_value(value):
+    if value == INF:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%.1f' % value
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for name in sorted(labels):
+        value = labels[name]
+        if not isinstance(value, str):
+            value = _format_value(value)
+        value = (value.replace('\\', '\\\\').replace('\n', '\\n')
+                 .replace('"', '\\"'))
+        pairs.append('%s="%s"' % (name, value))
+    return '{%s}' % ','.join(pairs)
+
+
+class Registry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError('Metric %s already registered as %s' %
+                                     (metric.name, existing.type))
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return sorted(metrics, key=lambda m: m.name)
+
+    def snapshot(self):
+        """Return every sample as a plain dict, handy for logging and
+        debugging endpoints.
+        """
+        results = {}
+        for metric in self.collect():
+            for suffix, labels, value in metric.samples():
+                key = metric.name + suffix
+                if labels:
+                    key += '{%s}' % ','.join('%s=%s' % (k, labels[k])
+                                             for k in sorted(labels))
+                results[key] = value
+        return results
+
+    def exposition(self):
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.collect():
+            name = metric.name
+            if metric.type == 'counter':
+                name += '_total'
+            lines.append('# HELP %s %s' % (
+                name, metric.documentation.replace('\\', '\\\\')
+                .replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for suffix, labels, value in metric.samples():
+                lines.append('%s%s%s %s' % (metric.name, suffix,
+                                            _format_labels(labels),
+                                            _format_value(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._metrics = {}
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def summary(name, documentation, labelnames=()):
+    return REGISTRY.register(Summary(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames,
+                                       buckets))
+
+
+class MetricsResource(object):
+    """Serves the registry for scrapers."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or REGISTRY
+
+    def on_get(self, req, resp):
+        resp.status = 200
+        resp.content_type = CONTENT_TYPE
+        resp.body = self.registry.exposition()
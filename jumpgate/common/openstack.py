@@ -1,7 +1,17 @@
+import hashlib
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from oslo.config import cfg
 
+from jumpgate.common import invalidation
+from jumpgate.common import metrics
+from jumpgate.common.cache import SharedCache, make_cache
+from jumpgate.common.streams import ChunkedStream
+from jumpgate.common.utils import on_reset
+
 opts = [
     cfg.StrOpt('baremetal_endpoint', default='http://127.0.0.1:6385'),
     cfg.StrOpt('compute_endpoint', default='http://127.0.0.1:8774'),
@@ -9,72 +19,417 @@ opts = [
     cfg.StrOpt('image_endpoint', default='http://127.0.0.1:9292'),
     cfg.StrOpt('network_endpoint', default='http://127.0.0.1:9696'),
     cfg.StrOpt('volume_endpoint', default='http://127.0.0.1:8776'),
+    cfg.IntOpt('pool_size', default=10,
+               help='Maximum pooled connections kept per upstream'),
+    cfg.BoolOpt('pool_block', default=False,
+                help='Wait for a free pooled connection instead of opening '
+                     'an extra one when the pool is exhausted'),
+    cfg.BoolOpt('keep_alive', default=True,
+                help='Reuse upstream connections between requests'),
+    cfg.FloatOpt('connect_timeout', default=5.0,
+                 help='Seconds to wait for an upstream connection'),
+    cfg.FloatOpt('read_timeout', default=600.0,
+                 help='Seconds to wait for upstream response data'),
+    cfg.IntOpt('chunk_size', default=65536,
+               help='Buffer size used when streaming proxied bodies'),
+    cfg.BoolOpt('cache_enabled', default=False,
+                help='Cache GET responses from upstreams according to '
+                     'their Cache-Control and validator headers'),
+    cfg.IntOpt('cache_max_bytes', default=64 * 1024 * 1024,
+               help='Memory budget for cached upstream responses'),
+    cfg.IntOpt('cache_max_entry_bytes', default=1024 * 1024,
+               help='Largest upstream response body that will be cached'),
 ]
 
 cfg.CONF.register_opts(opts, group='openstack')
 
+UPSTREAM_REQUESTS = metrics.counter(
+    'jumpgate_upstream_requests', 'Requests proxied to OpenStack upstreams',
+    ['upstream'])
+UPSTREAM_ERRORS = metrics.counter(
+    'jumpgate_upstream_errors',
+    'Proxied requests that failed or returned a 5xx status', ['upstream'])
+UPSTREAM_LATENCY = metrics.summary(
+    'jumpgate_upstream_latency_seconds',
+    'Time until upstream response headers were received', ['upstream'])
+CACHE_LOOKUPS = metrics.counter(
+    'jumpgate_upstream_cache_lookups',
+    'Response cache lookups by result (hit, miss or revalidated)',
+    ['upstream', 'result'])
+
+# Headers meaningful only for a single transport-level connection which
+# must not be forwarded by proxies. See RFC 2616 section 13.5.1.
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'trailers',
+    'transfer-encoding',
+    'upgrade',
+])
+
+_sessions = {}
+_response_cache = None
+
+
+@on_reset
+def _reset():
+    global _response_cache
+    _response_cache = None
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
+
+
+def get_session(endpoint):
+    """Return the pooled session shared by every responder proxying to the
+    given upstream endpoint.
+    """
+    session = _sessions.get(endpoint)
+    if session is None:
+        conf = cfg.CONF['openstack']
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=conf['pool_size'],
+                              pool_block=conf['pool_block'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not conf['keep_alive']:
+            session.headers['Connection'] = 'close'
+        _sessions[endpoint] = session
+    return session
+
+
+def get_response_cache():
+    """Return the response cache shared by all upstreams, or None if
+    caching is disabled.
+    """
+    global _response_cache
+    conf = cfg.CONF['openstack']
+    if conf['cache_enabled'] and _response_cache is None:
+        _response_cache = ResponseCache(conf['cache_max_bytes'],
+                                        conf['cache_max_entry_bytes'])
+        if not _response_cache.shared:
+            invalidation.subscribe('openstack_responses',
+                                   _response_cache.invalidate)
+    return _response_cache
+
 
 def setup_responder(app, disp, service):
     endpoint = app.config['openstack'][service + '_endpoint'].rstrip('/')
-    responder = OpenStackResponder(disp.mount, endpoint)
+    responder = OpenStackResponder(disp.mount, endpoint,
+                                   session=get_session(endpoint),
+                                   name=service,
+                                   cache=get_response_cache())
 
     for endpoint in disp.get_unused_endpoints():
         disp.set_handler(endpoint, responder)
 
 
-class OpenstackStream(object):
-    def __init__(self, stream, size=None):
-        self.stream = stream
+def filter_headers(headers, exclude=()):
+    """Return a copy of headers without hop-by-hop headers, including any
+    named by the Connection header, or the explicitly excluded ones.
+    """
+    drop = set(HOP_BY_HOP_HEADERS)
+    drop.update(h.lower() for h in exclude)
+    for name, value in headers.items():
+        if name.lower() == 'connection':
+            drop.update(v.strip().lower() for v in value.split(','))
+
+    return dict((name, value) for name, value in headers.items()
+                if name.lower() not in drop)
+
+
+class OpenstackStream(ChunkedStream):
+    """Fixed-buffer stream used for proxied request and response bodies.
+
+    Data is pulled one chunk at a time, so a slow reader on either side
+    holds back the other instead of data piling up in memory. When the
+    size is unknown the body is sent using chunked transfer encoding.
+    """
+
+    def __init__(self, stream, size=None, chunk_size=None):
+        super(OpenstackStream, self).__init__(
+            stream,
+            chunk_size=chunk_size or cfg.CONF['openstack']['chunk_size'],
+            length=size)
         self.size = size
 
     def __len__(self):
-        return self.size
+        return self.size or 0
+
+    def __bool__(self):
+        # An unknown size must not make the body look empty
+        return True
+    __nonzero__ = __bool__
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into a dict of lowercase directives."""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+class CachedResponse(object):
+    """A fully buffered upstream response along with its freshness
+    lifetime and validators.
+    """
+
+    def __init__(self, status, headers, body, clock=time.time):
+        self.status = status
+        self.body = body
+        self.clock = clock
+        self.update(headers)
+
+    def update(self, headers):
+        """Refresh headers and freshness from a 200 or 304 response."""
+        headers = dict((k.lower(), v) for k, v in headers.items())
+        if hasattr(self, 'headers'):
+            merged = dict(self.headers)
+            merged.update(headers)
+            headers = merged
+        self.headers = headers
+        self.etag = headers.get('etag')
+        self.last_modified = headers.get('last-modified')
+
+        cache_control = parse_cache_control(headers.get('cache-control'))
+        max_age = 0
+        if 'no-cache' not in cache_control:
+            try:
+                max_age = int(cache_control.get('s-maxage') or
+                              cache_control.get('max-age') or 0)
+            except ValueError:
+                pass
+        self.expires = self.clock() + max_age
+
+    def is_fresh(self):
+        return self.clock() < self.expires
+
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
 
-    def read(self, size=None):
-        return self.stream.read(size=size)
+class ResponseCache(object):
+    """LRU cache of upstream GET responses keyed by upstream, path, query,
+    the identity of the caller and the representation it accepts.
 
-    def __iter__(self):
-        return self.stream.__iter__()
+    Responses varying on other request headers are not cached.
+    """
 
-    def __next__(self):
-        return self.stream.__next__()
-    next = __next__
+    # Request headers the key is made of
+    KEYED_HEADERS = frozenset(['accept', 'accept-encoding', 'x-auth-token'])
+
+    def __init__(self, max_bytes, max_entry_bytes, entries=None):
+        self.entries = entries or make_cache('openstack_responses',
+                                             max_bytes, max_entry_bytes)
+        self.max_entry_bytes = max_entry_bytes
+
+    @staticmethod
+    def make_key(upstream, relative_uri, token, accept=None,
+                 accept_encoding=None):
+        path, _, query = relative_uri.partition('?')
+        identity = None
+        if token:
+            identity = hashlib.sha1(token.encode('utf-8')).hexdigest()
+        return (upstream, path, query, identity, accept, accept_encoding)
+
+    @property
+    def shared(self):
+        """Whether the entries are shared with the other workers."""
+        return isinstance(self.entries, SharedCache)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def store(self, key, entry):
+        return self.entries.set(key, entry, len(entry.body))
+
+    def delete(self, key):
+        self.entries.delete(key)
+
+    def invalidate(self, upstream, path):
+        """Drop cached responses for a path and its parent collection after
+        a mutating request, for every caller and query string.
+        """
+        paths = set([path.rstrip('/'), path.rsplit('/', 1)[0]])
+        return self.entries.invalidate(
+            lambda key: key[0] == upstream and key[1].rstrip('/') in paths)
+
+    def is_cacheable(self, os_resp):
+        if os_resp.status_code != 200:
+            return False
+
+        cache_control = parse_cache_control(
+            os_resp.headers.get('Cache-Control'))
+        if 'no-store' in cache_control:
+            return False
+        vary = set(name.strip().lower() for name in
+                   os_resp.headers.get('Vary', '').split(',') if name.strip())
+        if not vary.issubset(self.KEYED_HEADERS):
+            return False
+
+        size = os_resp.headers.get('Content-Length')
+        if size is None or int(size) > self.max_entry_bytes:
+            return False
+
+        # Without a lifetime or validators the entry could never be reused
+        return bool('max-age' in cache_control or
+                    's-maxage' in cache_control or
+                    os_resp.headers.get('ETag') or
+                    os_resp.headers.get('Last-Modified'))
+
+    def hit_ratio(self, upstream):
+        hits = (CACHE_LOOKUPS.labels(upstream, 'hit').count +
+                CACHE_LOOKUPS.labels(upstream, 'revalidated').count)
+        total = hits + CACHE_LOOKUPS.labels(upstream, 'miss').count
+        if not total:
+            return 0.0
+        return float(hits) / total
 
 
 class OpenStackResponder(object):
-    def __init__(self, mount, endpoint):
+    def __init__(self, mount, endpoint, session=None, name=None, cache=None):
         self.mount = mount
         self.endpoint = endpoint
+        self.session = session or get_session(endpoint)
+        self.name = name or endpoint
+        self.cache = cache
+        conf = cfg.CONF['openstack']
+        self.timeout = (conf['connect_timeout'], conf['read_timeout'])
 
     def _standard_responder(self, req, resp, **_):
         data = None
         if (req.method == 'POST' or req.method == 'PUT'):
             if req.content_length:
                 data = OpenstackStream(req.stream, size=req.content_length)
+            elif 'chunked' in (req.get_header('transfer-encoding') or ''):
+                data = OpenstackStream(req.stream)
 
         relative_uri = req.relative_uri
         if self.mount:
             relative_uri = relative_uri.replace(self.mount, '', 1)
-        endpoint = self.endpoint + relative_uri
+        headers = filter_headers(req.headers,
+                                 exclude=['host', 'content-length'])
 
-        os_resp = requests.request(req.method,
-                                   endpoint,
-                                   data=data,
-                                   headers=req.headers,
-                                   stream=True)
+        if self.cache is not None and req.method in ('GET', 'HEAD'):
+            return self._cached_responder(req, resp, relative_uri, headers)
 
-        resp.status = os_resp.status_code
-        content_type = os_resp.headers.pop(
-            'Content-Type', 'application/json').split(';', 1)[0]
+        os_resp = self._request(req.method, relative_uri, data, headers)
+        if self.cache is not None and os_resp.status_code < 400:
+            path = relative_uri.partition('?')[0]
+            self.cache.invalidate(self.name, path)
+            if not self.cache.shared:
+                invalidation.publish('openstack_responses', self.name, path)
+        self._set_response(resp, os_resp)
+
+    def _cached_responder(self, req, resp, relative_uri, headers):
+        key = self.cache.make_key(self.name, relative_uri,
+                                  req.get_header('x-auth-token'),
+                                  req.get_header('accept'),
+                                  req.get_header('accept-encoding'))
+        entry = self.cache.get(key)
+        request_cc = parse_cache_control(req.get_header('cache-control'))
+
+        if (entry is not None and entry.is_fresh() and
+                'no-cache' not in request_cc):
+            CACHE_LOOKUPS.labels(self.name, 'hit').inc()
+            return self._set_cached_response(resp, entry)
+
+        if entry is not None and entry.has_validators():
+            headers = dict(headers)
+            headers.update(entry.conditional_headers())
+
+        os_resp = self._request(req.method, relative_uri, None, headers)
+
+        if entry is not None and os_resp.status_code == 304:
+            os_resp.close()
+            entry.update(os_resp.headers)
+            self.cache.store(key, entry)
+            CACHE_LOOKUPS.labels(self.name, 'revalidated').inc()
+            return self._set_cached_response(resp, entry)
+
+        CACHE_LOOKUPS.labels(self.name, 'miss').inc()
+        if req.method == 'GET' and self.cache.is_cacheable(os_resp):
+            body = os_resp.raw.read(int(os_resp.headers['Content-Length']),
+                                    decode_content=False)
+            entry = CachedResponse(os_resp.status_code,
+                                   filter_headers(os_resp.headers,
+                                                  exclude=['content-length']),
+                                   body)
+            self.cache.store(key, entry)
+            return self._set_cached_response(resp, entry)
+
+        if entry is not None and req.method == 'GET':
+            self.cache.delete(key)
+        self._set_response(resp, os_resp)
+
+    def _request(self, method, relative_uri, data, headers):
+        UPSTREAM_REQUESTS.labels(self.name).inc()
+        start_time = time.time()
+        try:
+            os_resp = self.session.request(method,
+                                           self.endpoint + relative_uri,
+                                           data=data,
+                                           headers=headers,
+                                           stream=True,
+                                           timeout=self.timeout)
+        except requests.RequestException:
+            UPSTREAM_ERRORS.labels(self.name).inc()
+            raise
+        finally:
+            UPSTREAM_LATENCY.labels(self.name).observe(
+                time.time() - start_time)
+
+        if os_resp.status_code >= 500:
+            UPSTREAM_ERRORS.labels(self.name).inc()
+        return os_resp
+
+    def _set_content_type(self, resp, content_type):
+        content_type = content_type.split(';', 1)[0]
 
         # Hack for test_delete_image_blank_id test. Somehow text/html comes
         # back as the content-type when it's supposed to be text/plain.
         if content_type == 'text/html':
             content_type = 'text/plain; charset=UTF-8'
         resp.content_type = content_type
-        resp.stream_len = os_resp.headers.pop('Content-Length', 0)
-        resp.set_headers(os_resp.headers)
-        resp.stream = os_resp.raw
+
+    def _set_response(self, resp, os_resp):
+        resp.status = os_resp.status_code
+        self._set_content_type(
+            resp, os_resp.headers.get('Content-Type', 'application/json'))
+
+        # Without a Content-Length the upstream body is chunked (or close
+        # delimited) and is streamed on without a length.
+        size = os_resp.headers.get('Content-Length')
+        size = int(size) if size is not None else None
+        resp.stream_len = size
+        resp.set_headers(filter_headers(
+            os_resp.headers, exclude=['content-type', 'content-length']))
+        resp.stream = OpenstackStream(os_resp.raw, size=size)
+
+    def _set_cached_response(self, resp, entry):
+        resp.status = entry.status
+        self._set_content_type(
+            resp, entry.headers.get('content-type', 'application/json'))
+        resp.set_headers(dict((k, v) for k, v in entry.headers.items()
+                              if k != 'content-type'))
+        resp.stream_len = len(entry.body)
+        resp.stream = [entry.body]
 
     on_get = _standard_responder
     on_post = _standard_responder
@@ -0,0 +1,238 @@
+"""Sampled profiles of requests, accumulated per route.
+
+The jumpgate.common.hooks.profile hooks run cProfile around one in
+sample_rate requests, or one in the rate given for their route in
+route_sample_rates, and add the result to the stats of the route. A rate of
+0 turns sampling off, which leaves a counter check per request.
+
+Admins read the stats of a worker with GET /admin/profile, optionally for
+one ?route=, either as pstats text (?format=pstats, the default) or as
+collapsed stacks for flame graph tools (?format=collapsed). PUT
+/admin/profile {"sample_rate": N} changes the rate on that worker and
+DELETE /admin/profile clears the stats.
+
+cProfile only sees the thread it's enabled on, so time spent in fan_out()
+branches shows up as waiting in the request thread.
+"""
+from collections import defaultdict
+import copy
+import itertools
+import json
+import os.path
+import pstats
+import re
+import threading
+
+from six import StringIO
+
+from jumpgate.common.exceptions import ResponseException
+from jumpgate.common.utils import on_reset, require_admin
+from jumpgate.config import CONF
+
+CONTENT_TYPE = 'text/plain; charset=utf-8'
+# Collapsed stacks are cut off below this many frames
+MAX_DEPTH = 64
+# And stacks with less than this many seconds in them are left out
+MIN_STACK_TIME = 1e-6
+
+
+def route_pattern(route):
+    """Return a regex matching the paths of a route template."""
+    parts = re.split(r'(\{\w+\})', route)
+    regex = ''.join('[^/]+' if part.startswith('{') else re.escape(part)
+                    for part in parts)
+    return re.compile('^%s(\\.json)?$' % regex)
+
+
+class Sampler(object):
+    """Decides which requests to profile."""
+
+    def __init__(self, sample_rate=0, route_sample_rates=None):
+        self.sample_rate = sample_rate
+        self.routes = [(route, route_pattern(route), int(rate))
+                       for route, rate in (route_sample_rates or {}).items()]
+        self._counters = defaultdict(itertools.count)
+
+    def rate(self, path):
+        for route, pattern, rate in self.routes:
+            if pattern.match(path):
+                return route, rate
+        return None, self.sample_rate
+
+    def sample(self, path):
+        """Whether to profile a request for the path."""
+        if not self.sample_rate and not self.routes:
+            return False
+        route, rate = self.rate(path)
+        if rate <= 0:
+            return False
+        return next(self._counters[route]) % rate == 0
+
+
+def _copy_stats(stats):
+    """Copy stats so adding to and sorting the copy leaves them alone."""
+    copied = copy.copy(stats)
+    copied.stats = dict(stats.stats)
+    copied.files = list(stats.files)
+    copied.top_level = copy.copy(stats.top_level)
+    copied.fcn_list = 0
+    copied.all_callees = None
+    return copied
+
+
+class ProfileStore(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._samples = defaultdict(int)
+
+    def add(self, route, profiler):
+        sample = pstats.Stats(profiler)
+        with self._lock:
+            stats = self._stats.get(route)
+            if stats is None:
+                self._stats[route] = sample
+            else:
+                stats.add(sample)
+            self._samples[route] += 1
+
+    def samples(self):
+        with self._lock:
+            return dict(self._samples)
+
+    def stats(self, route=None):
+        """Return the combined stats of a route, or of every route. Returns
+        None when nothing was sampled.
+        """
+        with self._lock:
+            routes = [route] if route else sorted(self._stats)
+            found = [self._stats[name] for name in routes
+                     if name in self._stats]
+            if not found:
+                return None
+            combined = _copy_stats(found[0])
+            if len(found) > 1:
+                combined.add(*found[1:])
+            return combined
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+            self._samples = defaultdict(int)
+
+
+def format_stats(stats, limit=50):
+    out = StringIO()
+    stats.stream = out
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def _label(func):
+    filename, line, name = func
+    return ('%s:%s(%s)' % (os.path.basename(filename), line, name)).replace(
+        ';', ':').replace(' ', '_')
+
+
+def collapsed_stacks(stats):
+    """Return the stats as 'frame;frame;frame microseconds' lines.
+
+    Profiles only record who called whom, not whole stacks, so the time of
+    a function is spread over the stacks leading to it in proportion to
+    the time each caller spent in it.
+    """
+    callees = defaultdict(dict)
+    roots = []
+    for func, (_, _, _, cumulative, callers) in stats.stats.items():
+        if not callers:
+            roots.append((func, cumulative))
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    totals = defaultdict(float)
+
+    def walk(func, path, seen, spent):
+        _, _, own, cumulative, _ = stats.stats[func]
+        share = spent / cumulative if cumulative else 0.0
+        path = path + (_label(func),)
+        if own * share >= MIN_STACK_TIME:
+            totals[';'.join(path)] += own * share
+        if len(path) >= MAX_DEPTH:
+            return
+        for callee, edge_time in callees.get(func, {}).items():
+            if callee in seen or edge_time * share < MIN_STACK_TIME:
+                continue
+            walk(callee, path, seen | set([callee]), edge_time * share)
+
+    for func, cumulative in roots:
+        walk(func, (), set([func]), cumulative)
+
+    return ''.join('%s %d\n' % (stack, int(spent * 1e6))
+                   for stack, spent in sorted(totals.items())
+                   if int(spent * 1e6))
+
+
+class ProfileResource(object):
+    def __init__(self, store=None, sampler=None):
+        self.store = store
+        self.sampler = sampler
+
+    def on_get(self, req, resp):
+        require_admin(req)
+        store = self.store or get_store()
+        output = req.get_param('format') or 'pstats'
+        if output not in ('pstats', 'collapsed'):
+            raise ResponseException('Unknown format %s' % output,
+                                    error_type='badRequest', code=400)
+
+        stats = store.stats(req.get_param('route'))
+        if stats is None:
+            body = ''
+        elif output == 'collapsed':
+            body = collapsed_stacks(stats)
+        else:
+            body = format_stats(stats)
+        resp.status = 200
+        resp.content_type = CONTENT_TYPE
+        resp.body = body
+
+    def on_put(self, req, resp):
+        require_admin(req)
+        sampler = self.sampler or get_sampler()
+        try:
+            body = json.loads(req.stream.read().decode())
+            sampler.sample_rate = max(0, int(body['sample_rate']))
+        except (ValueError, KeyError, TypeError):
+            raise ResponseException('Expected {"sample_rate": N}',
+                                    error_type='badRequest', code=400)
+        resp.status = 200
+        resp.body = {'profile': {
+            'sample_rate': sampler.sample_rate,
+            'samples': (self.store or get_store()).samples()}}
+
+    def on_delete(self, req, resp):
+        require_admin(req)
+        (self.store or get_store()).clear()
+        resp.status = 204
+
+
+_store = ProfileStore()
+_sampler = None
+
+
+@on_reset
+def _reset():
+    global _sampler
+    _sampler = None
+
+
+def get_store():
+    return _store
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        conf = CONF['profiling']
+        _sampler = Sampler(conf['sample_rate'], conf['route_sample_rates'])
+    return _sampler
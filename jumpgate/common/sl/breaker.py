@@ -0,0 +1,216 @@
+"""Circuit breakers and adaptive concurrency limits for SoftLayer API
+services.
+
+Each service gets a breaker which sheds calls with a quick 503 instead of
+letting them queue up behind a failing or overloaded service:
+
+* closed: calls go through. With adaptive_concurrency only while fewer
+  than the concurrency limit are in flight: the limit grows by about one
+  for every limit calls answered in time and shrinks by a tenth on every
+  failed call or call slower than latency_tolerance times the usual
+  latency of its method (AIMD).
+* open: once breaker_failure_ratio of the last breaker_window calls
+  failed, every call is refused for breaker_reset_timeout seconds.
+* half_open: a single trial call is let through; it closes the breaker if
+  it succeeds and opens it again if it fails.
+
+Calls cut short by the deadline of their own request say nothing about
+the service and are left out of both the failure rate and the limit, so
+one tenant sending tiny deadlines can't open the breaker for everyone.
+"""
+from collections import deque
+import logging
+import threading
+import time
+
+from SoftLayer import RemoteSystemError, TransportError
+
+from jumpgate.common import metrics
+from jumpgate.common.exceptions import ServiceUnavailable
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Errors which say something about the health of the service rather than
+# about the call
+FAILURES = (TransportError, RemoteSystemError)
+
+BREAKER_STATE = metrics.gauge(
+    'jumpgate_sl_breaker_state',
+    'State of the breaker of each SoftLayer API service: 0 closed, '
+    '1 half open, 2 open',
+    ['service'])
+CONCURRENCY_LIMIT = metrics.gauge(
+    'jumpgate_sl_concurrency_limit',
+    'Concurrent calls currently allowed to each SoftLayer API service',
+    ['service'])
+IN_FLIGHT = metrics.gauge(
+    'jumpgate_sl_in_flight_calls',
+    'Calls in flight to each SoftLayer API service',
+    ['service'])
+SHED_CALLS = metrics.counter(
+    'jumpgate_sl_shed_calls',
+    'SoftLayer API calls refused by the breaker of their service',
+    ['service', 'reason'])
+
+
+class ServiceBreaker(object):
+    def __init__(self, service, window=20, failure_ratio=0.5,
+                 reset_timeout=30, adaptive=False, limit=20, min_limit=1,
+                 max_limit=100, latency_tolerance=2.0, backoff=0.9,
+                 smoothing=0.1, clock=time.time):
+        self.service = service
+        self.failure_ratio = failure_ratio
+        self.reset_timeout = reset_timeout
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.clock = clock
+        # Moving average of the latency of successful calls of each method
+        self.baselines = {}
+
+        self.state = CLOSED
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.opened_at = None
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+        BREAKER_STATE.labels(service).set(STATE_VALUES[CLOSED])
+        CONCURRENCY_LIMIT.labels(service).set(int(self.limit))
+
+    def acquire(self):
+        """Take a slot for a call, or raise ServiceUnavailable when the
+        call should be shed.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                waited = self.clock() - self.opened_at
+                if waited < self.reset_timeout:
+                    self._shed('open', self.reset_timeout - waited)
+                self._set_state(HALF_OPEN)
+            elif self.state == HALF_OPEN and self.in_flight:
+                self._shed('half_open', 1)
+
+            if self.adaptive and self.in_flight >= int(self.limit):
+                self._shed('limit', 1)
+            self.in_flight += 1
+        IN_FLIGHT.labels(self.service).inc()
+
+    def release(self, duration, failed=False, method=None, counted=True):
+        """Return the slot of a call of method which took duration seconds.
+
+        Calls which aren't counted only give back their slot.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if counted:
+                self._record(duration, failed, method)
+            limit = int(self.limit)
+        IN_FLIGHT.labels(self.service).dec()
+        CONCURRENCY_LIMIT.labels(self.service).set(limit)
+
+    def _record(self, duration, failed, method):
+        self.outcomes.append(failed)
+
+        if self.adaptive:
+            if failed or self._slow(duration, method):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        if self.state == HALF_OPEN:
+            self._set_state(OPEN if failed else CLOSED)
+        elif (failed and self.state == CLOSED and
+                len(self.outcomes) == self.outcomes.maxlen and
+                self.failure_rate() >= self.failure_ratio):
+            self._set_state(OPEN)
+
+    def _slow(self, duration, method):
+        """Compare a successful call with the usual latency of its method,
+        which it then becomes part of.
+        """
+        baseline = self.baselines.get(method)
+        if baseline is None:
+            self.baselines[method] = duration
+            return False
+        self.baselines[method] = baseline + self.smoothing * (
+            duration - baseline)
+        return duration > baseline * self.latency_tolerance
+
+    def failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for failed in self.outcomes if failed) / float(
+            len(self.outcomes))
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'failure_rate': self.failure_rate(),
+            }
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        LOG.warning('Circuit breaker of SoftLayer %s is now %s',
+                    self.service, state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = self.clock()
+        elif state == CLOSED:
+            self.outcomes.clear()
+        BREAKER_STATE.labels(self.service).set(STATE_VALUES[state])
+
+    def _shed(self, reason, retry_after):
+        SHED_CALLS.labels(self.service, reason).inc()
+        raise ServiceUnavailable(
+            details='SoftLayer %s service is unavailable' % self.service,
+            retry_after=max(1, retry_after))
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+@on_reset
+def _reset():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_breaker(service):
+    breaker = _breakers.get(service)
+    if breaker is None:
+        conf = CONF['softlayer']
+        with _breakers_lock:
+            breaker = _breakers.get(service)
+            if breaker is None:
+                breaker = _breakers[service] = ServiceBreaker(
+                    service,
+                    window=conf['breaker_window'],
+                    failure_ratio=conf['breaker_failure_ratio'],
+                    reset_timeout=conf['breaker_reset_timeout'],
+                    adaptive=conf['adaptive_concurrency'],
+                    limit=conf['concurrency_limit'],
+                    max_limit=conf['max_concurrency_limit'],
+                    latency_tolerance=conf['latency_tolerance'])
+    return breaker
+
+
+def breaker_states():
+    """Return the status of the breaker of every service called so far."""
+    return dict((service, breaker.status())
+                for service, breaker in list(_breakers.items()))
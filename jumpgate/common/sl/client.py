@@ -0,0 +1,833 @@
+from collections import deque
+from contextlib import contextmanager
+import copy
+import hashlib
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import uuid
+
+import six
+from SoftLayer import TransportError
+from SoftLayer.API import Service
+
+from jumpgate.common import invalidation
+from jumpgate.common import metrics
+from jumpgate.common import tracing
+from jumpgate.common.cache import LRUCache, NamespacedCache, shared_cache
+from jumpgate.common.exceptions import DeadlineExceeded
+from jumpgate.common.sl.breaker import FAILURES, get_breaker
+from jumpgate.common.sl.pool import get_pool, in_pool
+from jumpgate.common.sl.scheduler import QUEUE_PREFIX, get_scheduler
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+COALESCED_CALLS = metrics.counter(
+    'jumpgate_sl_coalesced_calls',
+    'SoftLayer API calls answered by an identical call already in flight',
+    ['call'])
+CACHE_LOOKUPS = metrics.counter(
+    'jumpgate_sl_cache_lookups',
+    'Lookups in the tenant SoftLayer API cache',
+    ['call', 'result'])
+HEDGED_CALLS = metrics.counter(
+    'jumpgate_sl_hedged_calls',
+    'Slow SoftLayer API calls repeated, by the attempt which answered first',
+    ['call', 'winner'])
+HEDGES_DENIED = metrics.counter(
+    'jumpgate_sl_hedges_denied',
+    'Slow SoftLayer API calls not repeated because the hedge budget was '
+    'spent',
+    ['call'])
+
+# Cached reads which may be stale after a mutating call on a service
+CACHE_INVALIDATIONS = {
+    'Virtual_Guest': ['Account.getSubnets', 'Account.getNetworkVlans',
+                      'Account.getPrivateBlockDeviceTemplateGroups'],
+    'Virtual_Guest_Block_Device_Template_Group': [
+        'Account.getPrivateBlockDeviceTemplateGroups'],
+    'Security_Ssh_Key': ['Account.getSshKeys'],
+    'Dns_Domain': ['Account.getDomains'],
+    'Dns_Domain_ResourceRecord': ['Account.getDomains'],
+    'Network_Subnet': ['Account.getSubnets', 'Account.getNetworkVlans'],
+    'Network_Vlan': ['Account.getSubnets', 'Account.getNetworkVlans'],
+}
+
+# Methods with these prefixes are treated as read-only. Anything else is
+# assumed to change the object it is called against.
+READ_METHOD_PREFIXES = ('get', 'find')
+
+
+def is_read_method(method):
+    return method.startswith(READ_METHOD_PREFIXES)
+
+
+def service_name(service):
+    if service.startswith('SoftLayer_'):
+        return service[len('SoftLayer_'):]
+    return service
+
+
+def call_key(service, method, args, kwargs):
+    """Return a hashable key identifying a call and all of its arguments."""
+    return (service_name(service), method, kwargs.get('id'),
+            json.dumps([kwargs.get('mask'), kwargs.get('filter'),
+                        kwargs.get('limit'), kwargs.get('offset'),
+                        args], sort_keys=True, default=str))
+
+
+def auth_key(auth):
+    """Return a digest identifying the credentials of an auth object, or
+    None for unauthenticated clients.
+    """
+    if auth is None:
+        return None
+    details = json.dumps([auth.__class__.__name__, vars(auth)],
+                         sort_keys=True, default=str)
+    return hashlib.sha1(details.encode('utf-8')).hexdigest()
+
+
+def record_call(client, call, start_time=None, duration=0.0):
+    """Add an entry to the call log of a TimedClient, if there is one."""
+    last_calls = getattr(client, 'last_calls', None)
+    if last_calls is not None:
+        last_calls.append((call, start_time or time.time(), duration))
+
+
+class ClientWrapper(object):
+    """Base for objects which wrap a SoftLayer client to intercept its API
+    calls. Wrappers stack, and attributes they don't handle are delegated
+    to the wrapped client so managers can use them like a client.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.enabled = True
+
+    def __getitem__(self, name):
+        return Service(self, name)
+
+    def __getattr__(self, name):
+        if name == 'client':
+            # Not set yet while the wrapper is being copied
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    @property
+    def auth(self):
+        return self.client.auth
+
+    @auth.setter
+    def auth(self, auth):
+        self.client.auth = auth
+
+    def call(self, service, method, *args, **kwargs):
+        return self.client.call(service, method, *args, **kwargs)
+
+    __call__ = call
+
+    def __repr__(self):
+        return '<%s: %r>' % (self.__class__.__name__, self.client)
+
+
+class TracingClient(ClientWrapper):
+    """Records each call sent to the API in a span of the traced request
+    making it.
+    """
+
+    def call(self, service, method, *args, **kwargs):
+        with tracing.span('softlayer') as span:
+            if span is None:
+                return self.client.call(service, method, *args, **kwargs)
+
+            span.attributes.update({
+                'service': service_name(service),
+                'method': method,
+                'mask_size': len(str(kwargs.get('mask') or '')),
+            })
+            result = self.client.call(service, method, *args, **kwargs)
+            if not kwargs.get('iter'):
+                span.attributes['bytes'] = estimate_size(result)
+            return result
+
+
+class BreakerClient(ClientWrapper):
+    """Passes each call through the circuit breaker of its service, which
+    may refuse it with a 503 before anything is sent.
+
+    Wraps the DeadlineClient, so that calls which ran out of request
+    deadline arrive as DeadlineExceeded and aren't held against the
+    service.
+    """
+
+    def call(self, service, method, *args, **kwargs):
+        breaker = get_breaker(service_name(service))
+        breaker.acquire()
+        start_time = time.time()
+        failed = False
+        counted = True
+        try:
+            return self.client.call(service, method, *args, **kwargs)
+        except DeadlineExceeded:
+            counted = False
+            raise
+        except FAILURES:
+            failed = True
+            raise
+        finally:
+            breaker.release(time.time() - start_time, failed,
+                            method=method, counted=counted)
+
+
+class SchedulingClient(ClientWrapper):
+    """Waits for a slot from the fair scheduler before each call, and logs
+    the time waited in the timelog.
+    """
+
+    def __init__(self, client, tenant_id=None, deadline=None,
+                 scheduler=None):
+        super(SchedulingClient, self).__init__(client)
+        self.tenant_id = tenant_id
+        self.deadline = deadline
+        self.scheduler = scheduler or get_scheduler()
+
+    @property
+    def tenant(self):
+        if self.tenant_id is not None:
+            return str(self.tenant_id)
+        return auth_key(self.auth)
+
+    def call(self, service, method, *args, **kwargs):
+        start_time = time.time()
+        waited = self.scheduler.acquire(self.tenant, self.deadline)
+        if waited:
+            record_call(self.client, '%s%s.%s' % (
+                QUEUE_PREFIX, service_name(service), method),
+                start_time, waited)
+        try:
+            return self.client.call(service, method, *args, **kwargs)
+        finally:
+            self.scheduler.release()
+
+
+def with_timeout(client, timeout):
+    """Return a copy of a client, and of the wrappers around it, making its
+    calls with the given timeout.
+
+    The timeout is an attribute of the SoftLayer client itself, which the
+    branches of a fanned out request share.
+    """
+    if isinstance(client, ClientWrapper):
+        wrapper = copy.copy(client)
+        wrapper.client = with_timeout(client.client, timeout)
+        return wrapper
+    client = copy.copy(client)
+    client.timeout = timeout
+    return client
+
+
+# Seconds before its timeout within which a failed call counts as timed out
+TIMEOUT_SLACK = 0.05
+
+
+class DeadlineClient(ClientWrapper):
+    """Gives each call the time left before the request deadline as its
+    timeout, and refuses calls once the deadline has passed. A call failing
+    because it ran into the deadline raises DeadlineExceeded rather than
+    the TransportError of the timeout.
+    """
+
+    def __init__(self, client, deadline):
+        super(DeadlineClient, self).__init__(client)
+        self.deadline = deadline
+
+    def call(self, service, method, *args, **kwargs):
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded(
+                details='No time left to call %s.%s' % (service, method))
+
+        client = with_timeout(self.client, remaining)
+        try:
+            return client.call(service, method, *args, **kwargs)
+        except TransportError as e:
+            if time.time() < self.deadline - TIMEOUT_SLACK:
+                raise
+            raise DeadlineExceeded(details=e.faultString)
+
+
+class MemoizingClient(ClientWrapper):
+    """Remembers the results of read-only calls for the lifetime of the
+    wrapper, which is a single request.
+
+    Any call with a mutating method forgets every memoized result. Which
+    reads a mutation affects isn't limited to its own service, for example
+    Virtual_Guest.createObject changes what Account.getVirtualGuests
+    returns, and requests rarely make more than a few mutating calls.
+    """
+
+    def __init__(self, client):
+        super(MemoizingClient, self).__init__(client)
+        self._results = {}
+
+    def invalidate(self):
+        self._results.clear()
+
+    def call(self, service, method, *args, **kwargs):
+        if kwargs.get('iter') or kwargs.get('headers'):
+            return self.client.call(service, method, *args, **kwargs)
+
+        if not is_read_method(method):
+            self.invalidate()
+            return self.client.call(service, method, *args, **kwargs)
+
+        key = call_key(service, method, args, kwargs)
+        with tracing.span('cache', cache='memoized',
+                          call='%s.%s' % (service, method)) as span:
+            hit = self.enabled and key in self._results
+            if span is not None:
+                span.attributes['hit'] = hit
+        if hit:
+            LOG.debug('Reusing result of %s.%s', service, method)
+            record_call(self.client, '%s.%s [memoized]' % (service, method))
+            return copy.deepcopy(self._results[key])
+
+        result = self.client.call(service, method, *args, **kwargs)
+        self._results[key] = copy.deepcopy(result)
+        return result
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.exc_info = None
+        # Set unless the call finished with an outcome waiters may share
+        self.retry = True
+
+
+class SingleFlight(object):
+    """Runs at most one call per key at a time; callers arriving while a
+    call with the same key is running wait for and share its outcome.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def do(self, key, func, deadline=None):
+        """Return a (result, shared) tuple where shared is True when the
+        result came from a call started by another caller.
+
+        Callers sharing a call wait for it until their own deadline, if
+        they have one, and then give up with DeadlineExceeded. A call
+        which ran out of the time its caller had, or was interrupted, isn't
+        shared; the callers waiting for it make the call again.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    flight.waiters += 1
+            if leader:
+                break
+
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.time())
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    flight.waiters -= 1
+                raise DeadlineExceeded(
+                    details='No time left waiting for a shared call')
+            if flight.retry:
+                continue
+            if flight.exc_info is not None:
+                six.reraise(*flight.exc_info)
+            return copy.deepcopy(flight.result), True
+
+        result = None
+        try:
+            result = func()
+            flight.retry = False
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            flight.exc_info = sys.exc_info()
+            flight.retry = False
+            raise
+        finally:
+            try:
+                with self._lock:
+                    del self._flights[key]
+                    waiters = flight.waiters
+                if waiters and not flight.retry and flight.exc_info is None:
+                    # Waiters get their own copies so the leader may safely
+                    # modify the original
+                    flight.result = copy.deepcopy(result)
+            except Exception:
+                flight.retry = True
+            finally:
+                flight.done.set()
+        return result, False
+
+
+# Shared by every request handled in this process
+IN_FLIGHT = SingleFlight()
+
+
+class CoalescingClient(ClientWrapper):
+    """Shares read-only calls with identical calls for the same
+    credentials which are already in flight in other requests.
+    """
+
+    def __init__(self, client, flights=None, deadline=None):
+        super(CoalescingClient, self).__init__(client)
+        self.flights = flights or IN_FLIGHT
+        self.deadline = deadline
+
+    def call(self, service, method, *args, **kwargs):
+        if (not self.enabled or not is_read_method(method)
+                or kwargs.get('iter') or kwargs.get('headers')
+                or self.auth is None):
+            return self.client.call(service, method, *args, **kwargs)
+
+        key = (auth_key(self.auth), getattr(self, 'endpoint_url', None),
+               call_key(service, method, args, kwargs))
+        start_time = time.time()
+        result, shared = self.flights.do(
+            key, lambda: self.client.call(service, method, *args, **kwargs),
+            deadline=self.deadline)
+        if shared:
+            name = '%s.%s' % (service, method)
+            COALESCED_CALLS.labels(name).inc()
+            record_call(self.client, name + ' [coalesced]', start_time,
+                        time.time() - start_time)
+        return result
+
+
+def estimate_size(value):
+    """Roughly estimate the memory used by an API result."""
+    return len(json.dumps(value, default=str))
+
+
+# Keys of the generations of calls in a shared TenantCache
+GENERATION = '[generation]'
+
+
+class TenantCache(object):
+    """Holds one size bounded LRU cache per tenant. Tenants themselves are
+    evicted least recently used first once there are too many of them.
+
+    Given a shared cache, every tenant uses a namespace in it instead and
+    the per-tenant limits do not apply. Finding the entries of a call in it
+    would mean scanning every slot, so instead each 'Service.method' of a
+    tenant has a generation, which is part of the keys of its entries.
+    Invalidating replaces the generation, and the old entries, which no
+    key refers to anymore, age out.
+    """
+
+    def __init__(self, tenant_max_bytes, max_tenants, clock=time.time,
+                 shared=None):
+        self.tenant_max_bytes = tenant_max_bytes
+        self.clock = clock
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._tenants = LRUCache(max_tenants, clock=clock)
+
+    def for_tenant(self, tenant):
+        if self.shared is not None:
+            return NamespacedCache(self.shared, tenant)
+        with self._lock:
+            cache = self._tenants.get(tenant)
+            if cache is None:
+                cache = LRUCache(self.tenant_max_bytes, clock=self.clock)
+                self._tenants.set(tenant, cache, 1)
+        return cache
+
+    def _generation(self, cache, name):
+        generation = cache.get((GENERATION, name))
+        if generation is None:
+            # Also when the generation was evicted, so its old entries
+            # don't become visible again
+            generation = self._new_generation(cache, name)
+        return generation
+
+    def _new_generation(self, cache, name):
+        generation = uuid.uuid4().hex
+        cache.set((GENERATION, name), generation, len(generation))
+        return generation
+
+    def make_key(self, tenant, name, key):
+        """Return the key to cache a result of the 'Service.method' call
+        name under for the tenant.
+        """
+        if self.shared is None:
+            return key
+        cache = NamespacedCache(self.shared, tenant)
+        return key + (self._generation(cache, name),)
+
+    def invalidate(self, tenant, calls):
+        """Drop a tenant's cached results for the given 'Service.method'
+        names and return the number of entries removed, or of calls
+        invalidated for a shared cache.
+        """
+        if self.shared is not None:
+            cache = NamespacedCache(self.shared, tenant)
+            calls = set(calls)
+            for name in calls:
+                self._new_generation(cache, name)
+            return len(calls)
+
+        cache = self._tenants.get(tenant)
+        if cache is None:
+            return 0
+        calls = set(calls)
+        return cache.invalidate(lambda key: '%s.%s' % key[1][:2] in calls)
+
+    def clear(self):
+        self._tenants.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+_tenant_cache = None
+
+
+@on_reset
+def _reset_tenant_cache():
+    global _tenant_cache
+    _tenant_cache = None
+
+
+def get_tenant_cache():
+    global _tenant_cache
+    if _tenant_cache is None:
+        conf = CONF['softlayer']
+        shared = None
+        if CONF['cache']['backend'] == 'shared':
+            shared = shared_cache('softlayer_calls')
+        _tenant_cache = TenantCache(conf['cache_tenant_max_bytes'],
+                                    conf['cache_max_tenants'],
+                                    shared=shared)
+        if shared is None:
+            invalidation.subscribe('softlayer_calls',
+                                   _tenant_cache.invalidate)
+    return _tenant_cache
+
+
+def cache_policies():
+    """Return the configured TTL in seconds for each cacheable method."""
+    return dict((call, float(ttl)) for call, ttl in
+                CONF['softlayer']['cache_policies'].items())
+
+
+class CachingClient(ClientWrapper):
+    """Read-through cache for the read-only calls listed in the cache
+    policies, scoped to a tenant. Entries also include the credentials they
+    were read with, so users in the same tenant never see each other's
+    results.
+    """
+
+    def __init__(self, client, tenant_id=None, cache=None, policies=None):
+        super(CachingClient, self).__init__(client)
+        self.tenant_id = tenant_id
+        self.cache = cache or get_tenant_cache()
+        self.policies = cache_policies() if policies is None else policies
+
+    @property
+    def tenant(self):
+        if self.tenant_id is not None:
+            return str(self.tenant_id)
+        return auth_key(self.auth)
+
+    def call(self, service, method, *args, **kwargs):
+        if kwargs.get('iter') or kwargs.get('headers') or self.auth is None:
+            return self.client.call(service, method, *args, **kwargs)
+
+        name = '%s.%s' % (service_name(service), method)
+        if not is_read_method(method):
+            try:
+                return self.client.call(service, method, *args, **kwargs)
+            finally:
+                calls = CACHE_INVALIDATIONS.get(service_name(service))
+                if calls:
+                    self.cache.invalidate(self.tenant, calls)
+                    if self.cache.shared is None:
+                        invalidation.publish('softlayer_calls', self.tenant,
+                                             calls)
+
+        ttl = self.policies.get(name)
+        if ttl is None:
+            return self.client.call(service, method, *args, **kwargs)
+
+        cache = self.cache.for_tenant(self.tenant)
+        key = self.cache.make_key(
+            self.tenant, name,
+            (auth_key(self.auth), call_key(service, method, args, kwargs)))
+        if self.enabled:
+            with tracing.span('cache', cache='tenant', call=name) as span:
+                entry = cache.get(key)
+                if span is not None:
+                    span.attributes['hit'] = entry is not None
+            if entry is not None:
+                CACHE_LOOKUPS.labels(name, 'hit').inc()
+                record_call(self.client, name + ' [cached]')
+                return copy.deepcopy(entry)
+            CACHE_LOOKUPS.labels(name, 'miss').inc()
+
+        result = self.client.call(service, method, *args, **kwargs)
+        cache.set(key, copy.deepcopy(result), estimate_size(result), ttl=ttl)
+        return result
+
+
+class LatencyTracker(object):
+    """Keeps the most recent latencies of each Service.method call."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, name, duration):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(duration)
+
+    def percentile(self, name, percent):
+        """Return the latency below which percent of the recent calls
+        finished, or None until enough calls have been seen.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = int(math.ceil(len(samples) * percent / 100.0)) - 1
+        return samples[min(max(index, 0), len(samples) - 1)]
+
+
+class HedgeBudget(object):
+    """Token bucket limiting hedges to a fraction of the hedgeable calls:
+    each call adds ratio tokens and each hedge takes one.
+    """
+
+    def __init__(self, ratio, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class _Race(object):
+    """Attempts of one hedged call; the first to succeed wins."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.attempts = 0
+        self.winner = None
+        self.result = None
+        self.errors = []
+
+    def start(self, pool, label, func, observe):
+        self.attempts += 1
+
+        def attempt():
+            start_time = time.time()
+            try:
+                result = func()
+            except Exception:
+                with self.cond:
+                    self.errors.append(sys.exc_info())
+                    self.cond.notify_all()
+                return
+            observe(time.time() - start_time)
+            with self.cond:
+                if self.winner is None:
+                    self.winner = label
+                    self.result = result
+                self.cond.notify_all()
+
+        pool.submit(attempt)
+
+    def wait(self, timeout=None):
+        """Wait for a winner or for every attempt to fail, at most timeout
+        seconds. Returns True when the race is over.
+        """
+        with self.cond:
+            if timeout is not None:
+                end = time.time() + timeout
+            while not self.finished():
+                if timeout is None:
+                    self.cond.wait()
+                    continue
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.finished()
+
+    def finished(self):
+        return (self.winner is not None or
+                len(self.errors) == self.attempts)
+
+
+LATENCIES = LatencyTracker()
+_hedge_budget = None
+
+
+@on_reset
+def _reset_hedge_budget():
+    global _hedge_budget
+    _hedge_budget = None
+
+
+def get_hedge_budget():
+    global _hedge_budget
+    if _hedge_budget is None:
+        _hedge_budget = HedgeBudget(CONF['softlayer']['hedge_budget'])
+    return _hedge_budget
+
+
+def hedge_percentiles():
+    """Return the configured latency percentile for each hedged method."""
+    return dict((call, float(percent)) for call, percent in
+                CONF['softlayer']['hedge_percentiles'].items())
+
+
+class HedgingClient(ClientWrapper):
+    """Repeats a read-only call which is slower than a percentile of the
+    recent latency of that method, returning whichever answer arrives
+    first. A budget shared by the process caps the extra calls.
+    """
+
+    def __init__(self, client, percentiles=None, latencies=None,
+                 budget=None, pool=None):
+        super(HedgingClient, self).__init__(client)
+        self.percentiles = (hedge_percentiles() if percentiles is None
+                            else percentiles)
+        self.latencies = latencies or LATENCIES
+        self.budget = budget or get_hedge_budget()
+        self.pool = pool
+
+    def call(self, service, method, *args, **kwargs):
+        name = '%s.%s' % (service_name(service), method)
+        percent = self.percentiles.get(name)
+        if (percent is None or not is_read_method(method) or
+                kwargs.get('iter') or in_pool()):
+            # Calls made from the pool aren't hedged; waiting on other
+            # threads of the pool could deadlock once it's exhausted
+            return self.client.call(service, method, *args, **kwargs)
+
+        def observe(duration):
+            self.latencies.observe(name, duration)
+
+        self.budget.earn()
+        delay = self.latencies.percentile(name, percent)
+        if delay is None:
+            start_time = time.time()
+            result = self.client.call(service, method, *args, **kwargs)
+            observe(time.time() - start_time)
+            return result
+
+        def attempt():
+            # Client.call adds to the headers it is given
+            call_kwargs = dict(kwargs)
+            if call_kwargs.get('headers'):
+                call_kwargs['headers'] = dict(call_kwargs['headers'])
+            return self.client.call(service, method, *args, **call_kwargs)
+
+        pool = self.pool or get_pool()
+        race = _Race()
+        race.start(pool, 'primary', attempt, observe)
+        if not race.wait(delay) and not race.errors:
+            if self.budget.spend():
+                LOG.debug('Hedging %s after %.3fs', name, delay)
+                record_call(self.client, name + ' [hedged]')
+                race.start(pool, 'hedge', attempt, observe)
+                race.wait()
+                HEDGED_CALLS.labels(name, race.winner or 'none').inc()
+            else:
+                HEDGES_DENIED.labels(name).inc()
+        race.wait()
+
+        if race.winner is None:
+            six.reraise(*race.errors[0])
+        return race.result
+
+
+def find_wrapper(client, wrapper_class):
+    """Return the first wrapper of the given class in a client stack."""
+    while isinstance(client, ClientWrapper):
+        if isinstance(client, wrapper_class):
+            return client
+        client = client.client
+    return None
+
+
+@contextmanager
+def fresh_reads(client):
+    """Bypass memoized and shared results for calls made inside the
+    block, for example while polling an object for a state change or for
+    a single call which must not be coalesced. Results read inside the
+    block replace the memoized ones.
+    """
+    wrappers = []
+    wrapper = client
+    while isinstance(wrapper, ClientWrapper):
+        wrappers.append((wrapper, wrapper.enabled))
+        wrapper.enabled = False
+        wrapper = wrapper.client
+
+    try:
+        yield client
+    finally:
+        for wrapper, enabled in wrappers:
+            wrapper.enabled = enabled
+
+
+def wrap_client(client, tenant_id=None, deadline=None):
+    """Wrap a newly bound per-request client with the configured layers."""
+    if CONF['tracing']['enabled']:
+        client = TracingClient(client)
+    if deadline is not None:
+        client = DeadlineClient(client, deadline)
+    if CONF['softlayer']['circuit_breaker']:
+        client = BreakerClient(client)
+    if CONF['softlayer']['fair_scheduling']:
+        client = SchedulingClient(client, tenant_id=tenant_id,
+                                  deadline=deadline)
+    if CONF['softlayer']['hedge_calls']:
+        client = HedgingClient(client)
+    if CONF['softlayer']['coalesce_calls']:
+        client = CoalescingClient(client, deadline=deadline)
+    if CONF['softlayer']['cache_calls']:
+        client = CachingClient(client, tenant_id=tenant_id)
+    if CONF['softlayer']['memoize_calls']:
+        client = MemoizingClient(client)
+    return client
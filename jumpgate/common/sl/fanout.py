@@ -0,0 +1,112 @@
+"""Run independent SoftLayer API calls made by a handler concurrently.
+
+    client = req.env['sl_client']
+    results = fan_out(req, {
+        'account': lambda: client['Account'].getObject(),
+        'guests': lambda: client['Account'].getVirtualGuests(),
+    })
+
+Branches run on the bounded pool of threads shared by every request in
+the process. The first branch to fail cancels the branches which haven't
+started yet and its exception is re-raised to the handler, so a
+SoftLayerAPIError reaches the usual error handler. Branches still running
+can't be interrupted; their results are discarded.
+"""
+import logging
+import sys
+import threading
+import time
+
+import six
+
+from jumpgate.common import tracing
+from jumpgate.common.deadline import get_deadline
+from jumpgate.common.exceptions import DeadlineExceeded
+from jumpgate.common.sl.client import record_call
+from jumpgate.common.sl.pool import get_pool, in_pool
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+# Timelog entries of branches start with this so they aren't counted as
+# SoftLayer API time on top of the calls made inside them
+BRANCH_PREFIX = '[fanout] '
+
+
+class FanOut(object):
+    """The state shared by the branches of a single fan_out() call."""
+
+    def __init__(self, client, deadline):
+        self.client = client
+        self.deadline = deadline
+        # Branches run in the span of the request which fanned out
+        self.span = tracing.current_span()
+        self.results = {}
+        self.exc_info = None
+        self.cancelled = False
+        self._cond = threading.Condition()
+
+    def run_branch(self, name, func):
+        if self.cancelled:
+            return
+        start_time = time.time()
+        try:
+            with tracing.activate(self.span):
+                with tracing.span('fanout', branch=name):
+                    result = func()
+        except Exception:
+            with self._cond:
+                if self.exc_info is None:
+                    self.exc_info = sys.exc_info()
+                self.cancelled = True
+                self._cond.notify_all()
+            return
+        finally:
+            record_call(self.client, BRANCH_PREFIX + name, start_time,
+                        time.time() - start_time)
+
+        with self._cond:
+            self.results[name] = result
+            self._cond.notify_all()
+
+    def wait(self, count):
+        """Wait until count branches succeeded or one of them failed."""
+        with self._cond:
+            while len(self.results) < count and self.exc_info is None:
+                remaining = self.deadline - time.time()
+                if remaining <= 0:
+                    self.cancelled = True
+                    raise DeadlineExceeded()
+                self._cond.wait(remaining)
+
+        if self.exc_info is not None:
+            six.reraise(*self.exc_info)
+        return self.results
+
+
+def fan_out(req, branches, timeout=None):
+    """Call each function in the branches dict concurrently and return a
+    dict of their results under the same keys. Waits until the deadline of
+    the request unless a timeout in seconds is given.
+    """
+    if timeout is not None:
+        deadline = time.time() + timeout
+    else:
+        deadline = (get_deadline(req) or
+                    time.time() + CONF['request_timeout'])
+    fanout = FanOut(req.env.get('sl_client'), deadline)
+
+    if in_pool() or len(branches) < 2:
+        # A branch fanning out again runs its branches itself; waiting for
+        # other threads of the pool could deadlock once it's exhausted
+        for name, func in branches.items():
+            fanout.run_branch(name, func)
+            if fanout.exc_info is not None:
+                break
+        return fanout.wait(len(branches))
+
+    pool = get_pool()
+    for name, func in branches.items():
+        pool.submit(lambda name=name, func=func: fanout.run_branch(name,
+                                                                   func))
+    return fanout.wait(len(branches))
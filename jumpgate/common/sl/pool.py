@@ -0,0 +1,74 @@
+"""Threads shared by every request in the process for making SoftLayer API
+calls on behalf of a request thread.
+"""
+import logging
+import os
+import threading
+
+from six.moves import queue
+
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def in_pool():
+    """Return True when called from one of the threads of a pool."""
+    return getattr(_local, 'in_pool', False)
+
+
+class BranchPool(object):
+    """A fixed number of threads running queued functions."""
+
+    def __init__(self, threads):
+        self.size = threads
+        self.pid = os.getpid()
+        self.tasks = queue.Queue()
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, func):
+        if len(self.threads) < self.size:
+            self._start_thread()
+        self.tasks.put(func)
+
+    def _start_thread(self):
+        with self._lock:
+            if len(self.threads) >= self.size:
+                return
+            thread = threading.Thread(target=self._work,
+                                      name='sl-pool-%s' % len(self.threads))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        _local.in_pool = True
+        while True:
+            func = self.tasks.get()
+            try:
+                func()
+            except Exception:
+                LOG.exception('Pooled SoftLayer call failed')
+
+
+_pool = None
+
+
+@on_reset
+def _reset():
+    global _pool
+    _pool = None
+
+
+def get_pool():
+    """Return the pool of the current process. Threads don't survive a
+    fork, so a forked worker gets its own.
+    """
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        _pool = BranchPool(CONF['softlayer']['fanout_threads'])
+    return _pool
@@ -0,0 +1,153 @@
+"""Fair sharing of the outbound SoftLayer API concurrency between tenants.
+
+A process makes at most outbound_concurrency calls at a time. While every
+slot is taken, calls wait in a queue per tenant and freed slots are handed
+out by deficit round robin: each turn a tenant earns its weight in
+credit and spends one credit per call, so a tenant with weight 2 gets twice
+the calls of a tenant with weight 1 and a single busy tenant can't starve
+the others.
+"""
+from collections import deque
+import threading
+import time
+
+from jumpgate.common import metrics
+from jumpgate.common.exceptions import DeadlineExceeded
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+# Timelog entries for time spent waiting for a slot start with this
+QUEUE_PREFIX = '[queued] '
+
+# Not by tenant: /metrics shouldn't list who uses jumpgate
+QUEUE_WAIT = metrics.summary(
+    'jumpgate_sl_queue_wait_seconds',
+    'Time SoftLayer API calls waited for a free slot')
+QUEUED_CALLS = metrics.gauge(
+    'jumpgate_sl_queued_calls',
+    'SoftLayer API calls waiting for a free slot')
+
+
+class _Waiter(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class _TenantQueue(object):
+    def __init__(self, tenant, weight):
+        self.tenant = tenant
+        self.weight = weight
+        self.deficit = 0.0
+        self.waiters = deque()
+
+
+class FairScheduler(object):
+    def __init__(self, slots, weights=None, default_weight=1.0):
+        self.slots = slots
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._queues = {}
+        # Tenants with waiting calls, in round robin order
+        self._active = deque()
+
+    def weight(self, tenant):
+        # A tenant without weight would never be served
+        return max(0.01, float(self.weights.get(tenant,
+                                                self.default_weight)))
+
+    def acquire(self, tenant, deadline=None):
+        """Take a slot for a call made for tenant, waiting for one until
+        the deadline if necessary. Returns the seconds waited.
+        """
+        start_time = time.time()
+        with self._lock:
+            if self.in_flight < self.slots and not self._active:
+                self.in_flight += 1
+                return 0.0
+
+            queue = self._queues.get(tenant)
+            if queue is None:
+                queue = self._queues[tenant] = _TenantQueue(
+                    tenant, self.weight(tenant))
+                self._active.append(queue)
+            waiter = _Waiter()
+            queue.waiters.append(waiter)
+            self._dispatch()
+        QUEUED_CALLS.inc()
+
+        try:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.time())
+            if not waiter.event.wait(timeout):
+                with self._lock:
+                    if not waiter.granted:
+                        self._remove(queue, waiter)
+                        raise DeadlineExceeded(
+                            details='Timed out waiting to call SoftLayer')
+        finally:
+            QUEUED_CALLS.dec()
+
+        waited = time.time() - start_time
+        QUEUE_WAIT.observe(waited)
+        return waited
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def queued(self):
+        """Return the number of waiting calls of each tenant."""
+        with self._lock:
+            return dict((tenant, len(queue.waiters))
+                        for tenant, queue in self._queues.items())
+
+    def _dispatch(self):
+        while self.in_flight < self.slots and self._active:
+            queue = self._active[0]
+            if queue.deficit < 1:
+                queue.deficit += queue.weight
+                if queue.deficit < 1:
+                    self._active.rotate(-1)
+                    continue
+
+            waiter = queue.waiters.popleft()
+            queue.deficit -= 1
+            self.in_flight += 1
+            waiter.granted = True
+            waiter.event.set()
+
+            if not queue.waiters:
+                self._active.popleft()
+                del self._queues[queue.tenant]
+            elif queue.deficit < 1:
+                self._active.rotate(-1)
+
+    def _remove(self, queue, waiter):
+        queue.waiters.remove(waiter)
+        if not queue.waiters:
+            self._active.remove(queue)
+            del self._queues[queue.tenant]
+
+
+_scheduler = None
+
+
+@on_reset
+def _reset():
+    global _scheduler
+    _scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        conf = CONF['softlayer']
+        weights = dict((tenant, float(weight)) for tenant, weight in
+                       conf['tenant_weights'].items())
+        _scheduler = FairScheduler(conf['outbound_concurrency'], weights)
+    return _scheduler
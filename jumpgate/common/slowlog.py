@@ -0,0 +1,136 @@
+"""Log of slow requests.
+
+A request taking longer than the threshold of its route, route_thresholds
+or else threshold, gets a single WARNING entry listing every SoftLayer call
+it made, as recorded by the TimedClient the timedclient hook binds.
+
+Calls to the same Service.method made repeated_calls times or more by one
+request are flagged in the entry and counted in jumpgate_repeated_sl_calls,
+slow or not; they are usually a call made once per item of a list that a
+single call with an object mask could replace.
+
+call_budgets declares the most SoftLayer calls a route may make. Going over
+is logged, or fails with CallBudgetExceeded while enforce_call_budgets is on
+so that tests catch a route growing new calls.
+"""
+from collections import Counter
+import logging
+
+from jumpgate.common import metrics
+from jumpgate.common.utils import on_reset
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+REPEATED_CALLS = metrics.counter(
+    'jumpgate_repeated_sl_calls',
+    'Requests which made the same SoftLayer API call repeatedly, by route '
+    'and call',
+    ['route', 'call'])
+
+
+class CallBudgetExceeded(AssertionError):
+    pass
+
+
+def api_calls(calls):
+    """Leave out the entries of the time spent around calls, like queueing
+    and fan out branches, which start with [.
+    """
+    return [call for call in calls if not call[0].startswith('[')]
+
+
+def repeated_calls(calls, minimum):
+    """Return (call, count) of the calls made at least minimum times, most
+    repeated first.
+    """
+    if minimum <= 0:
+        return []
+    counts = Counter(call for call, _, _ in api_calls(calls))
+    return sorted(((call, count) for call, count in counts.items()
+                   if count >= minimum),
+                  key=lambda item: (-item[1], item[0]))
+
+
+def format_calls(calls, start_time):
+    return ''.join('\n    +%.3fs %.3fs %s' % (started - start_time,
+                                              duration, call)
+                   for call, started, duration in calls)
+
+
+class SlowRequestLog(object):
+    def __init__(self, threshold, route_thresholds=None, repeated=5,
+                 call_budgets=None, enforce_budgets=False):
+        self.default_threshold = threshold
+        self.route_thresholds = dict(
+            (route, float(value))
+            for route, value in (route_thresholds or {}).items())
+        self.repeated = repeated
+        self.call_budgets = dict(
+            (route, int(value))
+            for route, value in (call_budgets or {}).items())
+        self.enforce_budgets = enforce_budgets
+
+    def threshold(self, route):
+        """Seconds after which a request for the route is slow; 0 or less
+        never is.
+        """
+        return self.route_thresholds.get(route, self.default_threshold)
+
+    def check_budget(self, route, calls):
+        """Return the budget of the route when the calls go over it."""
+        budget = self.call_budgets.get(route)
+        if budget is None or len(api_calls(calls)) <= budget:
+            return None
+        if self.enforce_budgets:
+            raise CallBudgetExceeded(
+                '%s made %d SoftLayer calls, over its budget of %d: %s' % (
+                    route, len(api_calls(calls)), budget,
+                    ', '.join(call for call, _, _ in api_calls(calls))))
+        return budget
+
+    def record(self, req, route, start_time, duration, calls):
+        repeated = repeated_calls(calls, self.repeated)
+        for call, _ in repeated:
+            REPEATED_CALLS.labels(route, call).inc()
+        over_budget = self.check_budget(route, calls)
+
+        threshold = self.threshold(route)
+        slow = threshold > 0 and duration > threshold
+        if not slow and over_budget is None:
+            return
+
+        notes = []
+        if slow:
+            notes.append('took %.3fs, over %.3fs' % (duration, threshold))
+        if over_budget is not None:
+            notes.append('over its budget of %d calls' % over_budget)
+        if repeated:
+            notes.append('repeated calls: %s' % ', '.join(
+                '%s x%d' % item for item in repeated))
+        sl_calls = api_calls(calls)
+        LOG.warning(
+            "[ReqId: %s] %s %s (%s) %s; %d SL calls in %.3fs:%s",
+            req.env.get('REQUEST_ID'), req.method, req.path, route,
+            '; '.join(notes), len(sl_calls),
+            sum(call[2] for call in sl_calls),
+            format_calls(calls, start_time))
+
+
+_log = None
+
+
+@on_reset
+def _reset():
+    global _log
+    _log = None
+
+
+def get_log():
+    global _log
+    if _log is None:
+        conf = CONF['slow_requests']
+        _log = SlowRequestLog(conf['threshold'], conf['route_thresholds'],
+                              conf['repeated_calls'], conf['call_budgets'],
+                              conf['enforce_call_budgets'])
+    return _log
@@ -0,0 +1,56 @@
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class ChunkedStream(object):
+    """Iterates over a file-like object in fixed-size chunks.
+
+    At most one chunk is held in memory at a time. When a length is given
+    the stream stops after that many bytes, which makes it safe to wrap
+    sockets and files that are positioned at an offset.
+    """
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE, length=None):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.remaining = length
+
+    def read(self, size=None):
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return self.stream.read(0)
+            if size is None or size < 0 or size > self.remaining:
+                size = self.remaining
+
+        if size is None or size < 0:
+            size = self.chunk_size
+
+        chunk = self.stream.read(size)
+        if self.remaining is not None:
+            self.remaining -= len(chunk)
+        return chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = self.read(self.chunk_size)
+        if not chunk:
+            raise StopIteration
+        return chunk
+    next = __next__
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+
+
+def copy_stream(source, dest, chunk_size=DEFAULT_CHUNK_SIZE, length=None):
+    """Copy source into dest one chunk at a time.
+
+    Returns the number of bytes written.
+    """
+    written = 0
+    for chunk in ChunkedStream(source, chunk_size=chunk_size, length=length):
+        dest.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,88 @@
+"""Timing of each phase of a request: every hook and the responder.
+
+Jumpgate.make_api wraps each hook and responder with timed(). While timing
+is on, the wrapper adds a (phase, seconds) entry to the request's
+jumpgate.timings list and to the jumpgate_phase_duration_seconds histogram;
+while it's off the wrapper only checks the switch. It starts as
+phase_timing says and an admin can flip it on a live worker with
+
+    PUT /admin/timing {"enabled": true}
+"""
+import json
+from timeit import default_timer
+
+from jumpgate.common import metrics
+from jumpgate.common.exceptions import ResponseException
+from jumpgate.common.utils import propagate_argspec, require_admin
+from jumpgate.config import CONF
+
+TIMINGS_KEY = 'jumpgate.timings'
+
+PHASE_DURATION = metrics.histogram(
+    'jumpgate_phase_duration_seconds',
+    'Time spent in each hook and responder',
+    ['phase'])
+
+_state = {'enabled': None}
+
+
+def enabled():
+    if _state['enabled'] is None:
+        _state['enabled'] = CONF['phase_timing']
+    return _state['enabled']
+
+
+def set_enabled(value):
+    _state['enabled'] = bool(value)
+
+
+def record(req, phase, duration):
+    PHASE_DURATION.labels(phase).observe(duration)
+    req.env.setdefault(TIMINGS_KEY, []).append((phase, duration))
+
+
+def get_timings(req):
+    return req.env.get(TIMINGS_KEY, [])
+
+
+def phase_name(func):
+    """Name a hook after its module and function, since hooks in different
+    modules share names.
+    """
+    return '%s.%s' % (func.__module__.rsplit('.', 1)[-1], func.__name__)
+
+
+def timed(phase, func):
+    """Wrap a hook or responder taking the request as first argument."""
+
+    def wrapped(req, *args, **kwargs):
+        if not enabled():
+            return func(req, *args, **kwargs)
+        start_time = default_timer()
+        try:
+            return func(req, *args, **kwargs)
+        finally:
+            record(req, phase, default_timer() - start_time)
+
+    propagate_argspec(wrapped, func)
+    return wrapped
+
+
+class TimingResource(object):
+    """Shows and flips the switch of this worker."""
+
+    def on_get(self, req, resp):
+        require_admin(req)
+        resp.status = 200
+        resp.body = {'timing': {'enabled': enabled()}}
+
+    def on_put(self, req, resp):
+        require_admin(req)
+        try:
+            body = json.loads(req.stream.read().decode())
+            set_enabled(body['enabled'])
+        except (ValueError, KeyError, TypeError):
+            raise ResponseException('Expected {"enabled": true|false}',
+                                    error_type='badRequest', code=400)
+        resp.status = 200
+        resp.body = {'timing': {'enabled': enabled()}}
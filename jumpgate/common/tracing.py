@@ -0,0 +1,247 @@
+"""Request tracing.
+
+A sampled request gets a trace: a root span covering the whole request
+with child spans around each hook, the responder, every SoftLayer API call
+and every cache lookup. Finished traces are written to export_path, one
+JSON span per line.
+
+Sampling is decided when a request arrives. A request carrying a W3C
+traceparent header joins that trace, and follows its sampled flag when
+trust_traceparent says the callers are trusted not to force an export of
+every request; any other request is sampled with a probability of
+sample_ratio.
+
+The span a thread is working in is kept in a thread local, so code far from
+the request, like the client wrappers, adds spans with
+
+    with tracing.span('name', key=value) as span:
+        ...
+
+which does nothing but yield None when the thread isn't tracing anything.
+fan_out() carries the current span over to its branches.
+"""
+from contextlib import contextmanager
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from jumpgate.common.utils import on_reset, propagate_argspec
+from jumpgate.config import CONF
+
+LOG = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'TRACEPARENT'
+TRACEPARENT_RE = re.compile(
+    r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+SAMPLED_FLAG = 0x01
+
+_local = threading.local()
+
+
+def _new_id(bits):
+    return '%0*x' % (bits // 4, random.getrandbits(bits))
+
+
+class Span(object):
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+
+    def child(self, name, **attributes):
+        span = Span(self.trace, name, self.span_id, attributes)
+        self.trace.add(span)
+        return span
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.time() - self.start_time
+
+    def to_dict(self):
+        span = {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration': self.duration,
+            'attributes': self.attributes,
+        }
+        if self.error is not None:
+            span['error'] = self.error
+        return span
+
+
+class Trace(object):
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or _new_id(128)
+        self.parent_id = parent_id
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start(self, name, **attributes):
+        """Start the root span of the trace."""
+        span = Span(self, name, self.parent_id, attributes)
+        self.add(span)
+        return span
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def finished_spans(self):
+        with self._lock:
+            return [s for s in self.spans if s.duration is not None]
+
+
+class JsonLinesExporter(object):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, trace):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n'
+                        for span in trace.finished_spans())
+        with self._lock:
+            # Reopen in forked workers
+            if self._file is None or self._pid != os.getpid():
+                self._file = open(self.path, 'a')
+                self._pid = os.getpid()
+            self._file.write(lines)
+            self._file.flush()
+
+
+def parse_traceparent(header):
+    """Return (trace_id, parent_id, sampled) from a traceparent header, or
+    None if it isn't valid.
+    """
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == 'ff' or trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & SAMPLED_FLAG)
+
+
+def current_span():
+    return getattr(_local, 'span', None)
+
+
+@contextmanager
+def activate(span):
+    """Make span the current span of this thread inside the block."""
+    previous = current_span()
+    _local.span = span
+    try:
+        yield span
+    finally:
+        _local.span = previous
+
+
+@contextmanager
+def span(name, **attributes):
+    """Run the block in a child span of the current span."""
+    parent = current_span()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.child(name, **attributes)
+    _local.span = child
+    try:
+        yield child
+    except Exception as e:
+        child.error = '%s: %s' % (e.__class__.__name__, e)
+        raise
+    finally:
+        child.finish()
+        _local.span = parent
+
+
+def traced(name, func):
+    """Wrap a hook or responder so it runs in a span while tracing."""
+
+    def wrapped(*args, **kwargs):
+        if current_span() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+
+    propagate_argspec(wrapped, func)
+    return wrapped
+
+
+_exporter = None
+
+
+@on_reset
+def _reset():
+    global _exporter
+    _exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = JsonLinesExporter(CONF['tracing']['export_path'])
+    return _exporter
+
+
+def start_trace(req, resp, kwargs):
+    """Request hook starting the trace of a sampled request. Jumpgate runs
+    it before every other hook.
+    """
+    # Forget any trace a failed request left on this thread
+    _local.span = None
+    conf = CONF['tracing']
+    if not conf['enabled']:
+        return
+
+    header = req.headers.get(TRACEPARENT_HEADER)
+    context = parse_traceparent(header) if header else None
+    if context is not None:
+        trace_id, parent_id, sampled = context
+    else:
+        trace_id, parent_id, sampled = None, None, None
+    if sampled is None or not conf['trust_traceparent']:
+        sampled = random.random() < conf['sample_ratio']
+    if not sampled:
+        return
+
+    root = Trace(trace_id, parent_id).start(
+        '%s %s' % (req.method, req.path), method=req.method, path=req.path)
+    req.env['jumpgate.trace'] = root
+    _local.span = root
+
+
+def finish_trace(req, resp):
+    """Response hook finishing and exporting the trace of a request.
+    Jumpgate runs it after every other hook.
+    """
+    root = req.env.pop('jumpgate.trace', None)
+    _local.span = None
+    if root is None:
+        return
+
+    root.attributes['status'] = str(resp.status).split(' ')[0]
+    root.attributes['request_id'] = req.env.get('REQUEST_ID')
+    route = req.env.get('jumpgate.route')
+    if route:
+        root.attributes['route'] = route
+    root.finish()
+    try:
+        get_exporter().export(root.trace)
+    except (IOError, OSError):
+        LOG.exception('Unable to export trace %s', root.trace.trace_id)
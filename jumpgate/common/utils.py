@@ -4,9 +4,12 @@ import logging
 
 from functools import wraps
 
+from jumpgate.common.exceptions import Forbidden
+
 LOG = logging.getLogger(__name__)
 
 _driver_cache = {}
+_reset_handlers = []
 
 
 def lookup(dic, key, *keys):
@@ -22,6 +25,12 @@ def propagate_argspec(wrapper, responder):
         wrapper.wrapped_argspec = inspect.getargspec(responder)
 
 
+def require_admin(req):
+    """Refuse requests not authenticated with the admin token."""
+    if not req.env.get('is_admin'):
+        raise Forbidden(details='Admin token required')
+
+
 def wrap_handler_with_hooks(handler, after):
     @wraps(handler)
     def wrapped(ex, req, resp, params):
@@ -44,6 +53,20 @@ def import_class(canonical_name):
     return class_ref
 
 
+def on_reset(func):
+    """Decorator for functions dropping process wide state built from the
+    configuration, like lazily created singletons. They run before the
+    application is made again on a graceful restart.
+    """
+    _reset_handlers.append(func)
+    return func
+
+
+def reset_state():
+    for func in _reset_handlers:
+        func()
+
+
 def load_driver(canonical_name):
     global _driver_cache
     try:
@@ -1,3 +1,4 @@
+from jumpgate.common.admission import BULK
 
 
 def add_endpoints(disp):
@@ -18,7 +19,8 @@ def add_endpoints(disp):
     # Servers
     disp.add_endpoint('v2_server', '/v2/{tenant_id}/servers/{server_id}')
     disp.add_endpoint('v2_servers', '/v2/{tenant_id}/servers')
-    disp.add_endpoint('v2_servers_detail', '/v2/{tenant_id}/servers/detail')
+    disp.add_endpoint('v2_servers_detail', '/v2/{tenant_id}/servers/detail',
+                      priority=BULK)
 
     # Server Metadata
     disp.add_endpoint('v2_server_metadata',
@@ -45,8 +47,9 @@ def add_endpoints(disp):
 
     # Images
     disp.add_endpoint('v2_image', '/v2/{tenant_id}/images/{image_guid}')
-    disp.add_endpoint('v2_images', '/v2/{tenant_id}/images')
-    disp.add_endpoint('v2_images_detail', '/v2/{tenant_id}/images/detail')
+    disp.add_endpoint('v2_images', '/v2/{tenant_id}/images', priority=BULK)
+    disp.add_endpoint('v2_images_detail', '/v2/{tenant_id}/images/detail',
+                      priority=BULK)
 
     # Flavors
     disp.add_endpoint('v2_flavor', '/v2/flavors/{flavor_id}')
@@ -154,7 +157,7 @@ def add_endpoints(disp):
 
     # Usage Reports
     disp.add_endpoint('v2_tenants_usage',
-                      '/v2/{tenant_id}/os-simple-tenant-usage')
+                      '/v2/{tenant_id}/os-simple-tenant-usage', priority=BULK)
     disp.add_endpoint('v2_tenant_usage',
                       '/v2/{tenant_id}/os-simple-tenant-usage/{target_id}')
 
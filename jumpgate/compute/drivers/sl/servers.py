@@ -3,9 +3,11 @@ import json
 from SoftLayer import CCIManager, SshKeyManager, SoftLayerAPIError
 
 from jumpgate.common.config import CONF
+from jumpgate.common.deadline import remaining
 from jumpgate.common.utils import lookup
 from jumpgate.common.error_handling import (bad_request, duplicate,
                                             compute_fault, not_found)
+from jumpgate.common.sl.client import fresh_reads
 from .flavors import FLAVORS
 
 # This comes from Horizon. I wonder if there's a better place to get it.
@@ -88,19 +90,22 @@ class ServerActionV2(object):
                 )
                 # Workaround for not having an image guid until the image is
                 # fully created. TODO: Fix this
-                cci.wait_for_transaction(instance_id, 300)
-                _filter = {
-                    'privateBlockDeviceTemplateGroups': {
-                        'name': {'operation': image_name},
-                        'createDate': {
-                            'operation': 'orderBy',
-                            'options': [{'name': 'sort', 'value': ['DESC']}],
-                        }
-                    }}
-
-                acct = req.env['sl_client']['Account']
-                matching_image = acct.getPrivateBlockDeviceTemplateGroups(
-                    mask='id, globalIdentifier', filter=_filter, limit=1)
+                with fresh_reads(req.env['sl_client']):
+                    cci.wait_for_transaction(instance_id,
+                                             remaining(req, 300))
+                    _filter = {
+                        'privateBlockDeviceTemplateGroups': {
+                            'name': {'operation': image_name},
+                            'createDate': {
+                                'operation': 'orderBy',
+                                'options': [{'name': 'sort',
+                                             'value': ['DESC']}],
+                            }
+                        }}
+
+                    acct = req.env['sl_client']['Account']
+                    matching_image = acct.getPrivateBlockDeviceTemplateGroups(
+                        mask='id, globalIdentifier', filter=_filter, limit=1)
                 image_guid = matching_image.get('globalIdentifier')
 
                 url = self.app.get_endpoint_url('image', req, 'v2_image',
@@ -0,0 +1,11 @@
+"""A local stand-in for the SoftLayer API, for running Jumpgate end to end
+on one machine without an account, e.g. for load tests:
+
+    jumpgate fake-softlayer --port 5001 --guests 1000 --latency 0.05
+
+then set [softlayer] endpoint = http://127.0.0.1:5001/xmlrpc/v3 and log in
+with the username and API key it prints.
+
+Results honour object masks, object filters and result limits, but only
+the services and methods the drivers call are there.
+"""
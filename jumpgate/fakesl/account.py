@@ -0,0 +1,270 @@
+"""A synthetic SoftLayer account.
+
+Objects are generated from a seed, so two accounts made with the same
+arguments are the same, and are shaped like the SLAPI objects the drivers
+read. Relational properties are nested dicts and lists, which object masks
+leave out unless they name them.
+"""
+import datetime
+import hashlib
+import random
+import threading
+
+DATACENTERS = [
+    {'id': 138124, 'name': 'dal05', 'longName': 'Dallas 5'},
+    {'id': 168642, 'name': 'sjc01', 'longName': 'San Jose 1'},
+    {'id': 224092, 'name': 'sng01', 'longName': 'Singapore 1'},
+    {'id': 265592, 'name': 'ams01', 'longName': 'Amsterdam 1'},
+]
+OPERATING_SYSTEMS = [
+    ('CENTOS_6_64', 'CentOS', '6.0-64'),
+    ('UBUNTU_12_64', 'Ubuntu', '12.04-64'),
+    ('DEBIAN_7_64', 'Debian', '7.0-64'),
+    ('WIN_2012-STD_64', 'Windows 2012 Standard', '64 bit'),
+]
+POWER_STATES = {
+    'RUNNING': 'Running',
+    'HALTED': 'Halted',
+    'PAUSED': 'Paused',
+}
+EVENT_NAMES = ['Power On', 'Power Off', 'Reboot', 'Edit', 'Create']
+EPOCH = datetime.datetime(2014, 1, 1)
+
+
+def timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S-06:00')
+
+
+def power_state(key):
+    return {'keyName': key, 'name': POWER_STATES[key]}
+
+
+class Account(object):
+    """Objects of one account, by id, and the users who may use it.
+
+    :param guests: Number of virtual guests
+    :param images: Number of private images; there are as many public ones
+    :param subnets: Number of subnets
+    :param vlans: Number of VLANs
+    :param ssh_keys: Number of SSH keys
+    :param dns_zones: Number of DNS zones
+    :param records: Number of resource records in each DNS zone
+    :param events: Number of event log entries
+    :param seed: Seed of the generated objects
+    """
+
+    def __init__(self, guests=100, images=20, subnets=10, vlans=5,
+                 ssh_keys=10, dns_zones=5, records=10, events=200, seed=0,
+                 username='jumpgate', password='password', api_key=None):
+        self.lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._next_id = 1000
+        self.id = 200000 + seed
+        self.username = username
+        self.password = password
+        self.api_key = api_key or hashlib.sha256(
+            ('%s:%s' % (username, seed)).encode()).hexdigest()
+        # Portal login tokens handed out, by hash
+        self.login_tokens = {}
+
+        self.user = {
+            'id': self.new_id(),
+            'username': username,
+            'accountId': self.id,
+            'firstName': 'Fake',
+            'lastName': 'User',
+            'email': '%s@example.com' % username,
+            'createDate': timestamp(EPOCH),
+        }
+        self.vlans = self._generate(vlans, self.make_vlan)
+        self.subnets = self._generate(subnets, self.make_subnet)
+        self.ssh_keys = self._generate(ssh_keys, self.make_ssh_key)
+        self.images = self._generate(images, self.make_image)
+        self.public_images = self._generate(
+            images, lambda i: self.make_image(i, public=True))
+        self.guests = self._generate(guests, self.make_guest)
+        self.domains = self._generate(dns_zones, self.make_domain)
+        self.records = {}
+        for domain in self.domains.values():
+            for i in range(records):
+                record = self.make_record(domain, i)
+                self.records[record['id']] = record
+        self.events = [self.make_event(i) for i in range(events)]
+
+    def new_id(self):
+        with self.lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _generate(self, count, make):
+        objects = {}
+        for i in range(count):
+            obj = make(i)
+            objects[obj['id']] = obj
+        return objects
+
+    def _guid(self):
+        bits = '%032x' % self._random.getrandbits(128)
+        return '-'.join([bits[:8], bits[8:12], bits[12:16], bits[16:20],
+                         bits[20:]])
+
+    def _ip(self, first):
+        return '%s.%s.%s.%s' % (first, self._random.randint(0, 255),
+                                self._random.randint(0, 255),
+                                self._random.randint(1, 254))
+
+    def _date(self):
+        return timestamp(EPOCH + datetime.timedelta(
+            minutes=self._random.randint(0, 60 * 24 * 365)))
+
+    def make_vlan(self, i):
+        return {
+            'id': self.new_id(),
+            'vlanNumber': 800 + i,
+            'name': 'vlan%s' % i,
+            'accountId': self.id,
+            'networkSpace': 'PRIVATE' if i % 2 else 'PUBLIC',
+            'primaryRouter': {'hostname': 'fcr%02d.%s' % (
+                i % 4, DATACENTERS[i % len(DATACENTERS)]['name'])},
+        }
+
+    def make_subnet(self, i):
+        vlan = list(self.vlans.values())[i % len(self.vlans)] \
+            if self.vlans else None
+        subnet = {
+            'id': self.new_id(),
+            'networkIdentifier': '10.%s.%s.0' % (i // 256, i % 256),
+            'cidr': 26,
+            'netmask': '255.255.255.192',
+            'gateway': '10.%s.%s.1' % (i // 256, i % 256),
+            'broadcastAddress': '10.%s.%s.63' % (i // 256, i % 256),
+            'subnetType': 'PRIMARY',
+            'version': 4,
+            'totalIpAddresses': 64,
+            'usableIpAddressCount': 61,
+            'networkVlanId': vlan and vlan['id'],
+            'datacenter': dict(DATACENTERS[i % len(DATACENTERS)]),
+        }
+        if vlan:
+            subnet['networkVlan'] = dict(vlan)
+        return subnet
+
+    def make_ssh_key(self, i):
+        return {
+            'id': self.new_id(),
+            'label': 'key%s' % i,
+            'key': 'ssh-rsa AAAAB3NzaC1yc2E%032x fake%s' % (
+                self._random.getrandbits(128), i),
+            'fingerprint': ':'.join('%02x' % self._random.randint(0, 255)
+                                    for _ in range(16)),
+            'createDate': self._date(),
+            'modifyDate': None,
+            'notes': None,
+        }
+
+    def make_image(self, i, public=False):
+        keyname, name, version = OPERATING_SYSTEMS[
+            i % len(OPERATING_SYSTEMS)]
+        return {
+            'id': self.new_id(),
+            'globalIdentifier': self._guid(),
+            'name': '%s %s %s' % ('Public' if public else 'Private', name, i),
+            'accountId': None if public else self.id,
+            'publicFlag': 1 if public else 0,
+            'createDate': self._date(),
+            'parentId': None,
+            'status': {'keyName': 'ACTIVE', 'name': 'Active'},
+            'blockDevices': [{'diskImage': {
+                'capacity': 25, 'units': 'GB',
+                'softwareReferences': [{'softwareDescription': {
+                    'referenceCode': keyname, 'name': name,
+                    'version': version}}]}}],
+            'datacenters': [dict(dc) for dc in DATACENTERS],
+        }
+
+    def make_guest(self, i, template=None):
+        template = template or {}
+        datacenter = DATACENTERS[i % len(DATACENTERS)]
+        hostname = template.get('hostname') or 'guest%s' % i
+        domain = template.get('domain') or 'example.com'
+        images = list(self.images.values())
+        image = images[i % len(images)] if images else None
+        keys = list(self.ssh_keys.values())
+        vlans = list(self.vlans.values())
+        created = template.get('createDate') or self._date()
+        guest = {
+            'id': self.new_id(),
+            'globalIdentifier': self._guid(),
+            'accountId': self.id,
+            'hostname': hostname,
+            'domain': domain,
+            'fullyQualifiedDomainName': '%s.%s' % (hostname, domain),
+            'maxCpu': template.get('startCpus') or
+            self._random.choice([1, 2, 4, 8]),
+            'startCpus': template.get('startCpus') or 1,
+            'maxMemory': template.get('maxMemory') or
+            self._random.choice([1024, 2048, 4096, 8192]),
+            'hourlyBillingFlag': template.get('hourlyBillingFlag',
+                                              i % 3 != 0),
+            'localDiskFlag': False,
+            'dedicatedAccountHostOnlyFlag': False,
+            'createDate': created,
+            'modifyDate': created,
+            'provisionDate': created,
+            'status': {'keyName': 'ACTIVE', 'name': 'Active'},
+            'powerState': power_state(
+                'HALTED' if i % 10 == 9 else 'RUNNING'),
+            'datacenter': dict(datacenter),
+            'primaryIpAddress': self._ip(169),
+            'primaryBackendIpAddress': self._ip(10),
+            'operatingSystem': {'softwareLicense': {'softwareDescription': {
+                'referenceCode': OPERATING_SYSTEMS[
+                    i % len(OPERATING_SYSTEMS)][0]}}},
+            'sshKeys': [dict(keys[i % len(keys)])] if keys else [],
+            'networkVlans': [dict(vlan) for vlan in vlans[:2]],
+            'tagReferences': [],
+            'userData': [],
+            'billingItem': {
+                'id': self.new_id(),
+                'hoursUsed': str(self._random.randint(0, 720)),
+                'orderItem': {'order': {'userRecordId': self.user['id']}},
+            },
+        }
+        if image:
+            guest['blockDeviceTemplateGroup'] = {
+                'id': image['id'],
+                'globalIdentifier': image['globalIdentifier']}
+        return guest
+
+    def make_domain(self, i):
+        return {
+            'id': self.new_id(),
+            'name': 'zone%s.example.com' % i,
+            'serial': 2014010100 + i,
+            'updateDate': self._date(),
+        }
+
+    def make_record(self, domain, i):
+        return {
+            'id': self.new_id(),
+            'domainId': domain['id'],
+            'host': 'host%s' % i,
+            'type': 'a',
+            'data': self._ip(10),
+            'ttl': 900,
+        }
+
+    def make_event(self, i):
+        guests = list(self.guests.values())
+        guest = guests[i % len(guests)] if guests else {}
+        return {
+            'eventName': self._random.choice(EVENT_NAMES),
+            'eventCreateDate': self._date(),
+            'objectId': guest.get('id'),
+            'objectName': 'CCI',
+            'label': guest.get('fullyQualifiedDomainName'),
+            'userType': self._random.choice(['SYSTEM', 'CUSTOMER']),
+            'userId': self.user['id'],
+            'traceId': '%016x' % self._random.getrandbits(64),
+            'metaData': '',
+        }
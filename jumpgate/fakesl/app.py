@@ -0,0 +1,218 @@
+"""WSGI application speaking the XML-RPC and REST protocols of the SLAPI.
+
+XML-RPC calls are POSTed to <endpoint>/SoftLayer_Service, which is what
+SoftLayer.Client sends with endpoint_url set to http://host:port/xmlrpc/v3.
+REST calls go to /rest/v3/SoftLayer_Service[/id][/method].json with HTTP
+basic credentials, objectMask, objectFilter and resultLimit=offset,limit
+parameters and a {"parameters": [...]} body.
+
+Every call first sleeps for the latency of its Service.method plus up to
+jitter seconds, then fails with the given probabilities: with a
+SoftLayer_Exception_Public fault (error_rate) or an HTTP 503 before the API
+is reached (unavailable_rate).
+"""
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+from six.moves import socketserver, urllib, xmlrpc_client
+
+from jumpgate.fakesl.services import Call, Fault, Services
+
+LOG = logging.getLogger(__name__)
+
+SERVICE_PREFIX = 'SoftLayer_'
+REST_METHODS = {'GET': 'getObject', 'POST': 'createObject',
+                'PUT': 'editObject', 'DELETE': 'deleteObject'}
+STATUS_LINES = {200: '200 OK', 400: '400 Bad Request',
+                401: '401 Unauthorized', 404: '404 Not Found',
+                405: '405 Method Not Allowed',
+                500: '500 Internal Server Error',
+                503: '503 Service Unavailable'}
+
+
+class Unavailable(Exception):
+    pass
+
+
+class FakeSoftLayer(object):
+    """:param account: The Account calls are answered from
+    :param latency: Seconds every call takes
+    :param jitter: Most seconds added at random to the latency
+    :param error_rate: Share of calls failing with a fault
+    :param unavailable_rate: Share of calls failing with an HTTP 503
+    :param method_latencies: Latencies of Service.method calls
+    :param method_error_rates: Error rates of Service.method calls
+    :param seed: Seed of the injected jitter and errors
+    """
+
+    def __init__(self, account, latency=0.0, jitter=0.0, error_rate=0.0,
+                 unavailable_rate=0.0, method_latencies=None,
+                 method_error_rates=None, seed=None):
+        self.services = Services(account)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unavailable_rate = unavailable_rate
+        self.method_latencies = dict(
+            (name, float(value))
+            for name, value in (method_latencies or {}).items())
+        self.method_error_rates = dict(
+            (name, float(value))
+            for name, value in (method_error_rates or {}).items())
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def inject(self, call):
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(0, self.jitter)
+            unavailable = self._random.random() < self.unavailable_rate
+            failed = self._random.random() < self.method_error_rates.get(
+                call.name, self.error_rate)
+        delay = self.method_latencies.get(call.name, self.latency) + jitter
+        if delay > 0:
+            time.sleep(delay)
+        if unavailable:
+            raise Unavailable()
+        if failed:
+            raise Fault('SoftLayer_Exception_Public',
+                        'Injected failure of %s' % call.name)
+
+    def call(self, call):
+        self.inject(call)
+        return self.services.handle(call)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        try:
+            if '/rest/' in path:
+                status, content_type, body = self.rest(environ)
+            elif environ['REQUEST_METHOD'] == 'POST':
+                status, content_type, body = self.xmlrpc(environ)
+            else:
+                status, content_type, body = (
+                    405, 'text/plain', b'XML-RPC calls are POSTed')
+        except Unavailable:
+            status, content_type, body = (
+                503, 'text/plain', b'Service Unavailable')
+
+        start_response(STATUS_LINES[status], [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(body)))])
+        return [body]
+
+    def xmlrpc(self, environ):
+        service = environ['PATH_INFO'].rstrip('/').rsplit('/', 1)[-1]
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        try:
+            params, method = xmlrpc_client.loads(
+                environ['wsgi.input'].read(length))
+        except Exception:
+            return self._fault(Fault('SoftLayer_Exception_Public',
+                                     'Unable to parse the request'))
+
+        headers = {}
+        if params and isinstance(params[0], dict) and 'headers' in params[0]:
+            headers = params[0]['headers'] or {}
+            params = params[1:]
+        limit = headers.get('resultLimit') or {}
+        call = Call(
+            _service_name(service), method, params,
+            id=(headers.get(service + 'InitParameters') or {}).get('id'),
+            auth=headers.get('authenticate'),
+            mask=(headers.get('SoftLayer_ObjectMask') or
+                  headers.get('%sObjectMask' % service) or {}).get('mask'),
+            object_filter=headers.get('%sObjectFilter' % service),
+            limit=limit.get('limit'), offset=limit.get('offset') or 0)
+        try:
+            result = self.call(call)
+        except Fault as e:
+            return self._fault(e)
+        return 200, 'text/xml', xmlrpc_client.dumps(
+            (result,), methodresponse=True, allow_none=True).encode('utf-8')
+
+    def _fault(self, fault):
+        # XML-RPC faults go out with a 200 like the real endpoint's
+        return 200, 'text/xml', xmlrpc_client.dumps(
+            xmlrpc_client.Fault(fault.code, fault.message),
+            methodresponse=True).encode('utf-8')
+
+    def rest(self, environ):
+        parts = environ['PATH_INFO'].split('/rest/', 1)[1].split('/')[1:]
+        if not parts or not parts[-1].endswith('.json'):
+            return 404, 'application/json', json.dumps({
+                'error': 'Only .json REST calls are supported',
+                'code': 'SoftLayer_Exception_Public'}).encode('utf-8')
+        parts[-1] = parts[-1][:-len('.json')]
+        service, rest = parts[0], parts[1:]
+        object_id = None
+        if rest and rest[0].isdigit():
+            object_id = int(rest.pop(0))
+        method = rest[0] if rest else REST_METHODS.get(
+            environ['REQUEST_METHOD'], 'getObject')
+
+        query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+        limit, offset = None, 0
+        if query.get('resultLimit'):
+            offset, limit = [int(n) for n in
+                             query['resultLimit'][0].split(',')]
+        object_filter = None
+        if query.get('objectFilter'):
+            object_filter = json.loads(query['objectFilter'][0])
+
+        args = []
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        if length:
+            body = json.loads(environ['wsgi.input'].read(length).decode())
+            args = body.get('parameters', [])
+
+        call = Call(_service_name(service), method, args, id=object_id,
+                    auth=_basic_auth(environ),
+                    mask=query.get('objectMask', [None])[0],
+                    object_filter=object_filter, limit=limit,
+                    offset=offset)
+        try:
+            result = self.call(call)
+        except Fault as e:
+            return e.status, 'application/json', json.dumps({
+                'error': e.message, 'code': e.code}).encode('utf-8')
+        return 200, 'application/json', json.dumps(result).encode('utf-8')
+
+
+def _service_name(service):
+    if service.startswith(SERVICE_PREFIX):
+        return service[len(SERVICE_PREFIX):]
+    return service
+
+
+def _basic_auth(environ):
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Basic '):
+        return {}
+    try:
+        username, api_key = base64.b64decode(
+            header[len('Basic '):].encode()).decode().split(':', 1)
+    except (TypeError, ValueError):
+        return {}
+    return {'username': username, 'apiKey': api_key}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def make_fake_server(app, host='127.0.0.1', port=0):
+    """Return a threaded server for app; port 0 picks a free port."""
+    return make_server(host, port, app, server_class=ThreadingWSGIServer,
+                       handler_class=QuietHandler)
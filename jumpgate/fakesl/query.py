@@ -0,0 +1,213 @@
+"""Object masks, object filters and result limits, applied to results the
+way the SLAPI applies them.
+"""
+import re
+
+import six
+
+TOKEN_RE = re.compile(r'\w+|\S')
+OPERATOR_RE = re.compile(r'^(_=|\*=|\^=|\$=|!=|!~|~|>=|<=|>|<)\s*(.*)$')
+
+
+def _merge(tree, other):
+    for name, sub in other.items():
+        _merge(tree.setdefault(name, {}), sub)
+
+
+def _parse_items(tokens, pos, closing):
+    tree = {}
+    while pos < len(tokens) and tokens[pos] != closing:
+        token = tokens[pos]
+        if token in ',;':
+            pos += 1
+        elif token == '[':
+            sub, pos = _parse_items(tokens, pos + 1, ']')
+            _merge(tree, sub)
+            pos += 1
+        elif token == '(':
+            # Type casts like mask(SoftLayer_Hardware_Server) don't matter
+            # to plain dicts
+            while pos < len(tokens) and tokens[pos] != ')':
+                pos += 1
+            pos += 1
+        else:
+            path = [token]
+            pos += 1
+            while pos < len(tokens):
+                if tokens[pos] == '(':
+                    while pos < len(tokens) and tokens[pos] != ')':
+                        pos += 1
+                    pos += 1
+                elif tokens[pos] == '.' and pos + 1 < len(tokens):
+                    path.append(tokens[pos + 1])
+                    pos += 2
+                else:
+                    break
+            sub = {}
+            if pos < len(tokens) and tokens[pos] == '[':
+                sub, pos = _parse_items(tokens, pos + 1, ']')
+                pos += 1
+            node = tree
+            for name in path[:-1]:
+                node = node.setdefault(name, {})
+            _merge(node.setdefault(path[-1], {}), sub)
+    return tree, pos
+
+
+def parse_mask(mask):
+    """Parse an object mask into a tree of {property: {property: ...}}.
+    Both mask[a,b[c]] and the older mask.a;b.c forms are understood.
+    """
+    if not mask:
+        return {}
+    if isinstance(mask, dict):
+        # Old dict masks, like {'datacenter': {'name': None}}
+        return dict((name, parse_mask(sub) if isinstance(sub, dict) else {})
+                    for name, sub in mask.items())
+    tree, _ = _parse_items(TOKEN_RE.findall(mask), 0, None)
+    root = tree.pop('mask', {})
+    _merge(root, tree)
+    return root
+
+
+def _is_local(value):
+    return not isinstance(value, (dict, list))
+
+
+def apply_mask(result, tree):
+    """Return the properties of result the mask tree asks for.
+
+    Like the SLAPI, relational properties are only returned when asked for
+    and local ones unless the mask names some of them.
+    """
+    if isinstance(result, list):
+        return [apply_mask(item, tree) for item in result]
+    if not isinstance(result, dict):
+        return result
+
+    names_local = any(name in result and _is_local(result[name])
+                      for name in tree)
+    masked = {}
+    for name, value in result.items():
+        if name in tree:
+            masked[name] = apply_mask(value, tree[name])
+        elif not names_local and _is_local(value):
+            masked[name] = value
+    return masked
+
+
+def _matches_operation(value, operation):
+    if isinstance(operation, (list, tuple)):
+        return any(_matches_operation(value, op) for op in operation)
+    if not isinstance(operation, six.string_types):
+        return value == operation or six.text_type(value) == six.text_type(operation)
+
+    match = OPERATOR_RE.match(operation)
+    if match is None:
+        return six.text_type(value) == operation
+    operator, operand = match.groups()
+    text = '' if value is None else six.text_type(value)
+    if operator == '_=':
+        return text.lower() == operand.lower()
+    if operator in ('*=', '~'):
+        return operand.lower() in text.lower()
+    if operator == '!~':
+        return operand.lower() not in text.lower()
+    if operator == '^=':
+        return text.lower().startswith(operand.lower())
+    if operator == '$=':
+        return text.lower().endswith(operand.lower())
+    if operator == '!=':
+        return text.lower() != operand.lower()
+    try:
+        number, limit = float(text), float(operand)
+    except ValueError:
+        number, limit = text, operand
+    return {'>': number > limit, '<': number < limit,
+            '>=': number >= limit, '<=': number <= limit}[operator]
+
+
+def matches(obj, object_filter):
+    """Whether an object passes a filter like
+    {'hostname': {'operation': '^= web'}, 'datacenter': {'name': ...}}.
+    """
+    if isinstance(obj, list):
+        return any(matches(item, object_filter) for item in obj)
+    if not isinstance(object_filter, dict) or not isinstance(obj, dict):
+        return True
+
+    for name, condition in object_filter.items():
+        if not isinstance(condition, dict):
+            continue
+        value = obj.get(name)
+        if 'operation' in condition:
+            operation = condition['operation']
+            if operation == 'orderBy':
+                continue
+            if operation == 'in':
+                if six.text_type(value) not in [
+                        six.text_type(v)
+                        for v in _options(condition).get('data', [])]:
+                    return False
+            elif operation in ('is null', 'not null'):
+                if (value is None) != (operation == 'is null'):
+                    return False
+            elif not _matches_operation(value, operation):
+                return False
+        elif value is None or not matches(value, condition):
+            return False
+    return True
+
+
+def _options(condition):
+    return dict((option['name'], option['value'])
+                for option in condition.get('options', []))
+
+
+def _order_by(conditions, path=()):
+    """Yield the (property path, reverse) of orderBy operations."""
+    for name, condition in sorted(conditions.items()):
+        if not isinstance(condition, dict):
+            continue
+        if condition.get('operation') == 'orderBy':
+            sort = _options(condition).get('sort') or ['ASC']
+            yield path + (name,), sort[0].upper() == 'DESC'
+        elif 'operation' not in condition:
+            for order in _order_by(condition, path + (name,)):
+                yield order
+
+
+def _lookup(obj, path):
+    for name in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(name)
+    return obj
+
+
+def apply_filter(results, object_filter):
+    """Filter and sort list results. A filter names the property being
+    fetched at its top, like {'virtualGuests': {...}}, or goes straight to
+    the conditions for methods like Event_Log.getAllObjects.
+    """
+    if not object_filter or not isinstance(results, list):
+        return results
+    conditions = object_filter
+    if len(object_filter) == 1:
+        name, inner = list(object_filter.items())[0]
+        if isinstance(inner, dict) and 'operation' not in inner and (
+                not results or name not in results[0]):
+            conditions = inner
+    results = [obj for obj in results if matches(obj, conditions)]
+    # Sort by the last order first so the first one decides
+    for path, reverse in reversed(list(_order_by(conditions))):
+        results.sort(key=lambda obj: (_lookup(obj, path) is not None,
+                                      _lookup(obj, path)),
+                     reverse=reverse)
+    return results
+
+
+def apply_limit(results, limit, offset=0):
+    if not limit or not isinstance(results, list):
+        return results
+    return results[offset:offset + limit]
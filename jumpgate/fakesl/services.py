@@ -0,0 +1,393 @@
+"""The SLAPI services of a synthetic account.
+
+Each method is named Service_method after the service and method it
+stands in for and takes a Call. Methods of objects read Call.id, the id
+the caller passed as init parameter. Services.handle applies the object
+filter, result limit and object mask of the call to what they return.
+"""
+import copy
+import datetime
+import hashlib
+
+from jumpgate.fakesl import query
+from jumpgate.fakesl.account import DATACENTERS, power_state, timestamp
+
+
+class Fault(Exception):
+    """A SLAPI error, sent to XML-RPC callers as a fault."""
+
+    def __init__(self, code, message, status=500):
+        super(Fault, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class Call(object):
+    def __init__(self, service, method, args=(), id=None, auth=None,
+                 mask=None, object_filter=None, limit=None, offset=0):
+        self.service = service
+        self.method = method
+        self.args = list(args)
+        self.id = id
+        self.auth = auth or {}
+        self.mask = mask
+        self.object_filter = object_filter
+        self.limit = limit
+        self.offset = offset
+
+    @property
+    def name(self):
+        return '%s.%s' % (self.service, self.method)
+
+    def arg(self, index, default=None):
+        if index < len(self.args):
+            return self.args[index]
+        return default
+
+
+def not_found(call):
+    return Fault('SoftLayer_Exception_ObjectNotFound',
+                 'Unable to find object with id of \'%s\'.' % call.id, 404)
+
+
+def _sorted(objects):
+    return [objects[key] for key in sorted(objects)]
+
+
+class Services(object):
+    """Answers calls against an Account."""
+
+    # Methods callers may make without credentials
+    PUBLIC = frozenset(['User_Customer.getPortalLoginToken'])
+    # Methods returning containers, which come whole whatever the mask
+    CONTAINERS = frozenset(['Virtual_Guest.getCreateObjectOptions',
+                            'User_Customer.getPortalLoginToken'])
+
+    def __init__(self, account):
+        self.account = account
+
+    def handle(self, call):
+        handler = getattr(self, '%s_%s' % (call.service, call.method), None)
+        if handler is None:
+            raise Fault('SoftLayer_Exception_Public',
+                        'Function ("%s") is not a valid method for this '
+                        'service.' % call.method)
+        if call.name not in self.PUBLIC:
+            self.authenticate(call)
+        with self.account.lock:
+            result = handler(call)
+            if call.name in self.CONTAINERS:
+                return copy.deepcopy(result)
+            result = query.apply_filter(result, call.object_filter)
+            result = query.apply_limit(result, call.limit, call.offset)
+            # Masking copies the result, so callers can't change the
+            # account through it
+            return query.apply_mask(result, query.parse_mask(call.mask))
+
+    def authenticate(self, call):
+        auth = call.auth
+        account = self.account
+        if 'apiKey' in auth:
+            if (auth.get('username') == account.username and
+                    auth['apiKey'] == account.api_key):
+                return
+        elif 'authToken' in auth:
+            if account.login_tokens.get(auth['authToken']) == \
+                    account.user['id'] and \
+                    str(auth.get('userId')) == str(account.user['id']):
+                return
+        raise Fault('SoftLayer_Exception_InvalidCredentials',
+                    'Invalid API token.', 401)
+
+    def _get(self, objects, call):
+        try:
+            return objects[int(call.id)]
+        except (KeyError, TypeError, ValueError):
+            raise not_found(call)
+
+    def _delete(self, objects, call):
+        self._get(objects, call)
+        del objects[int(call.id)]
+        return True
+
+    def _edit(self, objects, call, editable):
+        obj = self._get(objects, call)
+        template = call.arg(0) or {}
+        for name in editable:
+            if name in template:
+                obj[name] = template[name]
+        return True
+
+    # Account
+
+    def Account_getObject(self, call):
+        return {
+            'id': self.account.id,
+            'companyName': 'Fake Company %s' % self.account.id,
+            'email': self.account.user['email'],
+            'firstName': self.account.user['firstName'],
+            'lastName': self.account.user['lastName'],
+            'country': 'US',
+        }
+
+    def Account_getCurrentUser(self, call):
+        return self.account.user
+
+    def Account_getVirtualGuests(self, call):
+        return _sorted(self.account.guests)
+
+    def Account_getHourlyVirtualGuests(self, call):
+        return [guest for guest in _sorted(self.account.guests)
+                if guest['hourlyBillingFlag']]
+
+    def Account_getMonthlyVirtualGuests(self, call):
+        return [guest for guest in _sorted(self.account.guests)
+                if not guest['hourlyBillingFlag']]
+
+    def Account_getHardware(self, call):
+        return []
+
+    def Account_getPrivateBlockDeviceTemplateGroups(self, call):
+        return _sorted(self.account.images)
+
+    def Account_getBlockDeviceTemplateGroups(self, call):
+        return _sorted(self.account.images)
+
+    def Account_getSubnets(self, call):
+        return _sorted(self.account.subnets)
+
+    def Account_getNetworkVlans(self, call):
+        return _sorted(self.account.vlans)
+
+    def Account_getSshKeys(self, call):
+        return _sorted(self.account.ssh_keys)
+
+    def Account_getDomains(self, call):
+        return _sorted(self.account.domains)
+
+    # Virtual_Guest
+
+    def Virtual_Guest_getObject(self, call):
+        return self._get(self.account.guests, call)
+
+    def Virtual_Guest_getPowerState(self, call):
+        return self._get(self.account.guests, call)['powerState']
+
+    def Virtual_Guest_createObject(self, call):
+        template = call.arg(0) or {}
+        account = self.account
+        guest = account.make_guest(len(account.guests), dict(
+            template, createDate=timestamp(datetime.datetime.now())))
+        datacenter = (template.get('datacenter') or {}).get('name')
+        for dc in DATACENTERS:
+            if dc['name'] == datacenter:
+                guest['datacenter'] = dict(dc)
+        image = (template.get('blockDeviceTemplateGroup') or {}).get(
+            'globalIdentifier')
+        if image:
+            guest['blockDeviceTemplateGroup'] = {'globalIdentifier': image}
+        keys = [account.ssh_keys[key['id']]
+                for key in template.get('sshKeys') or []
+                if key.get('id') in account.ssh_keys]
+        guest['sshKeys'] = keys
+        account.guests[guest['id']] = guest
+        return guest
+
+    def Virtual_Guest_editObject(self, call):
+        guest = self._get(self.account.guests, call)
+        self._edit(self.account.guests, call, ['hostname', 'domain', 'notes'])
+        guest['fullyQualifiedDomainName'] = '%s.%s' % (guest['hostname'],
+                                                       guest['domain'])
+        return True
+
+    def Virtual_Guest_setUserMetadata(self, call):
+        guest = self._get(self.account.guests, call)
+        guest['userData'] = [{'value': value}
+                             for value in call.arg(0) or []]
+        return True
+
+    def Virtual_Guest_deleteObject(self, call):
+        return self._delete(self.account.guests, call)
+
+    def _power(self, call, state):
+        self._get(self.account.guests, call)['powerState'] = \
+            power_state(state)
+        return True
+
+    def Virtual_Guest_powerOn(self, call):
+        return self._power(call, 'RUNNING')
+
+    def Virtual_Guest_powerOff(self, call):
+        return self._power(call, 'HALTED')
+
+    def Virtual_Guest_powerOffSoft(self, call):
+        return self._power(call, 'HALTED')
+
+    def Virtual_Guest_rebootSoft(self, call):
+        return self._power(call, 'RUNNING')
+
+    def Virtual_Guest_rebootHard(self, call):
+        return self._power(call, 'RUNNING')
+
+    def Virtual_Guest_pause(self, call):
+        return self._power(call, 'PAUSED')
+
+    def Virtual_Guest_resume(self, call):
+        return self._power(call, 'RUNNING')
+
+    def Virtual_Guest_getCreateObjectOptions(self, call):
+        return {
+            'processors': [{'template': {'startCpus': cpus}}
+                           for cpus in (1, 2, 4, 8)],
+            'memory': [{'template': {'maxMemory': memory}}
+                       for memory in (1024, 2048, 4096, 8192)],
+            'datacenters': [{'template': {'datacenter': {
+                'name': dc['name']}}} for dc in DATACENTERS],
+            'operatingSystems': [{'template': {
+                'operatingSystemReferenceCode': image['blockDevices'][0][
+                    'diskImage']['softwareReferences'][0][
+                    'softwareDescription']['referenceCode']}}
+                for image in _sorted(self.account.public_images)[:4]],
+        }
+
+    # Virtual_Guest_Block_Device_Template_Group
+
+    def _images(self):
+        images = dict(self.account.public_images)
+        images.update(self.account.images)
+        return images
+
+    def Virtual_Guest_Block_Device_Template_Group_getObject(self, call):
+        return self._get(self._images(), call)
+
+    def Virtual_Guest_Block_Device_Template_Group_getPublicImages(self, call):
+        return _sorted(self.account.public_images)
+
+    def Virtual_Guest_Block_Device_Template_Group_editObject(self, call):
+        return self._edit(self.account.images, call, ['name', 'note'])
+
+    def Virtual_Guest_Block_Device_Template_Group_deleteObject(self, call):
+        return self._delete(self.account.images, call)
+
+    # Network
+
+    def Network_Subnet_getObject(self, call):
+        return self._get(self.account.subnets, call)
+
+    def Network_Vlan_getObject(self, call):
+        return self._get(self.account.vlans, call)
+
+    # Security_Ssh_Key
+
+    def Security_Ssh_Key_getObject(self, call):
+        return self._get(self.account.ssh_keys, call)
+
+    def Security_Ssh_Key_createObject(self, call):
+        template = call.arg(0) or {}
+        key = {
+            'id': self.account.new_id(),
+            'label': template.get('label'),
+            'key': template.get('key'),
+            'notes': template.get('notes'),
+            'fingerprint': ':'.join(
+                hashlib.md5((template.get('key') or '').encode()).hexdigest()[
+                    i:i + 2] for i in range(0, 32, 2)),
+            'createDate': timestamp(datetime.datetime.now()),
+            'modifyDate': None,
+        }
+        self.account.ssh_keys[key['id']] = key
+        return key
+
+    def Security_Ssh_Key_editObject(self, call):
+        return self._edit(self.account.ssh_keys, call, ['label', 'notes'])
+
+    def Security_Ssh_Key_deleteObject(self, call):
+        return self._delete(self.account.ssh_keys, call)
+
+    # DNS
+
+    def Dns_Domain_getObject(self, call):
+        return self._get(self.account.domains, call)
+
+    def Dns_Domain_getByDomainName(self, call):
+        name = call.arg(0)
+        return [domain for domain in _sorted(self.account.domains)
+                if domain['name'] == name]
+
+    def Dns_Domain_getResourceRecords(self, call):
+        domain = self._get(self.account.domains, call)
+        return [record for record in _sorted(self.account.records)
+                if record['domainId'] == domain['id']]
+
+    def Dns_Domain_createObject(self, call):
+        template = call.arg(0) or {}
+        domain = {
+            'id': self.account.new_id(),
+            'name': template.get('name'),
+            'serial': 1,
+            'updateDate': timestamp(datetime.datetime.now()),
+        }
+        self.account.domains[domain['id']] = domain
+        return domain
+
+    def Dns_Domain_deleteObject(self, call):
+        self._get(self.account.domains, call)
+        for record in list(self.account.records.values()):
+            if record['domainId'] == int(call.id):
+                del self.account.records[record['id']]
+        return self._delete(self.account.domains, call)
+
+    def Dns_Domain_ResourceRecord_getObject(self, call):
+        return self._get(self.account.records, call)
+
+    def Dns_Domain_ResourceRecord_createObject(self, call):
+        template = call.arg(0) or {}
+        if template.get('domainId') not in self.account.domains:
+            raise Fault('SoftLayer_Exception_ObjectNotFound',
+                        'Unable to find domain %s.' %
+                        template.get('domainId'), 404)
+        record = {
+            'id': self.account.new_id(),
+            'domainId': template['domainId'],
+            'host': template.get('host'),
+            'type': (template.get('type') or 'a').lower(),
+            'data': template.get('data'),
+            'ttl': template.get('ttl') or 900,
+        }
+        self.account.records[record['id']] = record
+        return record
+
+    def Dns_Domain_ResourceRecord_editObject(self, call):
+        return self._edit(self.account.records, call,
+                          ['host', 'type', 'data', 'ttl'])
+
+    def Dns_Domain_ResourceRecord_deleteObject(self, call):
+        return self._delete(self.account.records, call)
+
+    # Event_Log
+
+    def Event_Log_getAllObjects(self, call):
+        return list(self.account.events)
+
+    # Users and locations
+
+    def User_Customer_getObject(self, call):
+        if call.id is not None and str(call.id) != str(
+                self.account.user['id']):
+            raise not_found(call)
+        return self.account.user
+
+    def User_Customer_getPortalLoginToken(self, call):
+        account = self.account
+        if (call.arg(0) != account.username or
+                call.arg(1) != account.password):
+            raise Fault('SoftLayer_Exception_User_Customer_LoginFailed',
+                        'Invalid username/password combination.', 401)
+        token = hashlib.sha256(('%s:%s' % (
+            account.api_key, account.new_id())).encode()).hexdigest()
+        account.login_tokens[token] = account.user['id']
+        return {'userId': account.user['id'], 'hash': token}
+
+    def Location_Datacenter_getDatacenters(self, call):
+        return list(DATACENTERS)
@@ -1,3 +1,5 @@
+from jumpgate.common.admission import CRITICAL
+
 
 def add_endpoints(disp):
     # Versions
@@ -6,7 +8,7 @@ def add_endpoints(disp):
     # V3 API - http://api.openstack.org/api-ref-identity.html#identity-v3
 
     # Tokens
-    disp.add_endpoint('v3_tokens', '/v3/tokens')
+    disp.add_endpoint('v3_tokens', '/v3/tokens', priority=CRITICAL)
 
     # Service Catalog
     disp.add_endpoint('v3_services', '/v3/services')
@@ -90,16 +92,17 @@ def add_endpoints(disp):
     disp.add_endpoint('v2_extensions', '/v2.0/extensions')
     disp.add_endpoint('v2_extension_alias',
                       '/v2.0/extensions/{alias}')
-    disp.add_endpoint('v2_tokens', '/v2.0/tokens')
+    disp.add_endpoint('v2_tokens', '/v2.0/tokens', priority=CRITICAL)
     disp.add_endpoint('v2_token_tenants', '/v2.0/tokens/tenants')
 
     # V2.0 Admin API
     # http://api.openstack.org/api-ref-identity.html#identity-admin-v2.0
     # This list only includes those not defined above.
 
-    disp.add_endpoint('v2_token', '/v2.0/tokens/{token_id}')
+    disp.add_endpoint('v2_token', '/v2.0/tokens/{token_id}',
+                      priority=CRITICAL)
     disp.add_endpoint('v2_token_endpoints',
-                      '/v2.0/tokens/{token_id}/endpoints')
+                      '/v2.0/tokens/{token_id}/endpoints', priority=CRITICAL)
     disp.add_endpoint('v2_users', '/v2.0/users')
     disp.add_endpoint('v2_user', '/v2.0/users/{user_id}')
     disp.add_endpoint('v2_user_roles',
@@ -1,3 +1,5 @@
+from jumpgate.common.admission import BULK
+
 
 def add_endpoints(disp):
     # V2 API - http://api.openstack.org/api-ref-image.html#os-images-2.0
@@ -12,7 +14,8 @@ def add_endpoints(disp):
                       '/v2/schemas/images')
     disp.add_endpoint('v2_image', '/v2/images/{image_guid}')
     disp.add_endpoint('v2_images', '/v2/images')
-    disp.add_endpoint('v2_images_detail', '/v2/images/detail')
+    disp.add_endpoint('v2_images_detail', '/v2/images/detail',
+                      priority=BULK)
     disp.add_endpoint('v2_image_file', '/v2/images/{image_guid}/file')
     disp.add_endpoint('v2_image_tag', '/v2/images/{image_guid}/tags/{tag}')
 
@@ -20,7 +23,8 @@ def add_endpoints(disp):
 
     disp.add_endpoint('v1_image', '/v1/images/{image_guid}')
     disp.add_endpoint('v1_images', '/v1/images')
-    disp.add_endpoint('v1_images_detail', '/v1/images/detail')
+    disp.add_endpoint('v1_images_detail', '/v1/images/detail',
+                      priority=BULK)
     disp.add_endpoint('v1_image_members', '/v1/images/{image_guid}/members')
     disp.add_endpoint('v1_image_owner',
                       '/v1/images/{image_guid}/members/{owner}')
@@ -0,0 +1,118 @@
+import errno
+import logging
+import os
+import os.path
+import re
+import uuid
+
+from jumpgate.config import CONF
+from jumpgate.common import streams
+import jumpgate.common.utils as utils
+
+
+LOG = logging.getLogger(__name__)
+VALID_IMAGE_ID = re.compile(r'^[\w-]+$')
+
+
+def store_driver():
+    return utils.load_driver(CONF['image']['store_driver'])
+
+
+class ImageStoreDriver(object):
+    """Encapsulates access to the backend holding image file contents.
+    Implementations must never buffer a whole image; data is moved in
+    chunks of at most `chunk_size` bytes.
+    """
+
+    def size(self, image_guid):
+        """Return the size in bytes of the stored image file or None if
+        there isn't one.
+
+        :param image_guid: The image to look up.
+        """
+        raise NotImplementedError()
+
+    def open(self, image_guid, offset=0):
+        """Return a readable file-like object for the image file positioned
+        at the given offset.
+
+        :param image_guid: The image to read.
+        :param offset: The byte offset to start reading from.
+        """
+        raise NotImplementedError()
+
+    def write(self, image_guid, stream, length=None, chunk_size=None):
+        """Store the contents of stream as the image file and return the
+        number of bytes written.
+
+        :param image_guid: The image to write.
+        :param stream: A readable file-like object with the image data.
+        :param length: If specified the number of bytes to read from stream.
+        :param chunk_size: If specified the size of each read.
+        """
+        raise NotImplementedError()
+
+    def delete(self, image_guid):
+        """Remove the stored image file, if any.
+
+        :param image_guid: The image to remove.
+        """
+        raise NotImplementedError()
+
+
+class FileImageStoreDriver(ImageStoreDriver):
+    """Image store backed by a local directory. Mostly useful as a stand-in
+    for an object store during development and testing.
+    """
+
+    def __init__(self, path=None):
+        super(FileImageStoreDriver, self).__init__()
+        self.path = path or CONF['image']['store_path']
+
+    def _file_path(self, image_guid):
+        if not VALID_IMAGE_ID.match(image_guid or ''):
+            raise ValueError("Invalid image ID '%s'" % image_guid)
+        return os.path.join(self.path, image_guid)
+
+    def size(self, image_guid):
+        try:
+            return os.path.getsize(self._file_path(image_guid))
+        except OSError:
+            return None
+
+    def open(self, image_guid, offset=0):
+        f = open(self._file_path(image_guid), 'rb')
+        if offset:
+            f.seek(offset)
+        return f
+
+    def write(self, image_guid, stream, length=None, chunk_size=None):
+        path = self._file_path(image_guid)
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # Write to a temporary file so readers never see a partial image
+        tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as f:
+                written = streams.copy_stream(
+                    stream, f,
+                    chunk_size=chunk_size or CONF['image']['chunk_size'],
+                    length=length)
+            os.rename(tmp_path, path)
+        except Exception:
+            LOG.exception("Unable to store image file '%s'", image_guid)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def delete(self, image_guid):
+        try:
+            os.remove(self._file_path(image_guid))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
@@ -1,5 +1,5 @@
 from .images import ImageV1, ImagesV1, SchemaImageV2, \
-    SchemaImagesV2, ImagesV2, SchemaMemberV2, SchemaMembersV2
+    SchemaImagesV2, ImagesV2, SchemaMemberV2, SchemaMembersV2, ImageFileV2
 from jumpgate.common.sl import add_hooks
 
 
@@ -8,6 +8,7 @@ def setup_routes(app, disp):
     disp.set_handler('v2_image', ImageV1(app))
     disp.set_handler('v2_images', ImagesV2(app))
     disp.set_handler('v2_images_detail', ImagesV2(app))
+    disp.set_handler('v2_image_file', ImageFileV2(app))
     disp.set_handler('v2_schema_image', SchemaImageV2())
     disp.set_handler('v2_schema_member', SchemaMemberV2())
     disp.set_handler('v2_schema_members', SchemaMembersV2())
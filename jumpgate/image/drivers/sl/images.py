@@ -3,8 +3,14 @@ import uuid
 
 from SoftLayer.utils import query_filter, NestedDict
 
+from jumpgate.common.config import CONF
+from jumpgate.common.sl.fanout import fan_out
+from jumpgate.common.streams import ChunkedStream
 from jumpgate.common.utils import lookup
-from jumpgate.common.error_handling import not_found, bad_request
+from jumpgate.common.error_handling import (not_found, bad_request,
+                                            range_not_satisfiable)
+from jumpgate.common.exceptions import ResponseException
+from jumpgate.image.drivers import core as image_core
 
 
 class SchemaImageV2(object):
@@ -306,6 +312,7 @@ class ImagesV2(object):
 
         client['Virtual_Guest_Block_Device_Template_Group'].deleteObject(
             id=results['id'])
+        image_core.store_driver().delete(image_guid)
 
         resp.status = 204
 
@@ -359,14 +366,21 @@ class ImagesV2(object):
 
         marker = req.get_param('marker')
 
-        for visibility, funct in [('public', image_obj.get_public_images),
-                                  ('private', image_obj.get_private_images)]:
+        sources = {}
+        if limit != 0:
+            params = {'name': req.get_param('name'),
+                      'limit': limit,
+                      'marker': marker}
+            sources = fan_out(req, {
+                'public': lambda: image_obj.get_public_images(**params),
+                'private': lambda: image_obj.get_private_images(**params),
+            })
+
+        for visibility in ['public', 'private']:
 
             if limit == 0:
                 break
-            results = funct(name=req.get_param('name'),
-                            limit=limit,
-                            marker=marker)
+            results = sources[visibility]
 
             if not results:
                 continue
@@ -375,6 +389,9 @@ class ImagesV2(object):
                 results = [results]
 
             for image in results:
+                # Both sources were asked for the full limit
+                if limit == 0:
+                    break
                 formatted_image = get_v2_image_details_dict(self.app,
                                                             req,
                                                             image,
@@ -407,6 +424,7 @@ class ImageV1(object):
 
         client['Virtual_Guest_Block_Device_Template_Group'].deleteObject(
             id=results['id'])
+        image_core.store_driver().delete(image_guid)
 
         resp.status = 204
 
@@ -452,14 +470,125 @@ class ImageV1(object):
         resp.set_headers(headers)
 
 
+class ImageFileV2(object):
+    def __init__(self, app):
+        self.app = app
+
+    def on_get(self, req, resp, image_guid, tenant_id=None):
+        image_obj = SLImages(req.env['sl_client'])
+        if not image_obj.get_image(image_guid):
+            return not_found(resp, 'Image could not be found')
+
+        store = image_core.store_driver()
+        size = store.size(image_guid)
+        if size is None:
+            return not_found(resp, 'Image data could not be found')
+
+        start, end = 0, size - 1
+        if req.get_header('range'):
+            try:
+                byte_range = parse_range(req.get_header('range'), size)
+            except ValueError:
+                # Malformed ranges are ignored and the full file is sent
+                byte_range = (start, end)
+
+            if byte_range is None:
+                resp.set_header('Content-Range', 'bytes */%s' % size)
+                return range_not_satisfiable(
+                    resp, 'Requested range not satisfiable')
+
+            start, end = byte_range
+            if (start, end) != (0, size - 1):
+                resp.status = 206
+                resp.content_range = (start, end, size)
+
+        length = end - start + 1
+        resp.set_header('Accept-Ranges', 'bytes')
+        resp.content_type = 'application/octet-stream'
+        resp.stream = ChunkedStream(store.open(image_guid, offset=start),
+                                    chunk_size=CONF['image']['chunk_size'],
+                                    length=length)
+        resp.stream_len = length
+
+    def on_put(self, req, resp, image_guid, tenant_id=None):
+        if not get_owned_image(req, image_guid):
+            return not_found(resp, 'Image could not be found')
+
+        image_core.store_driver().write(image_guid, req.stream,
+                                        length=req.content_length)
+        resp.status = 204
+
+
+def parse_range(value, size):
+    """Parse a single HTTP byte range into an inclusive (start, end) tuple.
+
+    Returns None if the range can't be satisfied for a file of the given
+    size and raises ValueError if the header is malformed or asks for
+    multiple ranges.
+    """
+    units, _, spec = value.partition('=')
+    if units.strip().lower() != 'bytes' or ',' in spec:
+        raise ValueError('Unsupported range: %s' % value)
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep or not (first or last):
+        raise ValueError('Malformed range: %s' % value)
+
+    if first:
+        start = int(first)
+        end = int(last) if last else None
+        if end is not None and end < start:
+            raise ValueError('Malformed range: %s' % value)
+    else:
+        # Suffix range, e.g. "bytes=-500" for the last 500 bytes
+        suffix = int(last)
+        if suffix == 0:
+            return None
+        start, end = max(size - suffix, 0), size - 1
+
+    if start >= size:
+        return None
+
+    if end is None:
+        end = size - 1
+
+    return start, min(end, size - 1)
+
+
+def get_owned_image(req, image_guid):
+    """Return the private image of the account with the given ID, if any.
+    Only these may have their image data written by the tenant.
+    """
+    if not image_core.VALID_IMAGE_ID.match(image_guid or ''):
+        raise ResponseException("Invalid image ID '%s'" % image_guid,
+                                error_type='badRequest', code=400)
+    image_obj = SLImages(req.env['sl_client'])
+    return image_obj.get_private_images(guid=image_guid, limit=1)
+
+
 class ImagesV1(ImagesV2):
     def on_post(self, req, resp, tenant_id=None):
         headers = req.headers
 
-        try:
-            body = json.loads(req.stream.read().decode())
-        except ValueError:
-            body = {}
+        body = {}
+        if req.content_type == 'application/octet-stream':
+            # Image data is streamed straight into the image store, for an
+            # image which has to exist already as there is no way to make
+            # one from it
+            image_guid = req.get_header('x-image-meta-id')
+            if not image_guid:
+                return bad_request(
+                    resp, 'x-image-meta-id is required to upload image data')
+            if not get_owned_image(req, image_guid):
+                return not_found(resp, 'Image could not be found')
+            image_core.store_driver().write(image_guid, req.stream,
+                                            length=req.content_length)
+            body['id'] = image_guid
+        else:
+            try:
+                body = json.loads(req.stream.read().decode())
+            except ValueError:
+                pass
 
         image_details = {
             'location': headers.get('x-image-meta-location'),
@@ -0,0 +1,591 @@
+"""Pre-forking, multi-threaded HTTP server for running jumpgate in
+production without a separate WSGI server.
+
+The master process builds the WSGI application once, binds the listening
+socket and forks the workers, which share the socket and the application
+pages copy-on-write. Each worker serves connections from a fixed pool of
+threads and supports HTTP/1.1 keep-alive.
+
+Signals understood by the master:
+
+* HUP: graceful restart. The configuration is reloaded, a new set of
+  workers is started and the old ones finish their requests and exit.
+* TERM, INT: graceful shutdown.
+* TTIN, TTOU: add or remove a worker.
+"""
+import errno
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from wsgiref import simple_server
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves import queue
+from six.moves import socketserver
+from six.moves.urllib.parse import unquote
+
+try:
+    from select import error as select_error
+except ImportError:
+    select_error = OSError
+
+LOG = logging.getLogger(__name__)
+
+MAX_REQUEST_LINE = 65536
+# Unread request body a worker is willing to discard to keep a connection
+MAX_DRAIN = 64 * 1024
+
+
+class ClientError(IOError):
+    """Reading the request from or writing the response to the client
+    failed.
+    """
+
+
+def client_io(func, *args):
+    try:
+        return func(*args)
+    except (socket.error, IOError) as e:
+        raise ClientError(str(e))
+
+
+class ChunkedReader(object):
+    """wsgi.input for a request with a chunked body."""
+
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.remaining = 0
+        self.done = False
+
+    def _next_chunk(self):
+        line = client_io(self.rfile.readline, MAX_REQUEST_LINE)
+        try:
+            self.remaining = int(line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise ClientError('Malformed chunked request body')
+        if not self.remaining:
+            # Skip trailers
+            while client_io(self.rfile.readline,
+                            MAX_REQUEST_LINE) not in (b'\r\n', b''):
+                pass
+            self.done = True
+
+    def read(self, size=-1):
+        parts = []
+        while not self.done and (size is None or size < 0 or size > 0):
+            if not self.remaining:
+                self._next_chunk()
+                continue
+            wanted = self.remaining
+            if size is not None and size >= 0:
+                wanted = min(wanted, size)
+            data = client_io(self.rfile.read, wanted)
+            if not data:
+                raise ClientError('Client closed the connection')
+            parts.append(data)
+            self.remaining -= len(data)
+            if size is not None and size >= 0:
+                size -= len(data)
+            if not self.remaining:
+                client_io(self.rfile.readline, MAX_REQUEST_LINE)
+        return b''.join(parts)
+
+
+class LengthReader(object):
+    """wsgi.input which never reads past the end of the request body."""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    @property
+    def done(self):
+        return not self.remaining
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = client_io(self.rfile.read, size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = client_io(self.rfile.readline, size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+
+class SimpleRequestHandler(simple_server.WSGIRequestHandler):
+    """Handler for the wsgiref server telling the application when the
+    request arrived, like WSGIRequestHandler does.
+    """
+
+    def setup(self):
+        self.request_start = time.time()
+        simple_server.WSGIRequestHandler.setup(self)
+
+    def get_environ(self):
+        environ = simple_server.WSGIRequestHandler.get_environ(self)
+        environ['jumpgate.request_start'] = self.request_start
+        return environ
+
+
+class WSGIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'jumpgate'
+    # Buffer responses; they are flushed once complete
+    wbufsize = -1
+
+    def __init__(self, request, client_address, server, accepted_at=None):
+        # When the request being read arrived; the first request of a
+        # connection arrived when the connection was accepted
+        self.request_start = accepted_at
+        BaseHTTPServer.BaseHTTPRequestHandler.__init__(
+            self, request, client_address, server)
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.connection.settimeout(self.server.keep_alive_timeout)
+
+    def handle_one_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(MAX_REQUEST_LINE + 1)
+        except socket.timeout:
+            # Idle keep-alive connection
+            self.close_connection = 1
+            return
+        if len(self.raw_requestline) > MAX_REQUEST_LINE:
+            self.send_error(414)
+            self.close_connection = 1
+            return
+        if not self.raw_requestline:
+            self.close_connection = 1
+            return
+        if self.request_start is None:
+            self.request_start = time.time()
+        if not self.parse_request():
+            return
+        if self.server.stopping:
+            self.close_connection = 1
+        self.run_wsgi()
+        self.wfile.flush()
+        self.request_start = None
+
+    def log_message(self, format, *args):
+        LOG.debug('%s - %s', self.client_address[0], format % args)
+
+    def get_environ(self):
+        path, _, query = self.path.partition('?')
+        environ = dict(self.server.base_environ)
+        environ.update({
+            'SERVER_PROTOCOL': self.request_version,
+            'REQUEST_METHOD': self.command,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(path),
+            'QUERY_STRING': query,
+            'REMOTE_ADDR': self.client_address[0],
+            'wsgi.errors': sys.stderr,
+            'jumpgate.request_start': self.request_start,
+        })
+        for name, value in self.headers.items():
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            if key in environ and key.startswith('HTTP_'):
+                value = environ[key] + ',' + value
+            environ[key] = value.strip()
+
+        if 'chunked' in environ.get('HTTP_TRANSFER_ENCODING', ''):
+            environ.pop('CONTENT_LENGTH', None)
+            environ['wsgi.input'] = ChunkedReader(self.rfile)
+        else:
+            environ['wsgi.input'] = LengthReader(
+                self.rfile, int(environ.get('CONTENT_LENGTH') or 0))
+        return environ
+
+    def run_wsgi(self):
+        try:
+            environ = self.get_environ()
+        except ValueError:
+            self.send_error(400)
+            self.close_connection = 1
+            return
+
+        head_only = self.command == 'HEAD'
+        state = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and 'sent' in state:
+                six.reraise(*exc_info)
+            state['status'] = status
+            state['headers'] = headers
+            return write
+
+        def write(data):
+            if 'sent' not in state:
+                client_io(self.send_head, state)
+            if data and not head_only:
+                if state.get('chunked'):
+                    data = b''.join([('%x\r\n' % len(data)).encode('latin-1'),
+                                     data, b'\r\n'])
+                client_io(self.wfile.write, data)
+
+        try:
+            result = self.server.app(environ, start_response)
+            try:
+                for data in result:
+                    write(data)
+                write(b'')
+                if state.get('chunked') and not head_only:
+                    client_io(self.wfile.write, b'0\r\n\r\n')
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except ClientError as e:
+            LOG.debug('Connection error: %s', e)
+            self.close_connection = 1
+            return
+        except Exception:
+            LOG.exception('Error handling %s %s', self.command, self.path)
+            self.close_connection = 1
+            if 'sent' not in state:
+                self.send_error(500)
+            return
+
+        if not environ['wsgi.input'].done:
+            # Skip whatever the application didn't read so the next request
+            # starts at the right place, unless there's too much of it
+            try:
+                skipped = environ['wsgi.input'].read(MAX_DRAIN)
+            except ClientError:
+                self.close_connection = 1
+                return
+            if len(skipped) == MAX_DRAIN and not environ['wsgi.input'].done:
+                self.close_connection = 1
+
+    def send_head(self, state):
+        code, _, message = state['status'].partition(' ')
+        self.send_response(int(code), message)
+        names = set()
+        for name, value in state['headers']:
+            names.add(name.lower())
+            self.send_header(name, value)
+        if 'content-length' not in names:
+            if self.request_version == 'HTTP/1.1':
+                state['chunked'] = True
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.close_connection = 1
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        state['sent'] = True
+
+
+class ThreadPoolWSGIServer(socketserver.TCPServer):
+    """Serves each accepted connection on one of a fixed number of threads.
+    Accepting pauses while every thread is busy and the small backlog of
+    waiting connections is full.
+    """
+
+    def __init__(self, sock, app, threads=16, keep_alive_timeout=5):
+        socketserver.TCPServer.__init__(self, sock.getsockname()[:2],
+                                        WSGIRequestHandler,
+                                        bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.app = app
+        self.keep_alive_timeout = keep_alive_timeout
+        self.stopping = False
+        self.connections = queue.Queue(threads)
+        self.threads = []
+        host, port = sock.getsockname()[:2]
+        self.base_environ = {
+            'SERVER_NAME': host,
+            'SERVER_PORT': str(port),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for i in range(threads):
+            thread = threading.Thread(target=self._work,
+                                      name='worker-%s' % i)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def process_request(self, request, client_address):
+        self.connections.put((request, client_address, time.time()))
+
+    def finish_request(self, request, client_address, accepted_at=None):
+        self.RequestHandlerClass(request, client_address, self, accepted_at)
+
+    def _work(self):
+        while True:
+            item = self.connections.get()
+            if item is None:
+                return
+            request, client_address, accepted_at = item
+            try:
+                self.finish_request(request, client_address, accepted_at)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        LOG.exception('Error serving %s', client_address[0])
+
+    def serve(self, poll_interval=0.5):
+        """Serve until stop() is called, which may happen in a signal
+        handler of the thread running this.
+        """
+        self.timeout = poll_interval
+        while not self.stopping:
+            try:
+                self.handle_request()
+            except (OSError, select_error) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+    def stop(self):
+        self.stopping = True
+
+    def drain(self, timeout):
+        """Let the threads finish the connections they have, for up to
+        timeout seconds.
+        """
+        deadline = time.time() + timeout
+        for _ in self.threads:
+            # The queue is full while every thread is busy; threads still
+            # busy at the deadline are left to die with the process
+            try:
+                self.connections.put(None,
+                                     timeout=max(0, deadline - time.time()))
+            except queue.Full:
+                break
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.time()))
+
+
+def make_socket(host, port, backlog=2048, reuse_port=True):
+    """Bind the listening socket shared by every worker. SO_REUSEPORT also
+    lets a replacement master bind the same address during an upgrade.
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class Arbiter(object):
+    """Master process keeping `workers` forked workers running.
+
+    :param app_factory: Callable returning the WSGI application. It is
+                        called in the master before forking and again on
+                        every graceful restart.
+    """
+
+    def __init__(self, app_factory, sock, workers=2, threads=16,
+                 keep_alive_timeout=5, graceful_timeout=30):
+        self.app_factory = app_factory
+        self.sock = sock
+        self.num_workers = workers
+        self.threads = threads
+        self.keep_alive_timeout = keep_alive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.app = None
+        # Maps worker pids to the generation they were started in, or None
+        # once they have been asked to stop
+        self.workers = {}
+        self.signals = []
+        self.generation = 0
+
+    def load_app(self):
+        # Workers start the invalidation bus once forked
+        from jumpgate.common import invalidation
+        invalidation.defer()
+        # A graceful restart makes the application again; let the collector
+        # see the one it replaces, frozen when it was made
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+        self.app = None
+        self.app = self.app_factory()
+        # Move everything built so far out of the collector's view so
+        # collections in the workers don't touch, and copy, those pages
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    def run(self):
+        self.load_app()
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT,
+                    signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, self._queue_signal)
+
+        LOG.info('Listening on %s:%s with %s workers',
+                 self.sock.getsockname()[0], self.sock.getsockname()[1],
+                 self.num_workers)
+        self.spawn_workers()
+        try:
+            while True:
+                if not self.signals:
+                    time.sleep(1)
+                    self.reap_workers()
+                    self.spawn_workers()
+                    continue
+                sig = self.signals.pop(0)
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    break
+                self.handle_signal(sig)
+        finally:
+            self.stop()
+
+    def _queue_signal(self, sig, frame):
+        if len(self.signals) < 10:
+            self.signals.append(sig)
+
+    def handle_signal(self, sig):
+        if sig == signal.SIGHUP:
+            self.reload()
+        elif sig == signal.SIGTTIN:
+            self.num_workers += 1
+        elif sig == signal.SIGTTOU and self.num_workers > 1:
+            self.num_workers -= 1
+            self.retire_workers(self.oldest_workers(1))
+        self.reap_workers()
+        self.spawn_workers()
+
+    def reload(self):
+        LOG.info('Reloading')
+        old = list(self.workers)
+        try:
+            self.load_app()
+        except Exception:
+            LOG.exception('Unable to reload; keeping the current workers')
+            return
+        self.generation += 1
+        self.spawn_workers()
+        self.retire_workers(old)
+
+    def current_workers(self):
+        return [pid for pid, generation in self.workers.items()
+                if generation == self.generation]
+
+    def oldest_workers(self, count):
+        return sorted(self.current_workers())[:count]
+
+    def spawn_workers(self):
+        while len(self.current_workers()) < self.num_workers:
+            self.spawn_worker()
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = self.generation
+            return pid
+
+        # In the worker
+        status = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU,
+                        signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            Worker(self.app, self.sock, self.threads,
+                   self.keep_alive_timeout, self.graceful_timeout).run()
+        except Exception:
+            LOG.exception('Worker failed')
+            status = 1
+        finally:
+            # os._exit skips the atexit flush of buffered log handlers
+            logging.shutdown()
+            os._exit(status)
+
+    def retire_workers(self, pids):
+        for pid in pids:
+            if pid in self.workers:
+                self.workers[pid] = None
+            self.kill_worker(pid, signal.SIGTERM)
+
+    def kill_worker(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                self.workers.pop(pid, None)
+            else:
+                raise
+
+    def reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            if self.workers.pop(pid, None) == self.generation:
+                LOG.warning('Worker %s exited with status %s', pid, status)
+
+    def stop(self):
+        LOG.info('Shutting down')
+        self.retire_workers(list(self.workers))
+        deadline = time.time() + self.graceful_timeout
+        while self.workers and time.time() < deadline:
+            self.reap_workers()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self.kill_worker(pid, signal.SIGKILL)
+        self.reap_workers()
+        self.sock.close()
+
+
+class Worker(object):
+    def __init__(self, app, sock, threads, keep_alive_timeout,
+                 graceful_timeout):
+        self.server = ThreadPoolWSGIServer(
+            sock, app, threads=threads,
+            keep_alive_timeout=keep_alive_timeout)
+        self.graceful_timeout = graceful_timeout
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.post_fork()
+        self.server.serve()
+        self.server.drain(self.graceful_timeout)
+
+    def post_fork(self):
+        # Background threads don't survive a fork; start the ones this
+        # worker needs
+        from jumpgate.common import invalidation
+        invalidation.get_bus()
+
+    def _stop(self, sig, frame):
+        self.server.stop()
+
+
+def serve(app_factory, host='127.0.0.1', port=5000, workers=2, threads=16,
+          keep_alive_timeout=5, graceful_timeout=30, backlog=2048):
+    sock = make_socket(host, port, backlog=backlog)
+    Arbiter(app_factory, sock, workers=workers, threads=threads,
+            keep_alive_timeout=keep_alive_timeout,
+            graceful_timeout=graceful_timeout).run()
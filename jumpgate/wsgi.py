@@ -1,15 +1,34 @@
 import os.path
 import os
 import logging
+import sys
 from oslo.config import cfg
 
 from jumpgate.api import Jumpgate
+from jumpgate.common.logbuffer import BufferedHandler, JsonFormatter
+from jumpgate.common import utils
 from jumpgate.config import CONF
 
 PROJECT = 'jumpgate'
 
+_log_handler = None
+
+
+def make_log_handler():
+    if CONF['buffered_logging']:
+        handler = BufferedHandler(sys.stderr,
+                                  queue_size=CONF['log_queue_size'],
+                                  batch_size=CONF['log_batch_size'],
+                                  flush_interval=CONF['log_flush_interval'])
+    else:
+        handler = logging.StreamHandler()
+    if CONF['log_format'] == 'json':
+        handler.setFormatter(JsonFormatter())
+    return handler
+
 
 def make_api(config=None):
+    global _log_handler
     # Find configuration files
     config_files = cfg.find_config_files(PROJECT)
 
@@ -28,10 +47,17 @@ def make_api(config=None):
     CONF(project=PROJECT,
          args=[],  # We don't want CLI arguments to pass through here
          default_config_files=config_files)
+    # make_api runs again on every graceful restart of 'jumpgate serve', so
+    # drop whatever was made from the configuration read before
+    utils.reset_state()
 
     logger = logging.getLogger(PROJECT)
     logger.setLevel(getattr(logging, CONF['log_level'].upper()))
-    logger.addHandler(logging.StreamHandler())
+    if _log_handler is not None:
+        logger.removeHandler(_log_handler)
+        _log_handler.close()
+    _log_handler = make_log_handler()
+    logger.addHandler(_log_handler)
     app = Jumpgate()
     app.load_endpoints()
     app.load_drivers()
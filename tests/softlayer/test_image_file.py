@@ -0,0 +1,184 @@
+import shutil
+import tempfile
+import unittest
+
+from mock import MagicMock, patch
+import six
+
+from jumpgate.common.exceptions import ResponseException
+from jumpgate.image.drivers.core import (FileImageStoreDriver,
+                                         VALID_IMAGE_ID)
+from jumpgate.image.drivers.sl.images import (ImageFileV2, ImagesV1, ImageV1,
+                                              parse_range)
+
+
+class TestParseRange(unittest.TestCase):
+    def test_parse_range(self):
+        self.assertEquals(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEquals(parse_range('bytes=500-', 1000), (500, 999))
+        self.assertEquals(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEquals(parse_range('bytes=900-5000', 1000), (900, 999))
+        self.assertEquals(parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_unsatisfiable(self):
+        self.assertIsNone(parse_range('bytes=1000-', 1000))
+        self.assertIsNone(parse_range('bytes=-0', 1000))
+
+    def test_malformed(self):
+        for value in ['0-99', 'bytes=', 'bytes=-', 'bytes=a-b',
+                      'bytes=10-5', 'bytes=0-1,5-6', 'items=0-1']:
+            self.assertRaises(ValueError, parse_range, value, 1000)
+
+
+class TestFileImageStoreDriver(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = FileImageStoreDriver(path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_write_and_read(self):
+        written = self.store.write('abc-123', six.BytesIO(six.b('x' * 100)),
+                                   chunk_size=7)
+
+        self.assertEquals(written, 100)
+        self.assertEquals(self.store.size('abc-123'), 100)
+        with self.store.open('abc-123', offset=90) as f:
+            self.assertEquals(f.read(), six.b('x' * 10))
+
+    def test_missing(self):
+        self.assertIsNone(self.store.size('missing'))
+        self.store.delete('missing')
+
+    def test_invalid_id(self):
+        self.assertRaises(ValueError, self.store.open, '../etc/passwd')
+
+
+class StoredImageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = FileImageStoreDriver(path=self.path)
+        self.store.write('GUID', six.BytesIO(six.b('0123456789')))
+
+        patcher = patch('jumpgate.image.drivers.sl.images.image_core')
+        image_core = patcher.start()
+        image_core.store_driver.return_value = self.store
+        image_core.VALID_IMAGE_ID = VALID_IMAGE_ID
+        self.addCleanup(patcher.stop)
+
+        patcher = patch('jumpgate.image.drivers.sl.images.SLImages')
+        self.sl_images = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+
+class TestImageFileV2(StoredImageTestCase):
+    def setUp(self):
+        super(TestImageFileV2, self).setUp()
+        self.handler = ImageFileV2(MagicMock())
+
+    def _get(self, range_header=None):
+        req, resp = MagicMock(), MagicMock()
+        req.get_header.return_value = range_header
+        resp.status = 200
+        self.handler.on_get(req, resp, 'GUID')
+        return resp
+
+    def test_get(self):
+        resp = self._get()
+
+        self.assertEquals(resp.status, 200)
+        self.assertEquals(resp.stream_len, 10)
+        self.assertEquals(six.b('').join(resp.stream), six.b('0123456789'))
+
+    def test_get_range(self):
+        resp = self._get('bytes=2-5')
+
+        self.assertEquals(resp.status, 206)
+        self.assertEquals(resp.content_range, (2, 5, 10))
+        self.assertEquals(resp.stream_len, 4)
+        self.assertEquals(six.b('').join(resp.stream), six.b('2345'))
+
+    def test_get_unsatisfiable_range(self):
+        resp = self._get('bytes=20-')
+
+        self.assertEquals(resp.status, 416)
+        resp.set_header.assert_called_with('Content-Range', 'bytes */10')
+
+    def test_get_unknown_image(self):
+        self.sl_images.return_value.get_image.return_value = None
+        resp = self._get()
+
+        self.assertEquals(resp.status, 404)
+
+    def test_put(self):
+        req, resp = MagicMock(), MagicMock()
+        req.stream = six.BytesIO(six.b('new data'))
+        req.content_length = 8
+        self.handler.on_put(req, resp, 'GUID')
+
+        self.assertEquals(resp.status, 204)
+        self.assertEquals(self.store.size('GUID'), 8)
+
+    def test_put_not_owned(self):
+        # Public images and those of other accounts can't be written
+        self.sl_images.return_value.get_private_images.return_value = []
+        req, resp = MagicMock(), MagicMock()
+        req.stream = six.BytesIO(six.b('new data'))
+        self.handler.on_put(req, resp, 'GUID')
+
+        self.assertEquals(resp.status, 404)
+        self.assertEquals(self.store.size('GUID'), 10)
+
+    def test_put_invalid_id(self):
+        self.assertRaises(ResponseException, self.handler.on_put,
+                          MagicMock(), MagicMock(), '../GUID')
+
+
+class TestImagesV1(StoredImageTestCase):
+    def setUp(self):
+        super(TestImagesV1, self).setUp()
+        self.handler = ImagesV1(MagicMock())
+
+    def _post(self, image_guid):
+        req, resp = MagicMock(), MagicMock()
+        req.content_type = 'application/octet-stream'
+        req.get_header.return_value = image_guid
+        req.stream = six.BytesIO(six.b('new data'))
+        req.content_length = 8
+        req.headers = {'x-image-meta-name': 'image',
+                       'x-image-meta-is-public': ''}
+        self.handler.on_post(req, resp)
+        return resp
+
+    def test_post_data(self):
+        resp = self._post('GUID')
+
+        self.assertEquals(resp.body['image']['id'], 'GUID')
+        self.assertEquals(self.store.size('GUID'), 8)
+
+    def test_post_data_without_id(self):
+        resp = self._post(None)
+
+        self.assertEquals(resp.status, 400)
+
+    def test_post_data_invalid_id(self):
+        self.assertRaises(ResponseException, self._post, 'a/b')
+
+    def test_post_data_not_owned(self):
+        self.sl_images.return_value.get_private_images.return_value = []
+        resp = self._post('GUID')
+
+        self.assertEquals(resp.status, 404)
+        self.assertEquals(self.store.size('GUID'), 10)
+
+    def test_delete(self):
+        self.sl_images.return_value.get_image.return_value = {'id': 1}
+        req, resp = MagicMock(), MagicMock()
+        ImageV1(MagicMock()).on_delete(req, resp, 'GUID')
+
+        self.assertEquals(resp.status, 204)
+        self.assertIsNone(self.store.size('GUID'))
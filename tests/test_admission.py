@@ -0,0 +1,268 @@
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+from six.moves import queue
+
+from jumpgate.common.admission import (BULK, CRITICAL,
+                                       MAX_REQUEST_START_AGE, NORMAL,
+                                       PriorityAdmission, PrioritizedResource,
+                                       QueueDelayController, request_start)
+from jumpgate.common.exceptions import DeadlineExceeded, ServiceUnavailable
+
+
+def make_admission(capacity=4):
+    return PriorityAdmission(
+        capacity, reserved={CRITICAL: 2, NORMAL: 1},
+        queue_lengths={CRITICAL: 10, NORMAL: 10, BULK: 10})
+
+
+class TestPriorityAdmission(unittest.TestCase):
+    def queue_requests(self, admission, priorities):
+        """Queue a request of each priority in order and return the order
+        they're admitted in.
+        """
+        order = []
+        lock = threading.Lock()
+        threads = []
+        for priority in priorities:
+            def request(priority=priority):
+                admission.acquire(priority)
+                with lock:
+                    order.append(priority)
+                admission.release(priority)
+            thread = threading.Thread(target=request)
+            thread.start()
+            threads.append(thread)
+            while sum(admission.queued().values()) < len(threads):
+                time.sleep(0.001)
+        return order, threads
+
+    def test_limits(self):
+        admission = make_admission()
+
+        self.assertEquals(admission.limit(CRITICAL), 4)
+        self.assertEquals(admission.limit(NORMAL), 2)
+        self.assertEquals(admission.limit(BULK), 1)
+
+    def test_reserved_capacity(self):
+        admission = make_admission()
+        admission.acquire(BULK)
+        self.assertRaises(DeadlineExceeded, admission.acquire, BULK,
+                          time.time() + 0.01)
+
+        admission.acquire(NORMAL)
+        self.assertRaises(DeadlineExceeded, admission.acquire, NORMAL,
+                          time.time() + 0.01)
+
+        self.assertEquals(admission.acquire(CRITICAL), 0.0)
+        self.assertEquals(admission.acquire(CRITICAL), 0.0)
+        self.assertEquals(admission.running(), 4)
+        self.assertEquals(admission.queued(),
+                          {CRITICAL: 0, NORMAL: 0, BULK: 0})
+
+    def test_highest_priority_first(self):
+        admission = make_admission(capacity=1)
+        admission.reserved = {}
+        admission.acquire(BULK)
+
+        order, threads = self.queue_requests(
+            admission, [BULK, NORMAL, CRITICAL, BULK])
+        admission.release(BULK)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEquals(order, [CRITICAL, NORMAL, BULK, BULK])
+        self.assertEquals(admission.running(), 0)
+
+    def test_queue_full(self):
+        admission = make_admission(capacity=1)
+        admission.queue_lengths = {}
+        admission.acquire(CRITICAL)
+
+        self.assertRaises(ServiceUnavailable, admission.acquire, BULK)
+
+    def test_deadline_removes_waiter(self):
+        admission = make_admission(capacity=1)
+        admission.acquire(CRITICAL)
+
+        self.assertRaises(DeadlineExceeded, admission.acquire, NORMAL,
+                          time.time() + 0.01)
+        self.assertEquals(admission.queued()[NORMAL], 0)
+
+
+class TestThreadReservation(unittest.TestCase):
+    def setUp(self):
+        self.admission = PriorityAdmission(
+            2, reserved={CRITICAL: 1},
+            queue_lengths={CRITICAL: 10, NORMAL: 10, BULK: 10}, threads=4)
+
+    def test_thread_limits(self):
+        self.assertEquals(self.admission.thread_limit(CRITICAL), 4)
+        self.assertEquals(self.admission.thread_limit(BULK), 3)
+        self.assertIsNone(make_admission().thread_limit(BULK))
+
+    def test_low_priority_saturates_pool(self):
+        # Like the server: a fixed pool of threads takes requests in order
+        # and holds one for as long as the request waits or runs
+        requests = queue.Queue()
+        outcomes = queue.Queue()
+        bulk_done = threading.Event()
+
+        def handle(priority):
+            try:
+                self.admission.acquire(priority)
+            except ServiceUnavailable:
+                return 'shed'
+            try:
+                if priority == BULK:
+                    bulk_done.wait(5)
+                return 'ok'
+            finally:
+                self.admission.release(priority)
+
+        def serve():
+            while True:
+                priority = requests.get()
+                if priority is None:
+                    return
+                outcomes.put((priority, handle(priority)))
+
+        pool = [threading.Thread(target=serve) for _ in range(4)]
+        for thread in pool:
+            thread.start()
+        try:
+            for _ in range(10):
+                requests.put(BULK)
+            shed = [outcomes.get(timeout=5) for _ in range(7)]
+            self.assertEquals(shed, [(BULK, 'shed')] * 7)
+            self.assertEquals(self.admission.holding(BULK), 3)
+
+            requests.put(CRITICAL)
+            self.assertEquals(outcomes.get(timeout=5), (CRITICAL, 'ok'))
+        finally:
+            bulk_done.set()
+            for thread in pool:
+                requests.put(None)
+            for thread in pool:
+                thread.join(5)
+
+        self.assertEquals(self.admission.running(), 0)
+        self.assertEquals(self.admission.holding(CRITICAL), 0)
+
+
+class TestPrioritizedResource(unittest.TestCase):
+    def test_responder(self):
+        admission = MagicMock()
+        resource = MagicMock()
+        req = MagicMock(env={'request_deadline': 123})
+        resp = MagicMock()
+
+        wrapped = PrioritizedResource(resource, BULK, admission)
+        wrapped.on_get(req, resp, tenant_id='1')
+
+        admission.acquire.assert_called_once_with(BULK, 123)
+        resource.on_get.assert_called_once_with(req, resp, tenant_id='1')
+        admission.release.assert_called_once_with(BULK)
+
+    def test_release_on_error(self):
+        admission = MagicMock()
+        resource = MagicMock()
+        resource.on_post.side_effect = ValueError()
+
+        wrapped = PrioritizedResource(resource, NORMAL, admission)
+
+        self.assertRaises(ValueError, wrapped.on_post, MagicMock(env={}),
+                          MagicMock())
+        admission.release.assert_called_once_with(NORMAL)
+
+    def test_missing_responder(self):
+        class Resource(object):
+            app = 'app'
+
+        wrapped = PrioritizedResource(Resource(), NORMAL, MagicMock())
+
+        self.assertRaises(AttributeError, getattr, wrapped, 'on_delete')
+        self.assertEquals(wrapped.app, 'app')
+
+
+class TestQueueDelayController(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.controller = QueueDelayController(0.1, 1.0,
+                                               clock=lambda: self.now)
+
+    def test_admit(self):
+        self.controller.admit(0.5)
+        self.assertEquals(self.controller.in_flight, 1)
+
+        self.controller.finish()
+        self.assertEquals(self.controller.in_flight, 0)
+
+    def test_sheds_past_interval(self):
+        try:
+            self.controller.admit(1.5)
+            self.fail('ServiceUnavailable not raised')
+        except ServiceUnavailable as e:
+            self.assertEquals(e.retry_after, 1)
+        self.assertEquals(self.controller.in_flight, 0)
+
+    def test_standing_queue(self):
+        self.controller.admit(0.5)
+        self.controller.admit(0.2)
+
+        # The lowest delay of the last interval was above the target
+        self.now += 1.0
+        self.assertRaises(ServiceUnavailable, self.controller.admit, 0.2)
+        self.controller.admit(0.05)
+
+        # Which drained the queue
+        self.now += 1.0
+        self.controller.admit(0.5)
+        self.assertFalse(self.controller.overloaded)
+
+
+TRUSTED = {'admission': {'trust_request_start': True}}
+
+
+class TestRequestStart(unittest.TestCase):
+    def make_req(self, header=None, env=None):
+        req = MagicMock()
+        req.headers = {}
+        if header:
+            req.headers['X-REQUEST-START'] = header
+        req.env = env or {}
+        return req
+
+    @patch('jumpgate.common.admission.CONF', TRUSTED)
+    @patch('time.time', return_value=1400000001.0)
+    def test_header(self, _):
+        self.assertEquals(request_start(self.make_req('t=1400000000.5')),
+                          1400000000.5)
+        self.assertEquals(request_start(self.make_req('1400000000500')),
+                          1400000000.5)
+        self.assertEquals(request_start(self.make_req('t=1400000000500000')),
+                          1400000000.5)
+
+    @patch('jumpgate.common.admission.CONF', TRUSTED)
+    @patch('time.time', return_value=1400000001.0)
+    def test_header_clamped(self, _):
+        self.assertEquals(request_start(self.make_req('t=1400000100.0')),
+                          1400000001.0)
+        self.assertEquals(request_start(self.make_req('t=1000000000.0')),
+                          1400000001.0 - MAX_REQUEST_START_AGE)
+
+    @patch('time.time', return_value=1400000001.0)
+    def test_header_untrusted(self, _):
+        req = self.make_req('t=1400000000.5',
+                            env={'jumpgate.request_start': 1400000000.75})
+        self.assertEquals(request_start(req), 1400000000.75)
+        self.assertEquals(request_start(self.make_req('t=1400000000.5')),
+                          1400000001.0)
+
+    @patch('jumpgate.common.admission.CONF', TRUSTED)
+    def test_server(self):
+        req = self.make_req(
+            'garbage', env={'jumpgate.request_start': 1400000000.0})
+        self.assertEquals(request_start(req), 1400000000.0)
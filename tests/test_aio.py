@@ -0,0 +1,243 @@
+import socket
+import threading
+import unittest
+
+try:
+    import asyncio
+    from jumpgate import aio
+except ImportError:
+    asyncio = None
+
+
+def echo_app(environ, start_response):
+    path = environ['PATH_INFO']
+    if path == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'one', b'two']
+    if path == '/error':
+        raise ValueError('boom')
+
+    body = environ['wsgi.input'].read()
+    response = b''.join([environ['REQUEST_METHOD'].encode('ascii'), b' ',
+                         path.encode('ascii'), b' ', body])
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(response)))])
+    return [response]
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncServer(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = aio.AsyncServer(echo_app, port=0, workers=2,
+                                      loop=self.loop)
+        self.port = self.server.start()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.sockets = []
+        self.pending = {}
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.server.close()
+        self.loop.close()
+
+    def connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.sockets.append(sock)
+        return sock
+
+    def read_response(self, sock):
+        # Pipelined responses may arrive together; keep what follows this one
+        data = self.pending.pop(sock, b'')
+        while b'\r\n\r\n' not in data:
+            received = sock.recv(4096)
+            if not received:
+                raise AssertionError('Connection closed after %r' % data)
+            data += received
+        head, body = data.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        headers = dict((k.lower(), v.strip()) for k, _, v in
+                       (line.partition(':') for line in lines[1:]))
+
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            while len(body) < length:
+                body += sock.recv(4096)
+            body, self.pending[sock] = body[:length], body[length:]
+        elif headers.get('transfer-encoding') == 'chunked':
+            while not body.endswith(b'0\r\n\r\n'):
+                body += sock.recv(4096)
+        else:
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                body += data
+        return lines[0], headers, body
+
+    def test_request(self):
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nHost: x\r\n'
+                     b'Content-Length: 5\r\n\r\nhello')
+
+        status, headers, body = self.read_response(sock)
+
+        self.assertEqual(status, 'HTTP/1.1 200 OK')
+        self.assertEqual(headers['connection'], 'keep-alive')
+        self.assertEqual(body, b'POST /echo hello')
+
+    def test_keep_alive_and_pipelining(self):
+        sock = self.connect()
+        sock.sendall(b'GET /a HTTP/1.1\r\nHost: x\r\n\r\n'
+                     b'GET /b HTTP/1.1\r\nHost: x\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[2], b'GET /a ')
+        self.assertEqual(self.read_response(sock)[2], b'GET /b ')
+
+        sock.sendall(b'GET /c HTTP/1.1\r\nConnection: close\r\n\r\n')
+        status, headers, body = self.read_response(sock)
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(sock.recv(10), b'')
+
+    def test_chunked_request(self):
+        sock = self.connect()
+        sock.sendall(b'PUT /file HTTP/1.1\r\nTransfer-Encoding: chunked\r\n'
+                     b'\r\n5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[2],
+                         b'PUT /file hello world')
+
+    def test_large_body(self):
+        body = b'x' * (aio.BODY_HIGH_WATER * 4)
+        sock = self.connect()
+        sock.sendall(b'PUT /file HTTP/1.1\r\nContent-Length: ' +
+                     str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+
+        self.assertEqual(self.read_response(sock)[2], b'PUT /file ' + body)
+
+    def test_chunked_response(self):
+        sock = self.connect()
+        sock.sendall(b'GET /stream HTTP/1.1\r\n\r\n')
+
+        status, headers, body = self.read_response(sock)
+
+        self.assertEqual(headers['transfer-encoding'], 'chunked')
+        self.assertEqual(body, b'3\r\none\r\n3\r\ntwo\r\n0\r\n\r\n')
+
+    def test_http10_streaming(self):
+        sock = self.connect()
+        sock.sendall(b'GET /stream HTTP/1.0\r\n\r\n')
+
+        status, headers, body = self.read_response(sock)
+
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(body, b'onetwo')
+
+    def test_application_error(self):
+        sock = self.connect()
+        sock.sendall(b'GET /error HTTP/1.1\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[0],
+                         'HTTP/1.1 500 Internal Server Error')
+
+    def test_bad_request(self):
+        sock = self.connect()
+        sock.sendall(b'nonsense\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[0],
+                         'HTTP/1.1 400 Bad Request')
+
+    def test_encoded_path(self):
+        sock = self.connect()
+        sock.sendall(b'GET /keypairs/my%20key%2Fx HTTP/1.1\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[2],
+                         b'GET /keypairs/my key/x ')
+
+    def test_ambiguous_body_framing(self):
+        requests = [
+            b'Content-Length: 5\r\nContent-Length: 5\r\n',
+            b'Content-Length: 5\r\nContent-Length: 6\r\n',
+            b'Content-Length: +5\r\n',
+            b'Transfer-Encoding: chunked\r\nContent-Length: 5\r\n',
+            b'Transfer-Encoding: chunked, identity\r\n',
+            b'Transfer-Encoding: xchunked\r\n',
+        ]
+        for headers in requests:
+            sock = self.connect()
+            sock.sendall(b'POST /echo HTTP/1.1\r\n' + headers +
+                         b'\r\nhello')
+
+            self.assertEqual(self.read_response(sock)[0],
+                             'HTTP/1.1 400 Bad Request', headers)
+
+    def test_header_timeout(self):
+        self.server.header_timeout = 0.2
+        sock = self.connect()
+        sock.sendall(b'GET / HTTP/1.1\r\n')
+        for header in [b'Host', b': ', b'x']:
+            sock.sendall(header)
+
+        self.assertEqual(self.read_response(sock)[0],
+                         'HTTP/1.1 408 Request Timeout')
+        self.assertEqual(sock.recv(10), b'')
+
+    def test_body_timeout(self):
+        self.server.body_timeout = 0.2
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc')
+
+        self.assertEqual(sock.recv(10), b'')
+        # The handler thread is free again
+        sock = self.connect()
+        sock.sendall(b'GET /next HTTP/1.1\r\n\r\n')
+        self.assertEqual(self.read_response(sock)[2], b'GET /next ')
+
+    def test_malformed_chunk(self):
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked'
+                     b'\r\n\r\nzz\r\n')
+        self.assertEqual(self.read_response(sock)[0],
+                         'HTTP/1.1 400 Bad Request')
+
+        # Once the handler runs, only the connection is dropped
+        sock = self.connect()
+        sock.sendall(b'POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked'
+                     b'\r\n\r\n5\r\nhello\r\n')
+        threading.Event().wait(0.1)
+        sock.sendall(b'zz\r\n')
+        self.assertEqual(sock.recv(10), b'')
+
+    def test_overloaded(self):
+        self.server.max_pending = 0
+        sock = self.connect()
+        sock.sendall(b'GET / HTTP/1.1\r\n\r\n')
+
+        status, headers, _ = self.read_response(sock)
+        self.assertEqual(status, 'HTTP/1.1 503 Service Unavailable')
+        self.assertEqual(headers['retry-after'], '1')
+        self.assertEqual(self.server.rejected, 1)
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestBodyDecoder(unittest.TestCase):
+    def test_incremental_chunks(self):
+        decoder = aio.BodyDecoder(chunked=True)
+        out = []
+        buf = b''
+        for byte in b'3\r\nabc\r\n0\r\n\r\nNEXT':
+            buf += bytes([byte])
+            data, buf = decoder.decode(buf)
+            out.append(data)
+
+        self.assertTrue(decoder.done)
+        self.assertEqual(b''.join(out), b'abc')
+
+    def test_content_length(self):
+        decoder = aio.BodyDecoder(length=3)
+        self.assertEqual(decoder.decode(b'abcdef'), (b'abc', b'def'))
+        self.assertTrue(decoder.done)
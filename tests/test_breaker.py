@@ -0,0 +1,151 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common.exceptions import ServiceUnavailable
+from jumpgate.common.sl import breaker
+from jumpgate.common.sl.breaker import (CLOSED, HALF_OPEN, OPEN,
+                                        ServiceBreaker)
+
+
+class TestServiceBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.breaker = ServiceBreaker('Account', window=4, failure_ratio=0.5,
+                                      reset_timeout=30, adaptive=True,
+                                      limit=2, max_limit=3,
+                                      latency_tolerance=2.0,
+                                      clock=lambda: self.now)
+
+    def call(self, duration=0.1, failed=False, method='getObject',
+             counted=True):
+        self.breaker.acquire()
+        self.breaker.release(duration, failed, method=method,
+                             counted=counted)
+
+    def test_concurrency_limit(self):
+        self.breaker.acquire()
+        self.breaker.acquire()
+
+        self.assertRaises(ServiceUnavailable, self.breaker.acquire)
+
+        self.breaker.release(0.1)
+        self.breaker.acquire()
+
+    def test_additive_increase(self):
+        for _ in range(10):
+            self.call()
+
+        self.assertEquals(self.breaker.limit, 3)
+
+    def test_multiplicative_decrease(self):
+        self.breaker.baselines['getObject'] = 0.5
+        self.call(duration=2.0)
+        self.assertAlmostEqual(self.breaker.limit, 1.8)
+
+        for _ in range(20):
+            self.call(failed=True)
+            if self.breaker.state == OPEN:
+                self.now += 30
+        self.assertEquals(self.breaker.limit, 1)
+
+    def test_latency_per_method(self):
+        self.breaker.baselines.update(getObject=0.1, getReport=10.0)
+
+        self.call(duration=12.0, method='getReport')
+        self.assertAlmostEqual(self.breaker.limit, 2.5)
+
+        self.call(duration=1.0)
+        self.assertAlmostEqual(self.breaker.limit, 2.25)
+        self.assertAlmostEqual(self.breaker.baselines['getObject'], 0.19)
+
+    def test_learns_baseline(self):
+        self.call(duration=30.0, method='getReport')
+
+        self.assertEquals(self.breaker.baselines, {'getReport': 30.0})
+        self.assertAlmostEqual(self.breaker.limit, 2.5)
+
+    def test_not_adaptive(self):
+        breaker = ServiceBreaker('Account', limit=2, clock=lambda: self.now)
+        for _ in range(5):
+            breaker.acquire()
+        breaker.release(60.0, failed=True)
+
+        self.assertEquals(breaker.in_flight, 4)
+        self.assertEquals(breaker.limit, 2)
+
+    def test_not_counted(self):
+        for _ in range(8):
+            self.call(duration=60.0, failed=True, counted=False)
+
+        self.assertEquals(self.breaker.state, CLOSED)
+        self.assertEquals(self.breaker.in_flight, 0)
+        self.assertEquals(self.breaker.limit, 2)
+        self.assertEquals(len(self.breaker.outcomes), 0)
+
+    def test_opens(self):
+        self.call()
+        self.call()
+        self.call(failed=True)
+        self.assertEquals(self.breaker.state, CLOSED)
+
+        self.call(failed=True)
+        self.assertEquals(self.breaker.state, OPEN)
+
+        try:
+            self.breaker.acquire()
+            self.fail('ServiceUnavailable not raised')
+        except ServiceUnavailable as e:
+            self.assertEquals(e.code, 503)
+            self.assertEquals(e.retry_after, 30)
+
+    def test_half_open(self):
+        for _ in range(4):
+            self.call(failed=True)
+        self.now += 30
+
+        self.breaker.acquire()
+        self.assertEquals(self.breaker.state, HALF_OPEN)
+        # Only one trial call at a time
+        self.assertRaises(ServiceUnavailable, self.breaker.acquire)
+
+        self.breaker.release(0.1, failed=True)
+        self.assertEquals(self.breaker.state, OPEN)
+
+        # A trial which ran out of request deadline decides nothing
+        self.now += 30
+        self.call(counted=False)
+        self.assertEquals(self.breaker.state, HALF_OPEN)
+
+        self.call()
+        self.assertEquals(self.breaker.state, CLOSED)
+        self.assertEquals(len(self.breaker.outcomes), 0)
+
+    def test_status(self):
+        self.breaker.acquire()
+
+        self.assertEquals(self.breaker.status(),
+                          {'state': CLOSED, 'limit': 2, 'in_flight': 1,
+                           'failure_rate': 0.0})
+
+
+class TestGetBreaker(unittest.TestCase):
+    @patch.dict(breaker._breakers, clear=True)
+    def test_get_breaker(self):
+        account = breaker.get_breaker('Account')
+
+        self.assertIs(breaker.get_breaker('Account'), account)
+        self.assertEquals(account.limit, 20)
+        self.assertFalse(account.adaptive)
+        self.assertEquals(list(breaker.breaker_states()), ['Account'])
+
+
+class TestServiceUnavailable(unittest.TestCase):
+    def test_handle(self):
+        resp = MagicMock()
+
+        ServiceUnavailable.handle(ServiceUnavailable(retry_after=12.5),
+                                  MagicMock(), resp, {})
+
+        resp.set_header.assert_called_once_with('Retry-After', '12')
+        self.assertEquals(resp.status, 503)
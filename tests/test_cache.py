@@ -0,0 +1,229 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from jumpgate.common import cache as cache_module
+from jumpgate.common.cache import (OVERSIZED_ENTRIES, SLOT_OVERHEAD,
+                                   LRUCache, NamespacedCache, SharedCache,
+                                   shared_cache)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LRUCache(100, clock=self.clock)
+
+    def test_get_set(self):
+        self.assertTrue(self.cache.set('a', 'A', 10))
+
+        self.assertEquals(self.cache.get('a'), 'A')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEquals(self.cache.get('b', 'default'), 'default')
+        self.assertEquals(self.cache.current_bytes, 10)
+
+    def test_replace(self):
+        self.cache.set('a', 'A', 10)
+        self.cache.set('a', 'AA', 20)
+
+        self.assertEquals(self.cache.get('a'), 'AA')
+        self.assertEquals(self.cache.current_bytes, 20)
+        self.assertEquals(len(self.cache), 1)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 'A', 40)
+        self.cache.set('b', 'B', 40)
+        self.cache.get('a')
+        self.cache.set('c', 'C', 40)
+
+        self.assertEquals(self.cache.get('a'), 'A')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEquals(self.cache.get('c'), 'C')
+        self.assertEquals(self.cache.current_bytes, 80)
+        self.assertEquals(self.cache.evictions, 1)
+
+    def test_too_large(self):
+        self.cache.set('a', 'A', 10)
+
+        self.assertFalse(self.cache.set('a', 'huge', 101))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEquals(self.cache.current_bytes, 0)
+
+    def test_ttl(self):
+        self.cache.set('a', 'A', 10, ttl=5)
+        self.clock.now += 4
+        self.assertEquals(self.cache.get('a'), 'A')
+
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEquals(self.cache.current_bytes, 0)
+        self.assertFalse('a' in self.cache)
+
+    def test_delete_and_clear(self):
+        self.cache.set('a', 'A', 10)
+        self.cache.set('b', 'B', 10)
+
+        self.assertTrue(self.cache.delete('a'))
+        self.assertFalse(self.cache.delete('a'))
+        self.assertEquals(self.cache.current_bytes, 10)
+
+        self.cache.clear()
+        self.assertEquals(len(self.cache), 0)
+        self.assertEquals(self.cache.current_bytes, 0)
+
+    def test_invalidate(self):
+        self.cache.set(('t1', 'a'), 'A', 10)
+        self.cache.set(('t1', 'b'), 'B', 10)
+        self.cache.set(('t2', 'a'), 'A', 10)
+
+        self.assertEquals(self.cache.invalidate(lambda k: k[0] == 't1'), 2)
+        self.assertEquals(len(self.cache), 1)
+        self.assertEquals(self.cache.current_bytes, 10)
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test')
+        self.cache = self.open_cache()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def open_cache(self, **kwargs):
+        kwargs.setdefault('slots', 16)
+        kwargs.setdefault('slot_size', 256)
+        kwargs.setdefault('probes', 4)
+        return SharedCache(self.path, clock=self.clock, **kwargs)
+
+    def test_get_set(self):
+        self.assertTrue(self.cache.set(('t1', 'a'), {'id': 1}))
+
+        self.assertEquals(self.cache.get(('t1', 'a')), {'id': 1})
+        self.assertIsNone(self.cache.get(('t1', 'b')))
+        self.assertEquals(self.cache.get('b', 'default'), 'default')
+        self.assertEquals(len(self.cache), 1)
+        self.assertEquals(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_replace(self):
+        self.cache.set('a', 'A')
+        self.cache.set('a', 'AA')
+
+        self.assertEquals(self.cache.get('a'), 'AA')
+        self.assertEquals(len(self.cache), 1)
+
+    def test_shared_between_instances(self):
+        other = self.open_cache()
+        try:
+            self.cache.set('a', [1, 2, 3])
+            self.assertEquals(other.get('a'), [1, 2, 3])
+
+            other.delete('a')
+            self.assertIsNone(self.cache.get('a'))
+        finally:
+            other.close()
+
+    def test_reset_on_layout_change(self):
+        self.cache.set('a', 'A')
+        other = self.open_cache(slots=32)
+        try:
+            self.assertIsNone(other.get('a'))
+        finally:
+            other.close()
+
+    def test_too_large(self):
+        before = OVERSIZED_ENTRIES.labels('test').count
+        self.cache.set('a', 'A')
+        self.assertFalse(self.cache.set('a', 'x' * 256))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEquals(OVERSIZED_ENTRIES.labels('test').count, before + 1)
+
+    def test_sized_for_entries(self):
+        conf = {'cache': {'shared_path': self.tmpdir, 'shared_slots': 16,
+                          'shared_slot_size': 256}}
+        with patch.object(cache_module, 'CONF', conf), \
+                patch.dict(cache_module._shared_caches, clear=True):
+            sized = shared_cache('sized', 4 * (1024 + SLOT_OVERHEAD), 1024)
+            default = shared_cache('default')
+        try:
+            self.assertEquals((sized.slots, sized.slot_size),
+                              (4, 1024 + SLOT_OVERHEAD))
+            self.assertTrue(sized.set('a', 'x' * 1024))
+            self.assertEquals((default.slots, default.slot_size), (16, 256))
+        finally:
+            sized.close()
+            default.close()
+
+    def test_ttl(self):
+        self.cache.set('a', 'A', ttl=5)
+        self.clock.now += 4
+        self.assertEquals(self.cache.get('a'), 'A')
+
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertFalse('a' in self.cache)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.open_cache(slots=4, probes=4)
+        try:
+            for i, key in enumerate('abcd'):
+                self.clock.now += 1
+                cache.set(key, key)
+            self.clock.now += 1
+            cache.get('a')
+            self.clock.now += 1
+            cache.set('e', 'e')
+
+            self.assertIsNone(cache.get('b'))
+            for key in 'acde':
+                self.assertEquals(cache.get(key), key)
+            self.assertEquals(cache.evictions, 1)
+        finally:
+            cache.close()
+
+    def test_invalidate_and_clear(self):
+        self.cache.set(('t1', 'a'), 'A')
+        self.cache.set(('t1', 'b'), 'B')
+        self.cache.set(('t2', 'a'), 'A')
+
+        self.assertEquals(self.cache.invalidate(lambda k: k[0] == 't1'), 2)
+        self.assertEquals(len(self.cache), 1)
+
+        self.cache.clear()
+        self.assertEquals(len(self.cache), 0)
+
+
+class TestNamespacedCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(100)
+        self.t1 = NamespacedCache(self.cache, 't1')
+        self.t2 = NamespacedCache(self.cache, 't2')
+
+    def test_isolation(self):
+        self.t1.set('a', 'A', 10)
+
+        self.assertEquals(self.t1.get('a'), 'A')
+        self.assertIsNone(self.t2.get('a'))
+        self.assertFalse(self.t2.delete('a'))
+
+    def test_invalidate(self):
+        self.t1.set('a', 'A', 10)
+        self.t1.set('b', 'B', 10)
+        self.t2.set('a', 'A', 10)
+
+        self.assertEquals(self.t1.invalidate(lambda k: k == 'a'), 1)
+        self.t1.clear()
+        self.assertEquals(len(self.cache), 1)
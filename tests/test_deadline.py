@@ -0,0 +1,58 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import deadline
+from jumpgate.common.exceptions import DeadlineExceeded, ResponseException
+
+
+def make_req(header=None):
+    req = MagicMock()
+    req.env = {}
+    req.headers = {}
+    if header is not None:
+        req.headers['X-REQUEST-DEADLINE'] = header
+    return req
+
+
+class TestFromRequest(unittest.TestCase):
+    def test_default(self):
+        self.assertEquals(deadline.from_request(make_req(), now=1000.0),
+                          1120.0)
+
+    def test_header(self):
+        self.assertEquals(deadline.from_request(make_req('2.5'), now=1000.0),
+                          1002.5)
+
+    def test_header_limited(self):
+        self.assertEquals(deadline.from_request(make_req('9999'),
+                                                now=1000.0),
+                          1600.0)
+
+    def test_invalid_header(self):
+        for header in ['soon', '-1', 'nan', '-inf', '0', '0.01']:
+            self.assertRaises(ResponseException, deadline.from_request,
+                              make_req(header))
+
+
+class TestRemaining(unittest.TestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadline.remaining(make_req()))
+        self.assertEquals(deadline.remaining(make_req(), 300), 300)
+
+    @patch('time.time', return_value=1000.0)
+    def test_remaining(self, _):
+        req = make_req()
+        req.env['request_deadline'] = 1010.0
+
+        self.assertEquals(deadline.remaining(req), 10.0)
+        self.assertEquals(deadline.remaining(req, 5), 5)
+
+        req.env['request_deadline'] = 900.0
+        self.assertEquals(deadline.remaining(req), 0.0)
+
+    @patch('time.time', return_value=1000.0)
+    def test_check(self, _):
+        deadline.check(None)
+        deadline.check(1000.5)
+        self.assertRaises(DeadlineExceeded, deadline.check, 1000.0)
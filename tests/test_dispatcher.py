@@ -1,7 +1,9 @@
-from mock import MagicMock
+from mock import MagicMock, patch
 import unittest
 
-from jumpgate.common.dispatcher import Dispatcher
+from jumpgate.common.admission import BULK, CRITICAL, NORMAL
+from jumpgate.common.dispatcher import (ROUTE_IN_FLIGHT, Dispatcher,
+                                        RoutedResource)
 
 
 class TestDispatcher(unittest.TestCase):
@@ -46,11 +48,39 @@ class TestDispatcher(unittest.TestCase):
         handler = MagicMock()
         self.disp.set_handler('user_page0', handler)
 
-        endpoints = self.disp.get_routes()
+        with patch('jumpgate.common.dispatcher.CONF',
+                   {'admission': {'enabled': True}}):
+            endpoints = self.disp.get_routes()
 
-        self.assertEquals(endpoints, [
-            ('/mountpoint/path0/to/{tenant_id}', handler),
-        ])
+        self.assertEquals(len(endpoints), 1)
+        self.assertEquals(endpoints[0][0], '/mountpoint/path0/to/{tenant_id}')
+        self.assertEquals(endpoints[0][1].route,
+                          '/mountpoint/path0/to/{tenant_id}')
+        self.assertEquals(endpoints[0][1].resource.resource, handler)
+        self.assertEquals(endpoints[0][1].resource.priority, NORMAL)
+
+    def test_get_routes_without_admission(self):
+        self.disp.add_endpoint('user_page0', '/path0/to/{tenant_id}')
+        handler = MagicMock()
+        self.disp.set_handler('user_page0', handler)
+
+        with patch('jumpgate.common.dispatcher.CONF',
+                   {'admission': {'enabled': False}}):
+            endpoints = self.disp.get_routes()
+
+        self.assertEquals(endpoints[0][1].resource, handler)
+
+    def test_priority(self):
+        self.disp.add_endpoint('tokens', '/tokens', priority=CRITICAL)
+        self.disp.add_endpoint('servers', '/servers')
+
+        self.assertEquals(self.disp.get_priority('tokens'), CRITICAL)
+        self.assertEquals(self.disp.get_priority('servers'), NORMAL)
+
+        self.disp.set_priority('servers', BULK)
+        self.assertEquals(self.disp.get_priority('servers'), BULK)
+        self.assertRaises(ValueError, self.disp.set_priority, 'servers',
+                          'urgent')
 
 
 class TestDispatcherUrls(unittest.TestCase):
@@ -89,3 +119,20 @@ class TestDispatcherUrls(unittest.TestCase):
             req, 'instance_detail', instance_id='9876')
 
         self.assertEquals(path, 'http://some_host/path/to/1234/9876')
+
+
+class TestRoutedResource(unittest.TestCase):
+    def test_responder(self):
+        resource = MagicMock()
+        req = MagicMock(env={})
+        resp = MagicMock()
+
+        def on_get(req, resp, **kwargs):
+            self.assertEquals(ROUTE_IN_FLIGHT.labels('/route').count, 1)
+        resource.on_get.side_effect = on_get
+
+        RoutedResource(resource, '/route').on_get(req, resp, server_id='1')
+
+        resource.on_get.assert_called_once_with(req, resp, server_id='1')
+        self.assertEquals(req.env['jumpgate.route'], '/route')
+        self.assertEquals(ROUTE_IN_FLIGHT.labels('/route').count, 0)
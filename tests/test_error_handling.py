@@ -10,6 +10,7 @@ ERRORS = [
     (error_handling.unauthorized, 'unauthorized', 401),
     (error_handling.not_found, 'notFound', 404),
     (error_handling.duplicate, 'duplicate', 409),
+    (error_handling.range_not_satisfiable, 'rangeNotSatisfiable', 416),
 ]
 
 
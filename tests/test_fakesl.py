@@ -0,0 +1,234 @@
+import threading
+import unittest
+
+from mock import patch
+import requests
+import SoftLayer
+from SoftLayer import SoftLayerAPIError, TransportError
+
+from jumpgate.fakesl import query
+from jumpgate.fakesl.account import Account
+from jumpgate.fakesl.app import FakeSoftLayer, make_fake_server
+from jumpgate.fakesl.services import Call, Fault, Services
+
+
+class TestAccount(unittest.TestCase):
+    def test_generate(self):
+        account = Account(guests=7, images=3, subnets=2, vlans=2,
+                          ssh_keys=4, dns_zones=2, records=3, events=9)
+
+        self.assertEquals(len(account.guests), 7)
+        self.assertEquals(len(account.images), 3)
+        self.assertEquals(len(account.public_images), 3)
+        self.assertEquals(len(account.subnets), 2)
+        self.assertEquals(len(account.vlans), 2)
+        self.assertEquals(len(account.ssh_keys), 4)
+        self.assertEquals(len(account.domains), 2)
+        self.assertEquals(len(account.records), 6)
+        self.assertEquals(len(account.events), 9)
+        self.assertEquals(len(account.api_key), 64)
+
+    def test_seeded(self):
+        self.assertEquals(Account(guests=5, seed=3).guests,
+                          Account(guests=5, seed=3).guests)
+        self.assertNotEquals(Account(guests=5, seed=3).guests,
+                             Account(guests=5, seed=4).guests)
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.guest = {'id': 1, 'hostname': 'web1', 'maxCpu': 2,
+                      'datacenter': {'id': 3, 'name': 'dal05'},
+                      'sshKeys': [{'id': 4, 'label': 'key'}],
+                      'billingItem': {'orderItem': {'order': {
+                          'userRecordId': 5, 'id': 6}}}}
+
+    def test_parse_mask(self):
+        self.assertEquals(query.parse_mask('mask[id, datacenter[name]]'),
+                          {'id': {}, 'datacenter': {'name': {}}})
+        self.assertEquals(
+            query.parse_mask('mask.billingItem.orderItem;mask.datacenter'),
+            {'billingItem': {'orderItem': {}}, 'datacenter': {}})
+        self.assertEquals(
+            query.parse_mask('[mask[id], mask(SoftLayer_Hardware)[name]]'),
+            {'id': {}, 'name': {}})
+
+    def test_apply_mask(self):
+        self.assertEquals(query.apply_mask(self.guest, {}),
+                          {'id': 1, 'hostname': 'web1', 'maxCpu': 2})
+        self.assertEquals(
+            query.apply_mask(self.guest, query.parse_mask(
+                'mask[id,datacenter,billingItem.orderItem.order.'
+                'userRecordId]')),
+            {'id': 1, 'datacenter': {'id': 3, 'name': 'dal05'},
+             'billingItem': {'orderItem': {'order': {'userRecordId': 5}}}})
+        # Only relational properties named keeps the local ones
+        self.assertEquals(
+            query.apply_mask([self.guest], query.parse_mask('sshKeys'))[0],
+            {'id': 1, 'hostname': 'web1', 'maxCpu': 2,
+             'sshKeys': [{'id': 4, 'label': 'key'}]})
+
+    def test_apply_filter(self):
+        other = dict(self.guest, id=2, hostname='db1', maxCpu=8,
+                     datacenter={'name': 'sjc01'}, sshKeys=[])
+        guests = [self.guest, other]
+
+        def ids(object_filter):
+            return [guest['id'] for guest in
+                    query.apply_filter(guests, object_filter)]
+
+        self.assertEquals(
+            ids({'virtualGuests': {'hostname': {'operation': 'db1'}}}), [2])
+        self.assertEquals(ids({'hostname': {'operation': '^= WEB'}}), [1])
+        self.assertEquals(ids({'hostname': {'operation': '~ b'}}), [1, 2])
+        self.assertEquals(ids({'maxCpu': {'operation': '> 4'}}), [2])
+        self.assertEquals(ids({'datacenter': {'name': {
+            'operation': '_= sjc01'}}}), [2])
+        self.assertEquals(ids({'sshKeys': {'label': {'operation': 'key'}}}),
+                          [1])
+        self.assertEquals(ids({'id': {'operation': 'in', 'options': [
+            {'name': 'data', 'value': [2, 3]}]}}), [2])
+        self.assertEquals(ids({'hostname': {'operation': 'orderBy',
+                                            'options': [{'name': 'sort',
+                                                         'value': ['ASC']}]
+                                            }}), [2, 1])
+
+    def test_apply_limit(self):
+        self.assertEquals(query.apply_limit([1, 2, 3, 4], 2, 1), [2, 3])
+        self.assertEquals(query.apply_limit([1, 2], None), [1, 2])
+
+
+class TestServices(unittest.TestCase):
+    def setUp(self):
+        self.account = Account(guests=3, seed=1)
+        self.services = Services(self.account)
+        self.auth = {'username': self.account.username,
+                     'apiKey': self.account.api_key}
+
+    def call(self, service, method, *args, **kwargs):
+        return self.services.handle(Call(service, method, args,
+                                         auth=self.auth, **kwargs))
+
+    def test_authenticate(self):
+        self.auth['apiKey'] = 'wrong'
+
+        self.assertRaises(Fault, self.call, 'Account', 'getObject')
+
+    def test_login_token(self):
+        self.auth = None
+        login = self.call('User_Customer', 'getPortalLoginToken',
+                          self.account.username, self.account.password)
+        self.auth = {'userId': login['userId'], 'authToken': login['hash']}
+
+        self.assertEquals(self.call('Account', 'getCurrentUser')['id'],
+                          login['userId'])
+
+    def test_guest_lifecycle(self):
+        guest = self.call('Virtual_Guest', 'createObject',
+                          {'hostname': 'new', 'domain': 'example.org',
+                           'datacenter': {'name': 'sjc01'}})
+        self.assertEquals(len(self.call('Account', 'getVirtualGuests')), 4)
+
+        found = self.call('Virtual_Guest', 'getObject', id=guest['id'],
+                          mask='mask[fullyQualifiedDomainName,datacenter]')
+        self.assertEquals(found['fullyQualifiedDomainName'],
+                          'new.example.org')
+        self.assertEquals(found['datacenter']['name'], 'sjc01')
+
+        self.call('Virtual_Guest', 'deleteObject', id=guest['id'])
+        try:
+            self.call('Virtual_Guest', 'getObject', id=guest['id'])
+            self.fail('Fault not raised')
+        except Fault as e:
+            self.assertEquals(e.code, 'SoftLayer_Exception_ObjectNotFound')
+
+    def test_results_are_copies(self):
+        guests = self.call('Account', 'getVirtualGuests')
+        guests[0]['hostname'] = 'changed'
+
+        self.assertNotEquals(
+            self.call('Account', 'getVirtualGuests')[0]['hostname'],
+            'changed')
+
+
+class TestFakeSoftLayer(unittest.TestCase):
+    def setUp(self):
+        self.account = Account(guests=5, seed=1)
+        self.app = FakeSoftLayer(self.account, seed=1)
+        server = make_fake_server(self.app)
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = 'http://127.0.0.1:%s' % server.server_address[1]
+        self.client = SoftLayer.Client(username=self.account.username,
+                                       api_key=self.account.api_key,
+                                       endpoint_url=self.url + '/xmlrpc/v3')
+
+    def test_xmlrpc(self):
+        guests = self.client['Account'].getVirtualGuests(
+            mask='mask[id, hostname]', limit=2, offset=1)
+
+        self.assertEquals([guest['hostname'] for guest in guests],
+                          ['guest1', 'guest2'])
+        self.assertEquals(sorted(guests[0]), ['hostname', 'id'])
+
+    def test_xmlrpc_fault(self):
+        try:
+            self.client['Virtual_Guest'].getObject(id=1)
+            self.fail('SoftLayerAPIError not raised')
+        except SoftLayerAPIError as e:
+            self.assertEquals(e.faultCode,
+                              'SoftLayer_Exception_ObjectNotFound')
+
+    def test_managers(self):
+        keys = SoftLayer.SshKeyManager(self.client)
+
+        self.assertEquals([key['label'] for key in
+                           keys.list_keys(label='key3')], ['key3'])
+
+    def test_rest(self):
+        guest_id = sorted(self.account.guests)[0]
+        auth = (self.account.username, self.account.api_key)
+
+        resp = requests.get(
+            self.url + '/rest/v3/SoftLayer_Virtual_Guest/%s.json' % guest_id,
+            params={'objectMask': 'mask[hostname]'}, auth=auth)
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(resp.json(), {'hostname': 'guest0'})
+
+        resp = requests.get(
+            self.url + '/rest/v3/SoftLayer_Account/getVirtualGuests.json',
+            params={'resultLimit': '0,3'}, auth=auth)
+        self.assertEquals(len(resp.json()), 3)
+
+        resp = requests.get(
+            self.url + '/rest/v3/SoftLayer_Virtual_Guest/1/getObject.json',
+            auth=auth)
+        self.assertEquals(resp.status_code, 404)
+        self.assertEquals(resp.json()['code'],
+                          'SoftLayer_Exception_ObjectNotFound')
+
+    def test_injected_errors(self):
+        self.app.method_error_rates['Account.getObject'] = 1.0
+        self.assertRaises(SoftLayerAPIError,
+                          self.client['Account'].getObject)
+        self.client['Account'].getCurrentUser()
+
+        self.app.unavailable_rate = 1.0
+        self.assertRaises(TransportError,
+                          self.client['Account'].getCurrentUser)
+
+    @patch('time.sleep')
+    def test_injected_latency(self, sleep):
+        self.app.latency = 0.5
+        self.app.method_latencies['Account.getSshKeys'] = 2.0
+
+        self.client['Account'].getObject()
+        self.client['Account'].getSshKeys()
+
+        self.assertEquals([c[0][0] for c in sleep.call_args_list],
+                          [0.5, 2.0])
+        self.assertEquals(self.app.calls, 2)
@@ -0,0 +1,152 @@
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+from SoftLayer import SoftLayerAPIError
+
+from jumpgate.common.exceptions import DeadlineExceeded
+from jumpgate.common.sl import fanout
+from jumpgate.common.sl.fanout import BRANCH_PREFIX, fan_out
+from jumpgate.image.drivers.sl.images import ImagesV2
+
+
+def make_req():
+    req = MagicMock()
+    req.env = {'sl_client': MagicMock(last_calls=[])}
+    return req
+
+
+class TestFanOut(unittest.TestCase):
+    def test_results(self):
+        req = make_req()
+        threads = set()
+
+        def branch(value):
+            threads.add(threading.current_thread().name)
+            return value
+
+        results = fan_out(req, {'a': lambda: branch(1),
+                                'b': lambda: branch(2)})
+
+        self.assertEquals(results, {'a': 1, 'b': 2})
+        self.assertNotIn(threading.current_thread().name, threads)
+
+    def test_concurrent(self):
+        barrier = threading.Event()
+
+        def first():
+            self.assertTrue(barrier.wait(5))
+            return 1
+
+        def second():
+            barrier.set()
+            return 2
+
+        results = fan_out(make_req(), {'a': first, 'b': second})
+
+        self.assertEquals(results, {'a': 1, 'b': 2})
+
+    def test_timelog(self):
+        req = make_req()
+
+        fan_out(req, {'a': lambda: 1, 'b': lambda: 2})
+
+        names = sorted(c[0] for c in req.env['sl_client'].last_calls)
+        self.assertEquals(names, [BRANCH_PREFIX + 'a', BRANCH_PREFIX + 'b'])
+
+    def test_error_propagates(self):
+        release = threading.Event()
+        error = SoftLayerAPIError('SoftLayer_Exception_NotFound', 'gone')
+
+        def failing():
+            raise error
+
+        def slow():
+            release.wait(5)
+            return 1
+
+        try:
+            fan_out(make_req(), {'a': failing, 'b': slow})
+            self.fail('SoftLayerAPIError not raised')
+        except SoftLayerAPIError as e:
+            self.assertIs(e, error)
+        finally:
+            release.set()
+
+    def test_cancels_unstarted_branches(self):
+        pending = fanout.FanOut(MagicMock(last_calls=[]), time.time() + 5)
+        pending.run_branch('a', MagicMock(side_effect=ValueError()))
+        sibling = MagicMock()
+
+        pending.run_branch('b', sibling)
+
+        self.assertFalse(sibling.called)
+        self.assertRaises(ValueError, pending.wait, 2)
+
+    def test_deadline(self):
+        release = threading.Event()
+        try:
+            self.assertRaises(DeadlineExceeded, fan_out, make_req(),
+                              {'a': lambda: release.wait(5),
+                               'b': lambda: 2},
+                              timeout=0.05)
+        finally:
+            release.set()
+
+    def test_nested_runs_inline(self):
+        def outer():
+            inner_thread = []
+            fan_out(make_req(), {
+                'x': lambda: inner_thread.append(
+                    threading.current_thread()),
+                'y': lambda: None})
+            return inner_thread[0] is threading.current_thread()
+
+        self.assertEquals(fan_out(make_req(), {'a': outer, 'b': lambda: 1}),
+                          {'a': True, 'b': 1})
+
+
+class TestImagesV2(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('jumpgate.image.drivers.sl.images.SLImages')
+        self.sl_images = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = patch(
+            'jumpgate.image.drivers.sl.images.get_v2_image_details_dict',
+            lambda app, req, image, tenant_id: {'name': image['name']})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def list_images(self, limit):
+        req = make_req()
+        req.get_param.side_effect = {'limit': limit}.get
+        resp = MagicMock()
+        ImagesV2(MagicMock()).on_get(req, resp, tenant_id='1')
+        return [(image['visibility'], image['name'])
+                for image in resp.body['images']]
+
+    def test_limit_across_sources(self):
+        # Both sources are asked for the full limit at once; the listing is
+        # still the one made asking for the private images after the public
+        self.sl_images.get_public_images.return_value = [{'name': 'a'}]
+        self.sl_images.get_private_images.return_value = [{'name': 'b'},
+                                                          {'name': 'c'}]
+
+        self.assertEquals(self.list_images('2'),
+                          [('public', 'a'), ('private', 'b')])
+
+    def test_limit_filled_by_public(self):
+        self.sl_images.get_public_images.return_value = [{'name': 'a'},
+                                                         {'name': 'b'}]
+        self.sl_images.get_private_images.return_value = [{'name': 'c'}]
+
+        self.assertEquals(self.list_images('2'),
+                          [('public', 'a'), ('public', 'b')])
+
+    def test_no_limit(self):
+        self.sl_images.get_public_images.return_value = {'name': 'a'}
+        self.sl_images.get_private_images.return_value = [{'name': 'b'}]
+
+        self.assertEquals(self.list_images(None),
+                          [('public', 'a'), ('private', 'b')])
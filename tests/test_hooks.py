@@ -1,8 +1,15 @@
 from mock import patch, MagicMock
 import unittest
 
-from jumpgate.common.exceptions import InvalidTokenError
-from jumpgate.common.hooks.core import hook_format, hook_set_uuid
+from jumpgate.common.exceptions import (DeadlineExceeded, InvalidTokenError,
+                                        ResponseException,
+                                        ServiceUnavailable)
+from jumpgate.common.hooks.core import (REQUEST_DURATION, REQUESTS,
+                                        SL_CALL_DURATION, hook_admit,
+                                        hook_finish_request, hook_format,
+                                        hook_log_slow_request,
+                                        hook_record_request,
+                                        hook_set_deadline, hook_set_uuid)
 from jumpgate.common.hooks.log import log_request
 from jumpgate.common.hooks.admin_token import admin_token
 from jumpgate.common.hooks.auth_token import validate_token
@@ -46,14 +53,20 @@ class TestHookLogRequest(unittest.TestCase):
         req.method = 'GET'
         req.path = '/'
         req.query_string = 'something=value'
-        req.env = {'REQUEST_ID': '123456'}
+        req.env = {'REQUEST_ID': '123456', 'jumpgate.route': '/',
+                   'jumpgate.request_start': 1000.0}
         resp = MagicMock()
         resp.status = '200 OK'
-        log_request(req, resp)
+        with patch('time.time', return_value=1000.5):
+            log_request(req, resp)
 
         log.info.assert_called_with(
             '%s %s %s %s [ReqId: %s]',
-            'GET', '/', 'something=value', '200 OK', '123456')
+            'GET', '/', 'something=value', '200 OK', '123456',
+            extra={'fields': {'request_id': '123456', 'method': 'GET',
+                              'path': '/', 'query': 'something=value',
+                              'status': '200', 'route': '/',
+                              'duration': 0.5}})
 
 
 class TestHookSetUUID(unittest.TestCase):
@@ -70,6 +83,162 @@ class TestHookSetUUID(unittest.TestCase):
         self.assertTrue(req.env['REQUEST_ID'].startswith('req-'))
 
 
+class TestHookSetDeadline(unittest.TestCase):
+    @patch('time.time', return_value=1000.0)
+    def test_set_deadline(self, _):
+        req = MagicMock()
+        req.env = {}
+        req.headers = {'X-REQUEST-DEADLINE': '5'}
+
+        hook_set_deadline(req, MagicMock(), {})
+
+        self.assertEquals(req.env['request_deadline'], 1005.0)
+
+    @patch('jumpgate.common.hooks.core.deadline.from_request',
+           return_value=999.0)
+    @patch('time.time', return_value=1000.0)
+    def test_expired(self, *_):
+        req = MagicMock()
+        req.env = {}
+
+        self.assertRaises(DeadlineExceeded, hook_set_deadline, req,
+                          MagicMock(), {})
+
+    def test_too_short(self):
+        req = MagicMock()
+        req.env = {}
+        req.headers = {'X-REQUEST-DEADLINE': '0.01'}
+
+        self.assertRaises(ResponseException, hook_set_deadline, req,
+                          MagicMock(), {})
+
+
+SHEDDING = {'admission': {'shed_queued_requests': True}}
+
+
+class TestHookAdmit(unittest.TestCase):
+    @patch('jumpgate.common.hooks.core.CONF', SHEDDING)
+    @patch('jumpgate.common.hooks.core.admission.get_delay_controller')
+    def test_admit(self, get_delay_controller):
+        req = MagicMock()
+        req.env = {'jumpgate.request_start': 1000.0}
+
+        with patch('time.time', return_value=1000.25):
+            hook_admit(req, MagicMock(), {})
+
+        get_delay_controller().admit.assert_called_once_with(0.25)
+        self.assertTrue(req.env['admitted'])
+
+        hook_finish_request(req, MagicMock())
+        get_delay_controller().finish.assert_called_once_with()
+        self.assertNotIn('admitted', req.env)
+
+    @patch('jumpgate.common.hooks.core.CONF', SHEDDING)
+    @patch('jumpgate.common.hooks.core.admission.get_delay_controller')
+    def test_shed(self, get_delay_controller):
+        get_delay_controller().admit.side_effect = ServiceUnavailable()
+        req = MagicMock()
+        req.env = {}
+
+        self.assertRaises(ServiceUnavailable, hook_admit, req, MagicMock(),
+                          {})
+
+        hook_finish_request(req, MagicMock())
+        self.assertFalse(get_delay_controller().finish.called)
+
+    @patch('jumpgate.common.hooks.core.admission.get_delay_controller')
+    def test_not_shedding(self, get_delay_controller):
+        req = MagicMock()
+        req.env = {}
+
+        hook_admit(req, MagicMock(), {})
+
+        self.assertFalse(get_delay_controller().admit.called)
+        self.assertNotIn('admitted', req.env)
+
+
+class TestHookRecordRequest(unittest.TestCase):
+    def test_record(self):
+        req = MagicMock()
+        req.method = 'GET'
+        req.env = {
+            'jumpgate.route': '/v2/{tenant_id}/recorded',
+            'jumpgate.request_start': 1000.0,
+            'sl_client': MagicMock(last_calls=[
+                ('Account.getRecorded', 1000.1, 0.2),
+                ('[fanout] branch', 1000.1, 0.3)]),
+        }
+        resp = MagicMock()
+        resp.status = '200 OK'
+
+        with patch('time.time', return_value=1000.5):
+            hook_record_request(req, resp)
+
+        duration = REQUEST_DURATION.labels('GET',
+                                           '/v2/{tenant_id}/recorded')
+        self.assertEquals(duration.count, 1)
+        self.assertEquals(duration.sum, 0.5)
+        self.assertEquals(REQUESTS.labels(
+            'GET', '/v2/{tenant_id}/recorded', '200').count, 1)
+        self.assertEquals(
+            SL_CALL_DURATION.labels('Account.getRecorded').count, 1)
+        self.assertEquals(
+            SL_CALL_DURATION.labels('[fanout] branch').count, 0)
+
+    def test_unmatched(self):
+        req = MagicMock()
+        req.method = 'DELETE'
+        req.env = {}
+        resp = MagicMock()
+        resp.status = '401 Unauthorized'
+
+        hook_record_request(req, resp)
+
+        self.assertEquals(REQUESTS.labels('DELETE', 'unmatched',
+                                          '401').count, 1)
+
+    def test_unknown_method(self):
+        resp = MagicMock()
+        resp.status = '405 Method Not Allowed'
+        for method in ['BREW', 'get', 'X' * 100]:
+            req = MagicMock()
+            req.method = method
+            req.env = {}
+            hook_record_request(req, resp)
+
+        self.assertEquals(REQUESTS.labels('other', 'unmatched',
+                                          '405').count, 3)
+        self.assertFalse(any(labels['method'] == 'BREW'
+                             for labels, _ in REQUESTS._items()))
+
+
+class TestHookLogSlowRequest(unittest.TestCase):
+    @patch('jumpgate.common.slowlog.get_log')
+    def test_record(self, get_log):
+        calls = [('Account.getObject', 1000.1, 0.2)]
+        req = MagicMock()
+        req.env = {
+            'jumpgate.route': '/v2/{tenant_id}/slow',
+            'jumpgate.request_start': 1000.0,
+            'sl_client': MagicMock(last_calls=calls),
+        }
+
+        with patch('time.time', return_value=1000.5):
+            hook_log_slow_request(req, MagicMock())
+
+        get_log.return_value.record.assert_called_once_with(
+            req, '/v2/{tenant_id}/slow', 1000.0, 0.5, calls)
+
+    @patch('jumpgate.common.slowlog.get_log')
+    def test_no_start(self, get_log):
+        req = MagicMock()
+        req.env = {}
+
+        hook_log_slow_request(req, MagicMock())
+
+        self.assertFalse(get_log.called)
+
+
 class TestHookAdminToken(unittest.TestCase):
     @patch('jumpgate.common.hooks.admin_token.cfg')
     def test_admin_token(self, cfg):
@@ -0,0 +1,126 @@
+import os
+import os.path
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import invalidation
+from jumpgate.common.invalidation import InvalidationBus
+
+
+class TestInvalidationBus(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.buses = []
+
+    def tearDown(self):
+        for bus in self.buses:
+            bus.close()
+        shutil.rmtree(self.tmpdir)
+
+    def new_bus(self, name):
+        bus = InvalidationBus(self.tmpdir)
+        # Buses in one test process need distinct addresses
+        bus.address = os.path.join(self.tmpdir, name + '.sock')
+        bus.start()
+        self.buses.append(bus)
+        return bus
+
+    def wait_for_peer(self, bus, peer):
+        for _ in range(500):
+            if peer.address in bus.peers():
+                return
+            threading.Event().wait(0.01)
+
+    def test_publish(self):
+        received = []
+        done = threading.Event()
+
+        def handler(tenant, calls):
+            received.append((tenant, calls))
+            done.set()
+
+        publisher = self.new_bus('a')
+        subscriber = self.new_bus('b')
+        subscriber.subscribe('softlayer_calls', handler)
+        # The subscriber started later and announced itself
+        self.wait_for_peer(publisher, subscriber)
+        own = MagicMock()
+        publisher.subscribe('softlayer_calls', own)
+
+        publisher.publish('softlayer_calls', '1234', ['Account.getSubnets'])
+
+        self.assertTrue(done.wait(5))
+        self.assertEquals(received, [('1234', ['Account.getSubnets'])])
+        self.assertFalse(own.called)
+
+    def test_removes_dead_peers(self):
+        publisher = self.new_bus('a')
+        dead = os.path.join(self.tmpdir, 'dead.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(dead)
+        sock.close()
+        publisher.refresh_peers()
+
+        publisher.publish('topic')
+
+        self.assertFalse(os.path.exists(dead))
+        self.assertEquals(publisher.peers(), [])
+
+    @patch('glob.glob')
+    def test_publish_uses_known_peers(self, glob):
+        publisher = self.new_bus('a')
+        glob.reset_mock()
+        publisher.publish('topic')
+
+        self.assertFalse(glob.called)
+
+    def test_handle(self):
+        bus = InvalidationBus(self.tmpdir)
+        handler = MagicMock()
+        failing = MagicMock(side_effect=ValueError())
+        bus.subscribe('topic', failing)
+        bus.subscribe('topic', handler)
+
+        bus.handle(b'not json')
+        bus.handle(b'{"topic": "other", "args": []}')
+        bus.handle(b'{"topic": "topic", "args": ["a", 1]}')
+
+        handler.assert_called_once_with('a', 1)
+
+    def test_publish_unstarted(self):
+        InvalidationBus(self.tmpdir).publish('topic', 'a')
+
+    def test_close(self):
+        bus = self.new_bus('a')
+        bus.close()
+
+        self.assertFalse(os.path.exists(bus.address))
+        # The listening thread stopped before the socket was closed
+        self.assertFalse(bus._thread.is_alive())
+
+
+class TestGetBus(unittest.TestCase):
+    def test_disabled(self):
+        self.assertIsNone(invalidation.get_bus())
+        invalidation.publish('topic', 'a')
+        invalidation.subscribe('topic', MagicMock())
+
+    @patch.object(invalidation, '_handlers', {})
+    @patch.object(invalidation, '_deferred_pid', None)
+    @patch.object(invalidation, 'InvalidationBus')
+    @patch.object(invalidation, 'CONF',
+                  {'cache': {'invalidation_bus': True,
+                             'invalidation_bus_path': '/tmp/bus'}})
+    def test_deferred(self, bus):
+        invalidation.defer()
+        handler = MagicMock()
+        invalidation.subscribe('topic', handler)
+
+        self.assertIsNone(invalidation.get_bus())
+        self.assertFalse(bus.called)
+        self.assertEquals(invalidation._handlers, {'topic': [handler]})
@@ -2,7 +2,10 @@ import unittest
 from mock import MagicMock, call, patch
 
 from jumpgate.api import Jumpgate
-from jumpgate.common.hooks.core import hook_format, hook_set_uuid
+from jumpgate.common.hooks.core import (hook_admit, hook_finish_request,
+                                        hook_format, hook_log_slow_request,
+                                        hook_record_request,
+                                        hook_set_deadline, hook_set_uuid)
 from jumpgate.common.dispatcher import Dispatcher
 
 import falcon
@@ -28,8 +31,11 @@ class TestJumpgateInit(unittest.TestCase):
 
         self.assertIsInstance(app.before_hooks, list)
         self.assertIsInstance(app.after_hooks, list)
-        self.assertEqual(app.before_hooks, [hook_set_uuid])
-        self.assertEqual(app.after_hooks, [hook_format])
+        self.assertEqual(app.before_hooks,
+                         [hook_set_uuid, hook_set_deadline, hook_admit])
+        self.assertEqual(app.after_hooks, [hook_format, hook_finish_request,
+                                           hook_record_request,
+                                           hook_log_slow_request])
 
         self.assertEqual(app._dispatchers, {})
 
@@ -52,7 +58,15 @@ class TestJumpgate(unittest.TestCase):
         api = self.app.make_api()
         self.assertTrue(hasattr(api, '__call__'))
         self.assertIsInstance(api, falcon.API)
-        self.assertEqual(len(api._routes), 20)
+        # Plus /admin/timing and /admin/profile
+        self.assertEqual(len(api._routes), 22)
+
+    def test_make_api_metrics(self):
+        self.app.config = {'metrics_endpoint': True}
+
+        api = self.app.make_api()
+
+        self.assertEqual(len(api._routes), 3)
 
     def test_add_get_dispatcher(self):
         disp = Dispatcher()
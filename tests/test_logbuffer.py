@@ -0,0 +1,89 @@
+import json
+import logging
+import threading
+import unittest
+
+from six import StringIO
+
+from jumpgate.common import logbuffer
+
+
+def make_record(msg, *args, **fields):
+    record = logging.LogRecord('jumpgate.test', logging.INFO, __file__, 1,
+                               msg, args, None)
+    if fields:
+        record.fields = fields
+    return record
+
+
+class BlockingStream(object):
+    """Holds up the writer until released, like a stalled disk."""
+
+    def __init__(self):
+        self.lines = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(5)
+        self.lines.extend(data.splitlines())
+
+    def flush(self):
+        pass
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_format(self):
+        entry = json.loads(logbuffer.JsonFormatter().format(
+            make_record('%s done', 'GET', status='200')))
+
+        self.assertEquals(entry['message'], 'GET done')
+        self.assertEquals(entry['level'], 'INFO')
+        self.assertEquals(entry['logger'], 'jumpgate.test')
+        self.assertEquals(entry['status'], '200')
+
+
+class TestBufferedHandler(unittest.TestCase):
+    def test_write(self):
+        stream = StringIO()
+        handler = logbuffer.BufferedHandler(stream, flush_interval=0.01)
+        self.addCleanup(handler.close)
+
+        for i in range(3):
+            handler.handle(make_record('line %s', i))
+        handler.flush()
+
+        self.assertEquals(stream.getvalue(), 'line 0\nline 1\nline 2\n')
+
+    def test_does_not_block(self):
+        stream = BlockingStream()
+        handler = logbuffer.BufferedHandler(stream, queue_size=2,
+                                            batch_size=1)
+        self.addCleanup(handler.close)
+        dropped = logbuffer.DROPPED_RECORDS.labels().count
+
+        # The first line is held up by the stream, the next two wait in
+        # the queue and the rest are dropped
+        handler.handle(make_record('line 0'))
+        self.assertTrue(stream.writing.wait(5))
+        for i in range(1, 5):
+            handler.handle(make_record('line %s', i))
+        stream.release.set()
+        handler.flush()
+
+        self.assertEquals(stream.lines, ['line 0', 'line 1',
+                                         '2 log records were dropped',
+                                         'line 2'])
+        self.assertEquals(logbuffer.DROPPED_RECORDS.labels().count,
+                          dropped + 2)
+
+    def test_close(self):
+        stream = StringIO()
+        handler = logbuffer.BufferedHandler(stream, flush_interval=5)
+
+        handler.handle(make_record('last'))
+        handler.close()
+
+        self.assertEquals(stream.getvalue(), 'last\n')
+        self.assertFalse(handler._thread.is_alive())
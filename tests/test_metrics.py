@@ -0,0 +1,120 @@
+import unittest
+
+from mock import MagicMock
+
+from jumpgate.common.metrics import (CONTENT_TYPE, Counter, Gauge, Histogram,
+                                     MetricsResource, Registry, Summary)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter('requests', 'Requests', ['route'])
+        counter.labels('a').inc()
+        counter.labels('a').inc(2)
+        counter.labels('b').inc()
+
+        samples = sorted(counter.samples(), key=lambda s: s[1]['route'])
+        self.assertEquals(samples, [('_total', {'route': 'a'}, 3),
+                                    ('_total', {'route': 'b'}, 1)])
+
+    def test_counter_without_labels(self):
+        counter = Counter('requests', 'Requests')
+        counter.inc()
+
+        self.assertEquals(counter.samples(), [('_total', {}, 1)])
+
+    def test_wrong_labels(self):
+        counter = Counter('requests', 'Requests', ['route'])
+
+        self.assertRaises(ValueError, counter.labels)
+        self.assertRaises(ValueError, counter.labels, 'a', 'b')
+
+    def test_gauge(self):
+        gauge = Gauge('in_flight', 'In flight', ['route'])
+        gauge.labels('a').inc()
+        gauge.labels('a').inc()
+        gauge.labels('a').inc(-1)
+        gauge.labels('b').set(7)
+
+        samples = sorted(gauge.samples(), key=lambda s: s[1]['route'])
+        self.assertEquals(samples, [('', {'route': 'a'}, 1),
+                                    ('', {'route': 'b'}, 7)])
+
+    def test_summary(self):
+        summary = Summary('latency', 'Latency')
+        summary.observe(0.5)
+        summary.observe(1.5)
+
+        self.assertEquals(sorted(summary.samples(), key=lambda s: s[0]),
+                          [('_count', {}, 2), ('_sum', {}, 2.0)])
+
+    def test_histogram(self):
+        histogram = Histogram('latency', 'Latency', ['route'],
+                              buckets=[1.0, 0.1])
+        histogram.labels('a').observe(0.05)
+        histogram.labels('a').observe(0.1)
+        histogram.labels('a').observe(5)
+
+        self.assertEquals(histogram.samples(), [
+            ('_bucket', {'route': 'a', 'le': 0.1}, 2),
+            ('_bucket', {'route': 'a', 'le': 1.0}, 2),
+            ('_bucket', {'route': 'a', 'le': float('inf')}, 3),
+            ('_count', {'route': 'a'}, 3),
+            ('_sum', {'route': 'a'}, 5.15),
+        ])
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_register(self):
+        counter = self.registry.register(Counter('requests', 'Requests'))
+
+        self.assertIs(self.registry.register(Counter('requests', 'Again')),
+                      counter)
+        self.assertRaises(ValueError, self.registry.register,
+                          Summary('requests', 'Requests'))
+        self.assertIs(self.registry.get('requests'), counter)
+
+    def test_snapshot(self):
+        counter = self.registry.register(
+            Counter('requests', 'Requests', ['route', 'code']))
+        counter.labels('servers', 200).inc()
+
+        self.assertEquals(self.registry.snapshot(),
+                          {'requests_total{code=200,route=servers}': 1})
+
+    def test_exposition(self):
+        counter = self.registry.register(
+            Counter('requests', 'Requests', ['route']))
+        counter.labels('/v2/"quoted"').inc()
+        histogram = self.registry.register(
+            Histogram('latency', 'Latency', buckets=[0.5]))
+        histogram.observe(0.25)
+
+        self.assertEquals(self.registry.exposition(), '\n'.join([
+            '# HELP latency Latency',
+            '# TYPE latency histogram',
+            'latency_bucket{le="0.5"} 1',
+            'latency_bucket{le="+Inf"} 1',
+            'latency_count 1',
+            'latency_sum 0.25',
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total{route="/v2/\\"quoted\\""} 1',
+            '',
+        ]))
+
+
+class TestMetricsResource(unittest.TestCase):
+    def test_on_get(self):
+        registry = Registry()
+        registry.register(Counter('requests', 'Requests')).inc()
+        resp = MagicMock()
+
+        MetricsResource(registry).on_get(MagicMock(), resp)
+
+        self.assertEquals(resp.status, 200)
+        self.assertEquals(resp.content_type, CONTENT_TYPE)
+        self.assertIn('requests_total 1', resp.body)
@@ -1,10 +1,13 @@
-from mock import MagicMock, patch, ANY
+from mock import MagicMock, ANY
 import unittest
 
+import requests
 import six
 
+from jumpgate.common import metrics
 from jumpgate.common.openstack import (
-    setup_responder, OpenStackResponder, OpenstackStream)
+    setup_responder, get_session, filter_headers, parse_cache_control,
+    CachedResponse, ResponseCache, OpenStackResponder, OpenstackStream)
 
 
 def make_response(status_code=200, body=None, content_type='application/json'):
@@ -39,6 +42,27 @@ class TestSetupResponder(unittest.TestCase):
             self.assertEquals(args[0], 'endpoint%s' % i)
             self.assertIsInstance(args[1], OpenStackResponder)
 
+    def test_setup_responder_shares_session(self):
+        app = MagicMock()
+        app.config = {'openstack': {'compute_endpoint': 'http://host:1/'}}
+        disp = MagicMock()
+        disp.get_unused_endpoints.return_value = ['endpoint0', 'endpoint1']
+        setup_responder(app, disp, 'compute')
+
+        responders = [args[1] for _, args, _ in disp.set_handler.mock_calls]
+        self.assertEquals(responders[0].session, get_session('http://host:1'))
+        self.assertEquals(responders[0].name, 'compute')
+
+
+class TestGetSession(unittest.TestCase):
+    def test_get_session(self):
+        session = get_session('http://127.0.0.1:9999')
+
+        self.assertIs(session, get_session('http://127.0.0.1:9999'))
+        self.assertIsNot(session, get_session('http://127.0.0.1:9998'))
+        adapter = session.get_adapter('http://127.0.0.1:9999')
+        self.assertEquals(adapter._pool_maxsize, 10)
+
 
 class TestOpenstackResponder(unittest.TestCase):
     def test_init(self):
@@ -47,11 +71,15 @@ class TestOpenstackResponder(unittest.TestCase):
 
         self.assertEquals(responder.mount, '/mount-point')
         self.assertEquals(responder.endpoint, 'http://127.0.0.1:1234/v2')
+        self.assertEquals(responder.name, 'http://127.0.0.1:1234/v2')
+        self.assertEquals(responder.timeout, (5.0, 600.0))
 
-    @patch('jumpgate.common.openstack.requests.request')
-    def test_standard_responder_get(self, request):
+    def test_standard_responder_get(self):
+        session = MagicMock()
+        request = session.request
         request.return_value = make_response()
-        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2')
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session)
         req, resp = MagicMock(), MagicMock()
         req.method = 'GET'
         req.relative_uri = '/path/to/resource'
@@ -61,19 +89,22 @@ class TestOpenstackResponder(unittest.TestCase):
             req.method,
             'http://127.0.0.1:1234/v2/path/to/resource',
             data=None,
-            headers=req.headers,
-            stream=True)
+            headers={},
+            stream=True,
+            timeout=(5.0, 600.0))
 
         self.assertEquals(resp.status, 200)
         self.assertEquals(resp.content_type, 'application/json')
-        self.assertEquals(resp.stream_len, '0')
+        self.assertEquals(resp.stream_len, 0)
         resp.set_headers.assert_called_with({})
         self.assertEquals(resp.stream.read(), '')
 
-    @patch('jumpgate.common.openstack.requests.request')
-    def test_standard_responder_post(self, request):
+    def test_standard_responder_post(self):
+        session = MagicMock()
+        request = session.request
         request.return_value = make_response(body='TEST BODY')
-        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2')
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session)
         req, resp = MagicMock(), MagicMock()
         req.method = 'POST'
         req.relative_uri = '/path/to/resource'
@@ -83,19 +114,23 @@ class TestOpenstackResponder(unittest.TestCase):
             req.method,
             'http://127.0.0.1:1234/v2/path/to/resource',
             data=ANY,
-            headers=req.headers,
-            stream=True)
+            headers={},
+            stream=True,
+            timeout=(5.0, 600.0))
 
         self.assertEquals(resp.status, 200)
         self.assertEquals(resp.content_type, 'application/json')
-        self.assertEquals(resp.stream_len, '10')
+        self.assertEquals(resp.stream_len, 10)
         resp.set_headers.assert_called_with({})
         self.assertEquals(resp.stream.read(), 'TEST BODY')
 
-    @patch('jumpgate.common.openstack.requests.request')
-    def test_standard_responder_with_mount(self, request):
+    def test_standard_responder_with_mount(self):
+        session = MagicMock()
+        request = session.request
+        request.return_value = make_response()
         responder = OpenStackResponder('/mount/point',
-                                       'http://127.0.0.1:1234/v2')
+                                       'http://127.0.0.1:1234/v2',
+                                       session=session)
         req, resp = MagicMock(), MagicMock()
         req.method = 'POST'
         req.relative_uri = '/mount/point/path/to/resource'
@@ -105,13 +140,16 @@ class TestOpenstackResponder(unittest.TestCase):
             req.method,
             'http://127.0.0.1:1234/v2/path/to/resource',
             data=ANY,
-            headers=req.headers,
-            stream=True)
+            headers={},
+            stream=True,
+            timeout=(5.0, 600.0))
 
-    @patch('jumpgate.common.openstack.requests.request')
-    def test_standard_responder_plain_text_hack(self, request):
+    def test_standard_responder_plain_text_hack(self):
+        session = MagicMock()
+        request = session.request
         request.return_value = make_response(content_type='text/html')
-        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2')
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session)
         req, resp = MagicMock(), MagicMock()
         req.method = 'GET'
         req.relative_uri = '/path/to/resource'
@@ -121,27 +159,264 @@ class TestOpenstackResponder(unittest.TestCase):
             req.method,
             'http://127.0.0.1:1234/v2/path/to/resource',
             data=None,
-            headers=req.headers,
-            stream=True)
+            headers={},
+            stream=True,
+            timeout=(5.0, 600.0))
 
         self.assertEquals(resp.status, 200)
         self.assertEquals(resp.content_type, 'text/plain; charset=UTF-8')
-        self.assertEquals(resp.stream_len, '0')
+        self.assertEquals(resp.stream_len, 0)
         resp.set_headers.assert_called_with({})
         self.assertEquals(resp.stream.read(), '')
 
+    def test_standard_responder_chunked(self):
+        session = MagicMock()
+        os_resp = make_response(body='CHUNKED BODY')
+        del os_resp.headers['Content-Length']
+        os_resp.headers['Transfer-Encoding'] = 'chunked'
+        os_resp.headers['X-Openstack-Request-Id'] = 'req-1'
+        session.request.return_value = os_resp
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session)
+        req, resp = MagicMock(), MagicMock()
+        req.method = 'PUT'
+        req.content_length = None
+        req.get_header.return_value = 'chunked'
+        req.headers = {'Host': 'jumpgate', 'Connection': 'keep-alive',
+                       'Transfer-Encoding': 'chunked', 'X-Auth-Token': 'T'}
+        req.relative_uri = '/path/to/resource'
+        responder.on_put(req, resp)
+
+        _, kwargs = session.request.call_args
+        self.assertEquals(kwargs['headers'], {'X-Auth-Token': 'T'})
+        self.assertIsInstance(kwargs['data'], OpenstackStream)
+        self.assertIsNone(kwargs['data'].size)
+
+        self.assertIsNone(resp.stream_len)
+        resp.set_headers.assert_called_with({'X-Openstack-Request-Id':
+                                             'req-1'})
+        self.assertEquals(resp.stream.read(), 'CHUNKED BODY')
+
+    def test_standard_responder_counters(self):
+        session = MagicMock()
+        session.request.return_value = make_response(status_code=503)
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session, name='counted')
+        req, resp = MagicMock(), MagicMock()
+        req.method = 'GET'
+        req.relative_uri = '/path/to/resource'
+        responder.on_get(req, resp)
+
+        stats = metrics.REGISTRY.snapshot()
+        self.assertEquals(
+            stats['jumpgate_upstream_requests_total{upstream=counted}'], 1)
+        self.assertEquals(
+            stats['jumpgate_upstream_errors_total{upstream=counted}'], 1)
+        self.assertEquals(
+            stats['jumpgate_upstream_latency_seconds_count'
+                  '{upstream=counted}'], 1)
+
+    def test_standard_responder_upstream_error(self):
+        session = MagicMock()
+        session.request.side_effect = requests.ConnectionError()
+        responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                       session=session, name='failing')
+        req, resp = MagicMock(), MagicMock()
+        req.method = 'GET'
+        req.relative_uri = '/path/to/resource'
+
+        self.assertRaises(requests.ConnectionError,
+                          responder.on_get, req, resp)
+        stats = metrics.REGISTRY.snapshot()
+        self.assertEquals(
+            stats['jumpgate_upstream_errors_total{upstream=failing}'], 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(1000, 100)
+        self.session = MagicMock()
+        self.responder = OpenStackResponder(None, 'http://127.0.0.1:1234/v2',
+                                            session=self.session,
+                                            name='cached', cache=self.cache)
+
+    def _request(self, method='GET', uri='/flavors', token='TOKEN',
+                 **headers):
+        req, resp = MagicMock(), MagicMock()
+        req.method = method
+        req.relative_uri = uri
+        headers['X-Auth-Token'] = token
+        req.headers = headers
+        req.get_header.side_effect = lambda h: dict(
+            (k.lower().replace('_', '-'), v)
+            for k, v in headers.items()).get(h.lower())
+        getattr(self.responder, 'on_' + method.lower())(req, resp)
+        return resp
+
+    def _upstream(self, body='{"flavors": []}', status_code=200, **headers):
+        os_resp = make_response(status_code=status_code, body=body)
+        os_resp.headers['Content-Length'] = str(len(body))
+        os_resp.raw.read = lambda size, **_: body
+        os_resp.headers.update(headers)
+        self.session.request.return_value = os_resp
+        return os_resp
+
+    def test_fresh_hit(self):
+        self._upstream(**{'Cache-Control': 'max-age=60'})
+        self._request()
+        resp = self._request()
+
+        self.assertEquals(self.session.request.call_count, 1)
+        self.assertEquals(resp.status, 200)
+        self.assertEquals(resp.stream, ['{"flavors": []}'])
+        self.assertEquals(resp.stream_len, 15)
+        self.assertEquals(self.cache.hit_ratio('cached'), 0.5)
+
+    def test_keyed_by_identity_and_query(self):
+        self._upstream(**{'Cache-Control': 'max-age=60'})
+        self._request()
+        self._request(token='OTHER')
+        self._request(uri='/flavors?limit=1')
+
+        self.assertEquals(self.session.request.call_count, 3)
+
+    def test_keyed_by_representation(self):
+        self._upstream(**{'Cache-Control': 'max-age=60',
+                          'Vary': 'Accept, Accept-Encoding'})
+        self._request(Accept='application/json')
+        self._request(Accept='application/xml')
+        self._request(Accept='application/json', Accept_Encoding='gzip')
+        self._request(Accept='application/json')
+
+        self.assertEquals(self.session.request.call_count, 3)
+
+    def test_vary_on_other_headers(self):
+        self._upstream(**{'Cache-Control': 'max-age=60',
+                          'Vary': 'Accept, User-Agent'})
+        self._request()
+        self._request()
+        self._upstream(**{'Cache-Control': 'max-age=60', 'Vary': '*'})
+        self._request(uri='/other')
+        self._request(uri='/other')
+
+        self.assertEquals(self.session.request.call_count, 4)
+        self.assertEquals(len(self.cache.entries), 0)
+
+    def test_revalidate(self):
+        self._upstream(ETag='"v1"')
+        self._request()
+        self._upstream(body='', status_code=304, **{'Cache-Control':
+                                                    'max-age=60'})
+        resp = self._request()
+
+        _, kwargs = self.session.request.call_args
+        self.assertEquals(kwargs['headers']['If-None-Match'], '"v1"')
+        self.assertEquals(resp.status, 200)
+        self.assertEquals(resp.stream, ['{"flavors": []}'])
+
+        # The 304 made the entry fresh again
+        self._request()
+        self.assertEquals(self.session.request.call_count, 2)
+
+    def test_not_cacheable(self):
+        self._upstream(**{'Cache-Control': 'no-store, max-age=60'})
+        self._request()
+        self._request()
+        self._upstream()
+        self._request(uri='/other')
+        self._request(uri='/other')
+        self._upstream(body='x' * 101, **{'Cache-Control': 'max-age=60'})
+        self._request(uri='/large')
+        self._request(uri='/large')
+
+        self.assertEquals(self.session.request.call_count, 6)
+        self.assertEquals(len(self.cache.entries), 0)
+
+    def test_head_uses_get_entry(self):
+        self._upstream(**{'Cache-Control': 'max-age=60'})
+        self._request()
+        resp = self._request(method='HEAD')
+
+        self.assertEquals(self.session.request.call_count, 1)
+        self.assertEquals(resp.status, 200)
+
+    def test_mutation_invalidates(self):
+        self._upstream(**{'Cache-Control': 'max-age=60'})
+        self._request(uri='/servers')
+        self._request(uri='/servers/123')
+        self._upstream(body='', status_code=204)
+        self._request(method='DELETE', uri='/servers/123')
+
+        self.assertEquals(len(self.cache.entries), 0)
+
+
+class TestCachedResponse(unittest.TestCase):
+    def test_freshness(self):
+        now = [100.0]
+        entry = CachedResponse(200, {'Cache-Control': 'max-age=10',
+                                     'ETag': '"abc"'}, 'body',
+                               clock=lambda: now[0])
+
+        self.assertTrue(entry.is_fresh())
+        self.assertEquals(entry.conditional_headers(),
+                          {'If-None-Match': '"abc"'})
+        now[0] += 10
+        self.assertFalse(entry.is_fresh())
+
+        entry.update({'Cache-Control': 'no-cache'})
+        self.assertFalse(entry.is_fresh())
+        self.assertEquals(entry.etag, '"abc"')
+
+    def test_parse_cache_control(self):
+        self.assertEquals(parse_cache_control('no-cache, max-age="30"'),
+                          {'no-cache': None, 'max-age': '30'})
+        self.assertEquals(parse_cache_control(None), {})
+
 
 class TestOpenstackStream(unittest.TestCase):
     def test_init(self):
         stream = MagicMock()
-        stream.__iter__ = MagicMock()
-        stream.__next__ = MagicMock()
-        stream.next = MagicMock()
-        os_stream = OpenstackStream(stream, size=1234)
+        os_stream = OpenstackStream(stream, size=1234, chunk_size=100)
 
         self.assertEquals(os_stream.size, 1234)
         self.assertEquals(os_stream.__len__(), 1234)
-        self.assertEquals(os_stream.read(), stream.read(size=None))
-        self.assertEquals(os_stream.__iter__(), stream.__iter__())
-        self.assertEquals(os_stream.__next__(), stream.__next__())
-        self.assertEquals(os_stream.next(), stream.__next__())
+        self.assertEquals(os_stream.chunk_size, 100)
+        self.assertEquals(os_stream.read(), stream.read(1234))
+
+    def test_unknown_size(self):
+        os_stream = OpenstackStream(six.StringIO('data'))
+
+        self.assertEquals(len(os_stream), 0)
+        self.assertTrue(os_stream)
+
+    def test_iter_fixed_chunks(self):
+        os_stream = OpenstackStream(six.StringIO('0123456789'),
+                                    chunk_size=4)
+
+        self.assertEquals(list(os_stream), ['0123', '4567', '89'])
+
+    def test_iter_stops_at_size(self):
+        os_stream = OpenstackStream(six.StringIO('0123456789'), size=6,
+                                    chunk_size=4)
+
+        self.assertEquals(list(os_stream), ['0123', '45'])
+
+
+class TestFilterHeaders(unittest.TestCase):
+    def test_filter_hop_by_hop(self):
+        headers = {'Connection': 'keep-alive, X-Private',
+                   'Keep-Alive': 'timeout=5',
+                   'Transfer-Encoding': 'chunked',
+                   'X-Private': 'secret',
+                   'X-Auth-Token': 'TOKEN',
+                   'Content-Type': 'application/json'}
+
+        self.assertEquals(filter_headers(headers),
+                          {'X-Auth-Token': 'TOKEN',
+                           'Content-Type': 'application/json'})
+
+    def test_filter_excluded(self):
+        headers = {'HOST': 'localhost', 'X-AUTH-TOKEN': 'TOKEN'}
+
+        self.assertEquals(filter_headers(headers, exclude=['Host']),
+                          {'X-AUTH-TOKEN': 'TOKEN'})
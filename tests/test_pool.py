@@ -0,0 +1,38 @@
+import threading
+import unittest
+
+from jumpgate.common.sl import pool
+
+
+class TestBranchPool(unittest.TestCase):
+    def test_bounded(self):
+        branches = pool.BranchPool(2)
+        done = threading.Semaphore(0)
+        for _ in range(5):
+            branches.submit(done.release)
+        for _ in range(5):
+            done.acquire()
+
+        self.assertEquals(len(branches.threads), 2)
+
+    def test_in_pool(self):
+        branches = pool.BranchPool(1)
+        result = []
+        done = threading.Event()
+
+        def task():
+            result.append(pool.in_pool())
+            done.set()
+
+        branches.submit(task)
+
+        self.assertTrue(done.wait(5))
+        self.assertEquals(result, [True])
+        self.assertFalse(pool.in_pool())
+
+    def test_recreated_after_fork(self):
+        current = pool.get_pool()
+        self.assertIs(pool.get_pool(), current)
+
+        current.pid = -1
+        self.assertIsNot(pool.get_pool(), current)
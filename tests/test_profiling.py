@@ -0,0 +1,173 @@
+import cProfile
+import json
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import profiling
+from jumpgate.common.exceptions import Forbidden, ResponseException
+from jumpgate.common.hooks.profile import start_profile, stop_profile
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def profile(func, *args):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    func(*args)
+    profiler.disable()
+    return profiler
+
+
+def _patched(store, sampler):
+    return patch.multiple(profiling, get_store=lambda: store,
+                          get_sampler=lambda: sampler)
+
+
+def make_req(params=None, body=None, is_admin=True):
+    req = MagicMock()
+    req.env = {'is_admin': is_admin}
+    params = params or {}
+    req.get_param.side_effect = params.get
+    if body is not None:
+        req.stream.read.return_value = body.encode()
+    return req
+
+
+class TestSampler(unittest.TestCase):
+    def test_route_pattern(self):
+        pattern = profiling.route_pattern('/compute/v2/{tenant_id}/servers')
+
+        self.assertTrue(pattern.match('/compute/v2/123/servers'))
+        self.assertTrue(pattern.match('/compute/v2/123/servers.json'))
+        self.assertFalse(pattern.match('/compute/v2/123/servers/detail'))
+        self.assertFalse(pattern.match('/compute/v2/1/2/servers'))
+
+    def test_off(self):
+        sampler = profiling.Sampler(0)
+
+        self.assertFalse(any(sampler.sample('/v2.0/tokens')
+                             for _ in range(10)))
+
+    def test_one_in_n(self):
+        sampler = profiling.Sampler(3)
+
+        self.assertEquals([sampler.sample('/v2.0/tokens') for _ in range(6)],
+                          [True, False, False, True, False, False])
+
+    def test_route_rates(self):
+        sampler = profiling.Sampler(0, {'/v2/{tenant_id}/servers': '2'})
+
+        self.assertEquals(
+            [sampler.sample('/v2/1/servers') for _ in range(4)],
+            [True, False, True, False])
+        self.assertFalse(sampler.sample('/v2/1/images'))
+
+
+class TestProfileStore(unittest.TestCase):
+    def setUp(self):
+        self.store = profiling.ProfileStore()
+
+    def test_per_route(self):
+        self.store.add('/a', profile(busy, 1000))
+        self.store.add('/a', profile(busy, 1000))
+        self.store.add('/b', profile(len, 'x'))
+
+        self.assertEquals(self.store.samples(), {'/a': 2, '/b': 1})
+        self.assertIn('busy', profiling.format_stats(self.store.stats('/a')))
+        self.assertNotIn('busy',
+                         profiling.format_stats(self.store.stats('/b')))
+        self.assertIn('busy', profiling.format_stats(self.store.stats()))
+        self.assertIsNone(self.store.stats('/c'))
+
+        self.store.clear()
+        self.assertIsNone(self.store.stats())
+
+    def test_collapsed_stacks(self):
+        self.store.add('/a', profile(busy, 100000))
+
+        lines = profiling.collapsed_stacks(self.store.stats()).splitlines()
+
+        self.assertTrue(lines)
+        for line in lines:
+            stack, spent = line.rsplit(' ', 1)
+            self.assertTrue(int(spent) > 0)
+        self.assertTrue(any('(busy)' in line for line in lines))
+
+
+class TestProfileHooks(unittest.TestCase):
+    def test_sampled(self):
+        store = profiling.ProfileStore()
+        sampler = profiling.Sampler(1)
+        req = MagicMock()
+        req.path = '/v2/1/servers'
+        req.env = {'jumpgate.route': '/v2/{tenant_id}/servers'}
+
+        with _patched(store, sampler):
+            start_profile(req, MagicMock(), {})
+            busy(1000)
+            stop_profile(req, MagicMock())
+
+        self.assertNotIn('jumpgate.profiler', req.env)
+        self.assertEquals(store.samples(), {'/v2/{tenant_id}/servers': 1})
+
+    def test_not_sampled(self):
+        req = MagicMock()
+        req.env = {}
+
+        with _patched(profiling.ProfileStore(), profiling.Sampler(0)):
+            start_profile(req, MagicMock(), {})
+            stop_profile(req, MagicMock())
+
+        self.assertEquals(req.env, {})
+
+
+class TestProfileResource(unittest.TestCase):
+    def setUp(self):
+        self.store = profiling.ProfileStore()
+        self.store.add('/a', profile(busy, 1000))
+        self.sampler = profiling.Sampler(0)
+        self.resource = profiling.ProfileResource(self.store, self.sampler)
+
+    def test_get(self):
+        resp = MagicMock()
+
+        self.resource.on_get(make_req({'route': '/a'}), resp)
+
+        self.assertEquals(resp.content_type, profiling.CONTENT_TYPE)
+        self.assertIn('busy', resp.body)
+
+    def test_get_collapsed(self):
+        resp = MagicMock()
+
+        self.resource.on_get(make_req({'format': 'collapsed'}), resp)
+
+        self.assertIn('(busy)', resp.body)
+
+    def test_get_invalid_format(self):
+        self.assertRaises(ResponseException, self.resource.on_get,
+                          make_req({'format': 'svg'}), MagicMock())
+
+    def test_put(self):
+        resp = MagicMock()
+
+        self.resource.on_put(make_req(body=json.dumps({'sample_rate': 5})),
+                             resp)
+
+        self.assertEquals(self.sampler.sample_rate, 5)
+        self.assertEquals(resp.body['profile']['samples'], {'/a': 1})
+
+    def test_delete(self):
+        self.resource.on_delete(make_req(), MagicMock())
+
+        self.assertIsNone(self.store.stats())
+
+    def test_admin_only(self):
+        req = make_req(is_admin=False)
+
+        self.assertRaises(Forbidden, self.resource.on_get, req, MagicMock())
+        self.assertRaises(Forbidden, self.resource.on_put, req, MagicMock())
+        self.assertRaises(Forbidden, self.resource.on_delete, req,
+                          MagicMock())
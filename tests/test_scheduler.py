@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+from jumpgate.common.exceptions import DeadlineExceeded
+from jumpgate.common.sl.scheduler import FairScheduler
+
+
+class TestFairScheduler(unittest.TestCase):
+    def queue_calls(self, scheduler, tenants):
+        """Queue a call for each tenant in order behind a held slot and
+        return the order they're granted in.
+        """
+        order = []
+        lock = threading.Lock()
+        threads = []
+        for tenant in tenants:
+            def call(tenant=tenant):
+                scheduler.acquire(tenant)
+                with lock:
+                    order.append(tenant)
+                scheduler.release()
+            thread = threading.Thread(target=call)
+            thread.start()
+            threads.append(thread)
+            # Wait for the call to be queued so the arrival order is fixed
+            while sum(scheduler.queued().values()) < len(threads):
+                time.sleep(0.001)
+        return order, threads
+
+    def test_free_slot(self):
+        scheduler = FairScheduler(2)
+
+        self.assertEquals(scheduler.acquire('a'), 0.0)
+        self.assertEquals(scheduler.acquire('a'), 0.0)
+        self.assertEquals(scheduler.in_flight, 2)
+
+        scheduler.release()
+        self.assertEquals(scheduler.in_flight, 1)
+
+    def test_round_robin(self):
+        scheduler = FairScheduler(1)
+        scheduler.acquire('busy')
+
+        order, threads = self.queue_calls(
+            scheduler, ['busy', 'busy', 'busy', 'other', 'another'])
+        scheduler.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEquals(order[:3], ['busy', 'other', 'another'])
+        self.assertEquals(scheduler.in_flight, 0)
+        self.assertEquals(scheduler.queued(), {})
+
+    def test_weights(self):
+        scheduler = FairScheduler(1, weights={'gold': 2})
+        scheduler.acquire('gold')
+
+        order, threads = self.queue_calls(
+            scheduler, ['gold'] * 4 + ['other'] * 2)
+        scheduler.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEquals(order, ['gold', 'gold', 'other', 'gold', 'gold',
+                                  'other'])
+
+    def test_deadline(self):
+        scheduler = FairScheduler(1)
+        scheduler.acquire('a')
+
+        self.assertRaises(DeadlineExceeded, scheduler.acquire, 'b',
+                          time.time() + 0.01)
+        self.assertEquals(scheduler.queued(), {})
+
+        scheduler.release()
+        self.assertEquals(scheduler.acquire('c'), 0.0)
@@ -0,0 +1,270 @@
+import signal
+import socket
+import threading
+import time
+import unittest
+from wsgiref.simple_server import make_server
+
+from mock import MagicMock, patch
+
+from jumpgate import server
+
+
+def echo_app(environ, start_response):
+    path = environ['PATH_INFO']
+    if path == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'one', b'two']
+    if path == '/error':
+        raise ValueError('boom')
+    if path == '/ioerror':
+        raise IOError('disk full')
+    if path == '/start':
+        start_response('200 OK', [('Content-Length', '1')])
+        return [b'1' if environ['jumpgate.request_start'] else b'0']
+    if path == '/ignore':
+        start_response('204 No Content', [('Content-Length', '0')])
+        return []
+
+    body = environ['wsgi.input'].read()
+    response = b''.join([environ['REQUEST_METHOD'].encode('ascii'), b' ',
+                         path.encode('ascii'), b' ', body])
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(response)))])
+    return [response]
+
+
+class TestThreadPoolWSGIServer(unittest.TestCase):
+    def setUp(self):
+        sock = server.make_socket('127.0.0.1', 0, reuse_port=False)
+        self.port = sock.getsockname()[1]
+        self.server = server.ThreadPoolWSGIServer(sock, echo_app, threads=2,
+                                                  keep_alive_timeout=2)
+        self.thread = threading.Thread(target=self.server.serve,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.sockets = []
+        self.pending = {}
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.server.stop()
+        self.thread.join(5)
+        self.server.drain(5)
+        self.server.server_close()
+
+    def connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.sockets.append(sock)
+        return sock
+
+    def read_response(self, sock):
+        # Pipelined responses may arrive together; keep what follows this one
+        data = self.pending.pop(sock, b'')
+        while b'\r\n\r\n' not in data:
+            received = sock.recv(4096)
+            if not received:
+                raise AssertionError('Connection closed after %r' % data)
+            data += received
+        head, body = data.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        headers = dict((k.lower(), v.strip()) for k, _, v in
+                       (line.partition(':') for line in lines[1:]))
+
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            while len(body) < length:
+                body += sock.recv(4096)
+            body, self.pending[sock] = body[:length], body[length:]
+        elif headers.get('transfer-encoding') == 'chunked':
+            while not body.endswith(b'0\r\n\r\n'):
+                body += sock.recv(4096)
+        else:
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                body += data
+        return lines[0], headers, body
+
+    def test_keep_alive(self):
+        sock = self.connect()
+        sock.sendall(b'POST /a HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello')
+        status, headers, body = self.read_response(sock)
+        self.assertEqual(status, 'HTTP/1.1 200 OK')
+        self.assertEqual(body, b'POST /a hello')
+
+        sock.sendall(b'GET /b HTTP/1.1\r\nConnection: close\r\n\r\n')
+        status, headers, body = self.read_response(sock)
+        self.assertEqual(body, b'GET /b ')
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(sock.recv(10), b'')
+
+    def test_request_start(self):
+        sock = self.connect()
+        for _ in range(2):
+            sock.sendall(b'GET /start HTTP/1.1\r\n\r\n')
+            status, headers, body = self.read_response(sock)
+            self.assertEqual(body, b'1')
+
+    def test_unread_body_skipped(self):
+        sock = self.connect()
+        sock.sendall(b'PUT /ignore HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc'
+                     b'GET /next HTTP/1.1\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[0],
+                         'HTTP/1.1 204 No Content')
+        self.assertEqual(self.read_response(sock)[2], b'GET /next ')
+
+    def test_chunked_request(self):
+        sock = self.connect()
+        sock.sendall(b'PUT /file HTTP/1.1\r\nTransfer-Encoding: chunked\r\n'
+                     b'\r\n5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n')
+
+        self.assertEqual(self.read_response(sock)[2],
+                         b'PUT /file hello world')
+
+    def test_chunked_response(self):
+        sock = self.connect()
+        sock.sendall(b'GET /stream HTTP/1.1\r\n\r\n')
+
+        status, headers, body = self.read_response(sock)
+
+        self.assertEqual(headers['transfer-encoding'], 'chunked')
+        self.assertEqual(body, b'3\r\none\r\n3\r\ntwo\r\n0\r\n\r\n')
+
+    def test_http10(self):
+        sock = self.connect()
+        sock.sendall(b'GET /stream HTTP/1.0\r\n\r\n')
+
+        status, headers, body = self.read_response(sock)
+
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(body, b'onetwo')
+
+    def test_application_error(self):
+        sock = self.connect()
+        sock.sendall(b'GET /error HTTP/1.1\r\n\r\n')
+
+        self.assertTrue(self.read_response(sock)[0].startswith(
+            'HTTP/1.1 500'))
+
+    def test_application_io_error(self):
+        sock = self.connect()
+        sock.sendall(b'GET /ioerror HTTP/1.1\r\n\r\n')
+
+        self.assertTrue(self.read_response(sock)[0].startswith(
+            'HTTP/1.1 500'))
+
+    def test_drain_busy(self):
+        release = threading.Event()
+
+        def blocking_app(environ, start_response):
+            release.wait(5)
+            start_response('204 No Content', [('Content-Length', '0')])
+            return []
+
+        sock = server.make_socket('127.0.0.1', 0, reuse_port=False)
+        busy = server.ThreadPoolWSGIServer(sock, blocking_app, threads=1)
+        busy.process_request(MagicMock(), ('127.0.0.1', 0))
+        busy.process_request(MagicMock(), ('127.0.0.1', 0))
+        try:
+            started = time.time()
+            busy.drain(0.2)
+            self.assertLess(time.time() - started, 2)
+        finally:
+            release.set()
+            busy.server_close()
+
+
+class TestSimpleRequestHandler(unittest.TestCase):
+    def test_request_start(self):
+        httpd = make_server('127.0.0.1', 0, echo_app,
+                            handler_class=server.SimpleRequestHandler)
+        self.addCleanup(httpd.server_close)
+        thread = threading.Thread(target=httpd.handle_request)
+        thread.start()
+
+        sock = socket.create_connection(('127.0.0.1', httpd.server_port),
+                                        timeout=5)
+        self.addCleanup(sock.close)
+        sock.sendall(b'GET /start HTTP/1.0\r\n\r\n')
+        thread.join(5)
+
+        self.assertTrue(sock.recv(4096).endswith(b'\r\n\r\n1'))
+
+
+class TestArbiter(unittest.TestCase):
+    def setUp(self):
+        self.app_factory = MagicMock()
+        self.arbiter = server.Arbiter(self.app_factory, MagicMock(),
+                                      workers=2)
+        self.pids = iter(range(100, 200))
+        self.fork = patch('os.fork', side_effect=lambda: next(self.pids))
+        self.fork.start()
+        self.kill = patch('os.kill')
+        self.kill.start()
+
+    def tearDown(self):
+        self.fork.stop()
+        self.kill.stop()
+
+    @patch('gc.collect')
+    def test_load_app(self, collect):
+        self.arbiter.load_app()
+
+        self.assertIs(self.arbiter.app, self.app_factory.return_value)
+        self.assertTrue(collect.called)
+
+    @patch('gc.collect')
+    @patch('gc.freeze', create=True)
+    @patch('gc.unfreeze', create=True)
+    def test_load_app_again(self, unfreeze, freeze, collect):
+        self.app_factory.side_effect = lambda: unfreeze.call_count
+        self.arbiter.load_app()
+        self.arbiter.load_app()
+
+        # The application replaced was unfrozen before the new one was made
+        self.assertEqual(self.arbiter.app, 2)
+        self.assertEqual(freeze.call_count, 2)
+
+    def test_spawn_workers(self):
+        self.arbiter.spawn_workers()
+
+        self.assertEqual(self.arbiter.workers, {100: 0, 101: 0})
+
+    @patch('gc.collect')
+    def test_reload(self, collect):
+        self.arbiter.spawn_workers()
+        self.arbiter.reload()
+
+        self.assertEqual(self.arbiter.workers,
+                         {100: None, 101: None, 102: 1, 103: 1})
+        self.assertEqual(self.app_factory.call_count, 1)
+
+    def test_reload_failure_keeps_workers(self):
+        self.arbiter.spawn_workers()
+        self.app_factory.side_effect = ValueError()
+        self.arbiter.reload()
+
+        self.assertEqual(self.arbiter.workers, {100: 0, 101: 0})
+
+    def test_scale(self):
+        self.arbiter.spawn_workers()
+        self.arbiter.handle_signal(signal.SIGTTIN)
+        self.assertEqual(sorted(self.arbiter.current_workers()),
+                         [100, 101, 102])
+
+        self.arbiter.handle_signal(signal.SIGTTOU)
+        self.assertEqual(sorted(self.arbiter.current_workers()), [101, 102])
+        self.assertEqual(self.arbiter.workers[100], None)
+
+    @patch('os.waitpid')
+    def test_reap_and_respawn(self, waitpid):
+        self.arbiter.spawn_workers()
+        waitpid.side_effect = [(100, 256), (0, 0)]
+        self.arbiter.reap_workers()
+        self.arbiter.spawn_workers()
+
+        self.assertEqual(sorted(self.arbiter.workers), [101, 102])
@@ -0,0 +1,844 @@
+import threading
+import time
+import unittest
+
+from mock import MagicMock, patch
+from SoftLayer import (BasicAuthentication, CCIManager, SoftLayerAPIError,
+                       TransportError)
+
+from jumpgate.common import tracing
+from jumpgate.common.cache import LRUCache
+from jumpgate.common.exceptions import DeadlineExceeded, ServiceUnavailable
+from jumpgate.common.sl.breaker import CLOSED, ServiceBreaker
+from jumpgate.common.sl.client import (
+    COALESCED_CALLS, GENERATION, HEDGED_CALLS, BreakerClient, CachingClient,
+    ClientWrapper, CoalescingClient, DeadlineClient, HedgeBudget,
+    HedgingClient, LatencyTracker, MemoizingClient, SchedulingClient,
+    SingleFlight, TenantCache, TracingClient, auth_key, fresh_reads,
+    find_wrapper, wrap_client)
+from jumpgate.common.sl.pool import BranchPool
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.auth = None
+        self.calls = []
+        self.last_calls = []
+        self.result = {'id': 1}
+
+    def call(self, service, method, *args, **kwargs):
+        self.calls.append((service, method, args, kwargs))
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class TestClientWrapper(unittest.TestCase):
+    def test_delegates(self):
+        client = FakeClient()
+        wrapper = ClientWrapper(client)
+
+        wrapper['Account'].getObject(mask='id')
+        wrapper.auth = 'auth'
+
+        self.assertEquals(client.calls,
+                          [('Account', 'getObject', (), {'mask': 'id'})])
+        self.assertEquals(client.auth, 'auth')
+        self.assertEquals(wrapper.last_calls, [])
+
+    def test_find_wrapper(self):
+        client = FakeClient()
+        memo = MemoizingClient(client)
+        wrapper = ClientWrapper(memo)
+
+        self.assertIs(find_wrapper(wrapper, MemoizingClient), memo)
+        self.assertIsNone(find_wrapper(client, MemoizingClient))
+
+
+class TestMemoizingClient(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.memo = MemoizingClient(self.client)
+
+    def test_reuses_reads(self):
+        first = self.memo['Virtual_Guest'].getObject(id=1, mask='id')
+        second = self.memo['Virtual_Guest'].getObject(id=1, mask='id')
+
+        self.assertEquals(first, second)
+        self.assertEquals(len(self.client.calls), 1)
+        self.assertEquals(self.client.last_calls[0][0],
+                          'Virtual_Guest.getObject [memoized]')
+
+    def test_returns_copies(self):
+        self.memo['Virtual_Guest'].getObject(id=1)['id'] = 2
+
+        self.assertEquals(self.memo['Virtual_Guest'].getObject(id=1),
+                          {'id': 1})
+
+    def test_distinct_arguments(self):
+        vg = self.memo['Virtual_Guest']
+        vg.getObject(id=1)
+        vg.getObject(id=2)
+        vg.getObject(id=1, mask='id')
+        vg.getObject(id=1, filter={'a': {'operation': 1}})
+        vg.getObject(id=1, limit=1)
+        self.memo['Account'].getObject(id=1)
+
+        self.assertEquals(len(self.client.calls), 6)
+
+    def test_mutation_invalidates(self):
+        vg = self.memo['Virtual_Guest']
+        vg.getObject(id=1)
+        vg.getObject(id=2)
+        vg.editObject({'hostname': 'new'}, id=1)
+        vg.getObject(id=1)
+        vg.getObject(id=2)
+
+        self.assertEquals([c[1] for c in self.client.calls],
+                          ['getObject', 'getObject', 'editObject',
+                           'getObject', 'getObject'])
+
+    def test_mutation_invalidates_other_services(self):
+        self.memo['Account'].getVirtualGuests()
+        self.memo['Virtual_Guest'].createObject({})
+        self.memo['Account'].getVirtualGuests()
+
+        self.assertEquals([c[1] for c in self.client.calls],
+                          ['getVirtualGuests', 'createObject',
+                           'getVirtualGuests'])
+
+    def test_mutation_invalidates_collections(self):
+        acct = self.memo['Account']
+        acct.getVirtualGuests()
+        acct.createObject({})
+        acct.getVirtualGuests()
+
+        self.assertEquals(len(self.client.calls), 3)
+
+    def test_mutations_not_memoized(self):
+        self.memo['Virtual_Guest'].pause(id=1)
+        self.memo['Virtual_Guest'].pause(id=1)
+
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_errors_not_memoized(self):
+        self.client.result = ValueError()
+        self.assertRaises(ValueError,
+                          self.memo['Virtual_Guest'].getObject, id=1)
+
+        self.client.result = {'id': 1}
+        self.memo['Virtual_Guest'].getObject(id=1)
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_fresh_reads(self):
+        vg = self.memo['Virtual_Guest']
+        vg.getObject(id=1)
+
+        self.client.result = {'id': 1, 'state': 'new'}
+        with fresh_reads(self.memo):
+            vg.getObject(id=1)
+            vg.getObject(id=1)
+
+        self.assertEquals(vg.getObject(id=1), {'id': 1, 'state': 'new'})
+        self.assertEquals(len(self.client.calls), 3)
+        self.assertTrue(self.memo.enabled)
+
+    def test_fresh_reads_unwrapped(self):
+        with fresh_reads(self.client) as client:
+            self.assertIs(client, self.client)
+
+    def test_manager(self):
+        cci = CCIManager(self.memo)
+        cci.get_instance(1)
+        cci.get_instance(1)
+
+        self.assertEquals(len(self.client.calls), 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def slow_call(self, result):
+        def call():
+            self.started.set()
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return call
+
+    def run_follower(self, results):
+        def follow():
+            try:
+                results.append(self.flights.do('key', lambda: 'own call'))
+            except Exception as e:
+                results.append(e)
+        thread = threading.Thread(target=follow)
+        thread.start()
+        return thread
+
+    def wait_for_waiters(self, count):
+        for _ in range(500):
+            if self.flights._flights['key'].waiters == count:
+                return
+            threading.Event().wait(0.01)
+
+    def test_shares_result(self):
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.flights.do('key', self.slow_call({'id': 1}))))
+        leader.start()
+        self.started.wait(5)
+
+        followers = [self.run_follower(results) for _ in range(3)]
+        self.wait_for_waiters(3)
+        self.release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEquals(sorted(shared for _, shared in results),
+                          [False, True, True, True])
+        self.assertTrue(all(r == {'id': 1} for r, _ in results))
+        self.assertEquals(len(self.flights), 0)
+
+    def test_shares_errors(self):
+        results = []
+        error = ValueError('boom')
+        leader = threading.Thread(target=lambda: self.assertRaises(
+            ValueError, self.flights.do, 'key', self.slow_call(error)))
+        leader.start()
+        self.started.wait(5)
+
+        follower = self.run_follower(results)
+        self.wait_for_waiters(1)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEquals(results, [error])
+
+    def test_leader_deadline_not_shared(self):
+        results = []
+        leader = threading.Thread(target=lambda: self.assertRaises(
+            DeadlineExceeded, self.flights.do, 'key',
+            self.slow_call(DeadlineExceeded())))
+        leader.start()
+        self.started.wait(5)
+
+        follower = self.run_follower(results)
+        self.wait_for_waiters(1)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEquals(results, [('own call', False)])
+        self.assertEquals(len(self.flights), 0)
+
+    def test_leader_interrupted(self):
+        results = []
+
+        def interrupted():
+            self.started.set()
+            self.release.wait(5)
+            raise KeyboardInterrupt()
+
+        def lead():
+            try:
+                self.flights.do('key', interrupted)
+            except KeyboardInterrupt:
+                pass
+        leader = threading.Thread(target=lead)
+        leader.start()
+        self.started.wait(5)
+
+        follower = self.run_follower(results)
+        self.wait_for_waiters(1)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertFalse(follower.is_alive())
+        self.assertEquals(results, [('own call', False)])
+
+    def test_waiter_deadline(self):
+        leader = threading.Thread(target=lambda: self.flights.do(
+            'key', self.slow_call(1)))
+        leader.start()
+        self.started.wait(5)
+
+        self.assertRaises(DeadlineExceeded, self.flights.do, 'key',
+                          lambda: 'own call', deadline=time.time() + 0.05)
+        self.assertEquals(self.flights._flights['key'].waiters, 0)
+        self.release.set()
+        leader.join(5)
+
+    def test_sequential_calls_not_shared(self):
+        self.assertEquals(self.flights.do('key', lambda: 1), (1, False))
+        self.assertEquals(self.flights.do('key', lambda: 2), (2, False))
+
+
+class TestCoalescingClient(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.client.auth = BasicAuthentication('user', 'key')
+        self.flights = MagicMock()
+        self.flights.do.side_effect = \
+            lambda key, func, deadline: (func(), True)
+        self.coalescing = CoalescingClient(self.client, self.flights)
+
+    def test_coalesces_reads(self):
+        before = COALESCED_CALLS.labels('Account.getSubnets').count
+        self.coalescing['Account'].getSubnets(mask='id')
+
+        key = self.flights.do.call_args[0][0]
+        self.assertEquals(key[0], auth_key(self.client.auth))
+        self.assertEquals(COALESCED_CALLS.labels('Account.getSubnets').count,
+                          before + 1)
+        self.assertEquals(self.client.last_calls[0][0],
+                          'Account.getSubnets [coalesced]')
+
+    def test_credentials_in_key(self):
+        self.coalescing['Account'].getSubnets()
+        self.client.auth = BasicAuthentication('other', 'key')
+        self.coalescing['Account'].getSubnets()
+
+        keys = [c[0][0] for c in self.flights.do.call_args_list]
+        self.assertNotEquals(keys[0], keys[1])
+        self.assertEquals(keys[0][2], keys[1][2])
+
+    def test_skips_mutations_and_anonymous(self):
+        self.coalescing['Virtual_Guest'].pause(id=1)
+        self.client.auth = None
+        self.coalescing['Account'].getSubnets()
+
+        self.assertFalse(self.flights.do.called)
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_opt_out(self):
+        with fresh_reads(self.coalescing):
+            self.coalescing['Account'].getSubnets()
+
+        self.assertFalse(self.flights.do.called)
+        self.assertTrue(self.coalescing.enabled)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachingClient(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TenantCache(1024, 2, clock=self.clock)
+        self.client = FakeClient()
+        self.client.auth = BasicAuthentication('user', 'key')
+        self.caching = self.new_client('1234')
+
+    def new_client(self, tenant_id, client=None):
+        return CachingClient(client or self.client, tenant_id=tenant_id,
+                             cache=self.cache,
+                             policies={'Account.getSubnets': 60})
+
+    def test_caches_reads(self):
+        self.caching['Account'].getSubnets(mask='id')
+        result = self.caching['Account'].getSubnets(mask='id')
+
+        self.assertEquals(result, {'id': 1})
+        self.assertEquals(len(self.client.calls), 1)
+        self.assertEquals(self.client.last_calls[0][0],
+                          'Account.getSubnets [cached]')
+
+        # Across requests for the same tenant too
+        self.new_client('1234')['Account'].getSubnets(mask='id')
+        self.assertEquals(len(self.client.calls), 1)
+
+    def test_ttl(self):
+        self.caching['Account'].getSubnets()
+        self.clock.now += 61
+        self.caching['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_only_listed_methods(self):
+        self.caching['Account'].getVirtualGuests()
+        self.caching['Account'].getVirtualGuests()
+
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_tenant_isolation(self):
+        self.caching['Account'].getSubnets()
+        self.new_client('5678')['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_credential_isolation(self):
+        self.caching['Account'].getSubnets()
+        other = FakeClient()
+        other.auth = BasicAuthentication('other', 'key')
+        self.new_client('1234', other)['Account'].getSubnets()
+
+        self.assertEquals(len(other.calls), 1)
+
+    def test_mutation_invalidates_tenant(self):
+        self.caching['Account'].getSubnets()
+        self.new_client('5678')['Account'].getSubnets()
+        self.caching['Virtual_Guest'].deleteObject(id=1)
+        self.caching['Account'].getSubnets()
+        self.new_client('5678')['Account'].getSubnets()
+
+        self.assertEquals([c[1] for c in self.client.calls],
+                          ['getSubnets', 'getSubnets', 'deleteObject',
+                           'getSubnets'])
+
+    @patch('jumpgate.common.sl.client.invalidation.publish')
+    def test_mutation_publishes(self, publish):
+        self.caching['Security_Ssh_Key'].createObject({})
+
+        publish.assert_called_once_with('softlayer_calls', '1234',
+                                        ['Account.getSshKeys'])
+
+    def test_failed_mutation_invalidates(self):
+        self.caching['Account'].getSubnets()
+        self.client.result = ValueError()
+        self.assertRaises(ValueError,
+                          self.caching['Virtual_Guest'].createObject, {})
+
+        self.client.result = {'id': 1}
+        self.caching['Account'].getSubnets()
+        self.assertEquals(len(self.client.calls), 3)
+
+    def test_fresh_reads_refresh(self):
+        self.caching['Account'].getSubnets()
+        self.client.result = {'id': 2}
+        with fresh_reads(self.caching):
+            self.caching['Account'].getSubnets()
+
+        self.assertEquals(self.caching['Account'].getSubnets(), {'id': 2})
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_tenant_budget(self):
+        self.client.result = 'x' * 600
+        self.caching['Account'].getSubnets(mask='a')
+        self.caching['Account'].getSubnets(mask='b')
+        self.caching['Account'].getSubnets(mask='a')
+
+        self.assertEquals(len(self.client.calls), 3)
+
+    def test_shared_store(self):
+        self.cache = TenantCache(1024, 2, shared=LRUCache(1024))
+        self.caching = self.new_client('1234')
+        self.caching['Account'].getSubnets()
+        self.new_client('1234')['Account'].getSubnets()
+        self.new_client('5678')['Account'].getSubnets()
+        self.caching['Network_Subnet'].editObject({}, id=1)
+        self.new_client('5678')['Account'].getSubnets()
+        self.caching['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 4)
+
+    def test_shared_invalidation_without_scan(self):
+        shared = LRUCache(1024)
+        shared.invalidate = MagicMock()
+        self.cache = TenantCache(1024, 2, shared=shared)
+        self.caching = self.new_client('1234')
+        self.caching['Account'].getSubnets()
+        self.caching['Network_Subnet'].editObject({}, id=1)
+        self.caching['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 3)
+        self.assertFalse(shared.invalidate.called)
+
+    def test_shared_generation_evicted(self):
+        shared = LRUCache(1024)
+        self.cache = TenantCache(1024, 2, shared=shared)
+        self.caching = self.new_client('1234')
+        self.caching['Account'].getSubnets()
+        shared.delete(('1234', (GENERATION, 'Account.getSubnets')))
+        self.caching['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 2)
+
+    def test_max_tenants(self):
+        for tenant_id in ['1', '2', '3', '1']:
+            self.new_client(tenant_id)['Account'].getSubnets()
+
+        self.assertEquals(len(self.client.calls), 4)
+
+
+class TestTracingClient(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.root = tracing.Trace().start('root')
+
+    def test_span(self):
+        with tracing.activate(self.root):
+            TracingClient(self.client)['Virtual_Guest'].getObject(
+                id=1, mask='id,hostname')
+
+        span = self.root.trace.spans[1]
+        self.assertEquals(span.name, 'softlayer')
+        self.assertEquals(span.attributes, {
+            'service': 'Virtual_Guest', 'method': 'getObject',
+            'mask_size': len('id,hostname'), 'bytes': len('{"id": 1}')})
+
+    def test_untraced(self):
+        TracingClient(self.client)['Account'].getObject()
+
+        self.assertEquals(len(self.client.calls), 1)
+        self.assertEquals(len(self.root.trace.spans), 1)
+
+    def test_cache_lookups(self):
+        memo = MemoizingClient(self.client)
+        with tracing.activate(self.root):
+            memo['Account'].getObject()
+            memo['Account'].getObject()
+
+        hits = [span.attributes['hit'] for span in self.root.trace.spans
+                if span.name == 'cache']
+        self.assertEquals(hits, [False, True])
+
+
+class TestBreakerClient(unittest.TestCase):
+    def setUp(self):
+        self.breaker = MagicMock()
+        get_breaker = patch('jumpgate.common.sl.client.get_breaker',
+                            return_value=self.breaker)
+        self.get_breaker = get_breaker.start()
+        self.addCleanup(get_breaker.stop)
+
+    def test_success(self):
+        client = FakeClient()
+
+        BreakerClient(client)['SoftLayer_Account'].getObject()
+
+        self.get_breaker.assert_called_once_with('Account')
+        self.assertTrue(self.breaker.acquire.called)
+        self.assertFalse(self.breaker.release.call_args[0][1])
+
+    def test_failure(self):
+        client = FakeClient()
+        client.result = TransportError(0, 'Connection refused')
+
+        self.assertRaises(TransportError,
+                          BreakerClient(client)['Account'].getObject)
+        self.assertTrue(self.breaker.release.call_args[0][1])
+
+    def test_application_error(self):
+        client = FakeClient()
+        client.result = SoftLayerAPIError('SoftLayer_Exception_NotFound', '')
+
+        self.assertRaises(SoftLayerAPIError,
+                          BreakerClient(client)['Account'].getObject)
+        self.assertFalse(self.breaker.release.call_args[0][1])
+
+    def test_deadline_exceeded(self):
+        client = FakeClient()
+        client.result = DeadlineExceeded()
+
+        self.assertRaises(DeadlineExceeded,
+                          BreakerClient(client)['Account'].getObject)
+        self.assertFalse(self.breaker.release.call_args[1]['counted'])
+
+    @patch('time.time', return_value=1000.49)
+    def test_own_deadline_timeouts(self, _):
+        self.get_breaker.return_value = ServiceBreaker('Account', window=4)
+        client = FakeClient()
+        client.result = TransportError(0, 'Read timed out')
+        tiny_deadlines = BreakerClient(DeadlineClient(client, 1000.5))
+
+        for _ in range(10):
+            self.assertRaises(DeadlineExceeded,
+                              tiny_deadlines['Account'].getObject)
+
+        # Other tenants still get through
+        client.result = {'id': 1}
+        self.assertEquals(BreakerClient(client)['Account'].getObject(),
+                          {'id': 1})
+        self.assertEquals(self.get_breaker.return_value.state, CLOSED)
+
+    def test_shed(self):
+        client = FakeClient()
+        self.breaker.acquire.side_effect = ServiceUnavailable()
+
+        self.assertRaises(ServiceUnavailable,
+                          BreakerClient(client)['Account'].getObject)
+        self.assertEquals(client.calls, [])
+        self.assertFalse(self.breaker.release.called)
+
+
+class TestSchedulingClient(unittest.TestCase):
+    def test_call(self):
+        client = FakeClient()
+        scheduler = MagicMock()
+        scheduler.acquire.return_value = 0.0
+        wrapper = SchedulingClient(client, tenant_id=1234, deadline=1000.0,
+                                   scheduler=scheduler)
+
+        wrapper['Account'].getObject()
+
+        scheduler.acquire.assert_called_once_with('1234', 1000.0)
+        self.assertTrue(scheduler.release.called)
+        self.assertEquals(client.last_calls, [])
+
+    def test_queued(self):
+        client = FakeClient()
+        client.result = TransportError(0, 'Connection refused')
+        scheduler = MagicMock()
+        scheduler.acquire.return_value = 0.5
+        wrapper = SchedulingClient(client, scheduler=scheduler)
+
+        self.assertRaises(TransportError, wrapper['Account'].getObject)
+
+        self.assertEquals([c[0] for c in client.last_calls],
+                          ['[queued] Account.getObject'])
+        self.assertEquals(client.last_calls[0][2], 0.5)
+        self.assertTrue(scheduler.release.called)
+
+
+class TimeoutClient(FakeClient):
+    def __init__(self):
+        super(TimeoutClient, self).__init__()
+        self.timeout = None
+        self.timeouts = []
+
+    def call(self, service, method, *args, **kwargs):
+        self.timeouts.append(self.timeout)
+        return super(TimeoutClient, self).call(service, method, *args,
+                                               **kwargs)
+
+
+class TestDeadlineClient(unittest.TestCase):
+    @patch('time.time', return_value=1000.0)
+    def test_timeout(self, _):
+        client = TimeoutClient()
+        wrapper = DeadlineClient(client, 1002.5)
+
+        wrapper['Account'].getObject()
+
+        self.assertEquals(client.timeouts, [2.5])
+        self.assertEquals(len(client.calls), 1)
+        # Branches of a fanned out request share the client
+        self.assertIsNone(client.timeout)
+
+    @patch('time.time', return_value=1000.0)
+    def test_timeout_through_wrappers(self, _):
+        client = TimeoutClient()
+        inner = ClientWrapper(client)
+        wrapper = DeadlineClient(inner, 1002.5)
+
+        wrapper['Account'].getObject()
+
+        self.assertEquals(client.timeouts, [2.5])
+        self.assertIs(inner.client, client)
+
+    @patch('time.time', return_value=1000.0)
+    def test_timeout_per_call(self, _):
+        client = TimeoutClient()
+
+        DeadlineClient(client, 1002.0)['Account'].getObject()
+        DeadlineClient(client, 1005.0)['Account'].getObject()
+
+        self.assertEquals(client.timeouts, [2.0, 5.0])
+
+    @patch('time.time', return_value=1000.0)
+    def test_expired(self, _):
+        client = FakeClient()
+        wrapper = DeadlineClient(client, 1000.0)
+
+        self.assertRaises(DeadlineExceeded, wrapper['Account'].getObject)
+        self.assertEquals(client.calls, [])
+
+    @patch('time.time')
+    def test_timed_out_call(self, time):
+        client = FakeClient()
+        client.result = TransportError(0, 'Read timed out')
+        wrapper = DeadlineClient(client, 1002.0)
+
+        time.return_value = 1001.0
+        self.assertRaises(TransportError, wrapper['Account'].getObject)
+
+        time.side_effect = [1001.0, 1002.0]
+        self.assertRaises(DeadlineExceeded, wrapper['Account'].getObject)
+
+        # Timeouts fire around the deadline, not always after it
+        time.side_effect = [1001.0, 1001.99]
+        self.assertRaises(DeadlineExceeded, wrapper['Account'].getObject)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for i in range(1, 101):
+            tracker.observe('Account.getObject', i / 100.0)
+
+        self.assertEquals(tracker.percentile('Account.getObject', 95), 0.95)
+        self.assertEquals(tracker.percentile('Account.getObject', 50), 0.5)
+
+    def test_not_enough_samples(self):
+        tracker = LatencyTracker(min_samples=10)
+        tracker.observe('Account.getObject', 1.0)
+
+        self.assertIsNone(tracker.percentile('Account.getObject', 95))
+        self.assertIsNone(tracker.percentile('Account.getSubnets', 95))
+
+    def test_window(self):
+        tracker = LatencyTracker(window=10, min_samples=1)
+        for i in range(20):
+            tracker.observe('Account.getObject', i)
+
+        self.assertEquals(tracker.percentile('Account.getObject', 0), 10)
+
+
+class TestHedgeBudget(unittest.TestCase):
+    def test_budget(self):
+        budget = HedgeBudget(0.5, burst=1)
+
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+        budget.earn()
+        self.assertFalse(budget.spend())
+        budget.earn()
+        self.assertTrue(budget.spend())
+
+
+class SlowClient(FakeClient):
+    """Answers each call after the delay popped from delays."""
+
+    def __init__(self, delays):
+        super(SlowClient, self).__init__()
+        self.delays = delays
+        self.lock = threading.Lock()
+
+    def call(self, service, method, *args, **kwargs):
+        with self.lock:
+            delay = self.delays.pop(0)
+            self.calls.append((service, method, args, kwargs))
+            result = {'attempt': len(self.calls)}
+        time.sleep(delay)
+        return result
+
+
+class TestHedgingClient(unittest.TestCase):
+    def setUp(self):
+        self.latencies = LatencyTracker(min_samples=1)
+        self.latencies.observe('Account.getObject', 0.01)
+        self.budget = HedgeBudget(1.0)
+        self.pool = BranchPool(4)
+
+    def hedging(self, client, **kwargs):
+        return HedgingClient(client, percentiles={'Account.getObject': 95},
+                             latencies=self.latencies, budget=self.budget,
+                             pool=self.pool, **kwargs)
+
+    def test_fast_call(self):
+        client = SlowClient([0])
+
+        result = self.hedging(client)['Account'].getObject()
+
+        self.assertEquals(result, {'attempt': 1})
+        self.assertEquals(len(client.calls), 1)
+
+    def test_hedged(self):
+        client = SlowClient([1, 0])
+        before = HEDGED_CALLS.labels('Account.getObject', 'hedge').count
+
+        result = self.hedging(client)['Account'].getObject(mask='id')
+
+        self.assertEquals(result, {'attempt': 2})
+        self.assertEquals([c[:2] for c in client.calls],
+                          [('Account', 'getObject')] * 2)
+        self.assertEquals(
+            HEDGED_CALLS.labels('Account.getObject', 'hedge').count,
+            before + 1)
+        self.assertIn('Account.getObject [hedged]',
+                      [c[0] for c in client.last_calls])
+
+    def test_budget_spent(self):
+        self.budget = HedgeBudget(0.0, burst=0.0)
+        client = SlowClient([0.05])
+
+        result = self.hedging(client)['Account'].getObject()
+
+        self.assertEquals(result, {'attempt': 1})
+        self.assertEquals(len(client.calls), 1)
+
+    def test_not_hedged(self):
+        client = FakeClient()
+        wrapper = self.hedging(client)
+
+        wrapper['Account'].getSubnets()
+        wrapper['Account'].editObject()
+
+        self.assertEquals(len(client.calls), 2)
+
+    def test_learns_latency(self):
+        self.latencies = LatencyTracker(min_samples=1)
+        client = FakeClient()
+
+        self.hedging(client)['Account'].getObject()
+
+        self.assertIsNotNone(
+            self.latencies.percentile('Account.getObject', 95))
+
+    def test_error(self):
+        client = FakeClient()
+        client.result = SoftLayerAPIError('SoftLayer_Exception', 'failed')
+
+        self.assertRaises(SoftLayerAPIError,
+                          self.hedging(client)['Account'].getObject)
+
+
+class TestWrapClient(unittest.TestCase):
+    def test_wrap_client(self):
+        client = MagicMock()
+        wrapped = wrap_client(client)
+
+        self.assertIsInstance(wrapped, MemoizingClient)
+        self.assertIsInstance(wrapped.client, CoalescingClient)
+        self.assertIsInstance(wrapped.client.client, SchedulingClient)
+        self.assertIs(wrapped.client.client.client, client)
+
+    def test_circuit_breaker(self):
+        client = MagicMock()
+        conf = {'tracing': {'enabled': False},
+                'softlayer': {'circuit_breaker': True,
+                              'fair_scheduling': False, 'hedge_calls': False,
+                              'coalesce_calls': False, 'cache_calls': False,
+                              'memoize_calls': False}}
+        with patch('jumpgate.common.sl.client.CONF', conf):
+            wrapped = wrap_client(client, deadline=1000.0)
+
+        self.assertIsInstance(wrapped, BreakerClient)
+        self.assertIsInstance(wrapped.client, DeadlineClient)
+        self.assertIs(wrapped.client.client, client)
+
+    def test_tracing(self):
+        client = MagicMock()
+        conf = {'tracing': {'enabled': True},
+                'softlayer': {'circuit_breaker': False,
+                              'fair_scheduling': False, 'hedge_calls': False,
+                              'coalesce_calls': False, 'cache_calls': False,
+                              'memoize_calls': False}}
+        with patch('jumpgate.common.sl.client.CONF', conf):
+            wrapped = wrap_client(client)
+
+        self.assertIs(find_wrapper(wrapped, TracingClient).client, client)
+
+    def test_deadline(self):
+        client = MagicMock()
+        wrapped = wrap_client(client, tenant_id='1234', deadline=1000.0)
+
+        scheduling = find_wrapper(wrapped, SchedulingClient)
+        self.assertEquals(scheduling.deadline, 1000.0)
+        self.assertEquals(scheduling.tenant, '1234')
+        self.assertEquals(find_wrapper(wrapped, DeadlineClient).deadline,
+                          1000.0)
+        self.assertEquals(find_wrapper(wrapped, CoalescingClient).deadline,
+                          1000.0)
@@ -0,0 +1,91 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import slowlog
+
+ROUTE = '/baremetal/v1/nodes'
+
+
+def make_req():
+    req = MagicMock()
+    req.method = 'GET'
+    req.path = '/baremetal/v1/nodes'
+    req.env = {'REQUEST_ID': 'req-1'}
+    return req
+
+
+def make_calls(*names):
+    return [(name, 1000.0 + i * 0.1, 0.1) for i, name in enumerate(names)]
+
+
+class TestRepeatedCalls(unittest.TestCase):
+    def test_repeated(self):
+        calls = make_calls(*(['Hardware_Server.getPowerState'] * 3 +
+                             ['Account.getHardware'] +
+                             ['[fanout] branch'] * 3 +
+                             ['Hardware_Server.getObject'] * 4))
+
+        self.assertEquals(slowlog.repeated_calls(calls, 3),
+                          [('Hardware_Server.getObject', 4),
+                           ('Hardware_Server.getPowerState', 3)])
+        self.assertEquals(slowlog.repeated_calls(calls, 0), [])
+
+
+@patch('jumpgate.common.slowlog.LOG')
+class TestSlowRequestLog(unittest.TestCase):
+    def test_fast(self, log):
+        slowlog.SlowRequestLog(1.0).record(
+            make_req(), ROUTE, 1000.0, 0.5, make_calls('Account.getHardware'))
+
+        self.assertFalse(log.warning.called)
+
+    def test_slow(self, log):
+        calls = make_calls('Account.getHardware',
+                           '[queue] Hardware_Server.getPowerState',
+                           *['Hardware_Server.getPowerState'] * 5)
+
+        slowlog.SlowRequestLog(1.0).record(make_req(), ROUTE, 1000.0, 1.5,
+                                           calls)
+
+        message = log.warning.call_args[0][0] % log.warning.call_args[0][1:]
+        self.assertIn('(/baremetal/v1/nodes) took 1.500s, over 1.000s',
+                      message)
+        self.assertIn('repeated calls: Hardware_Server.getPowerState x5',
+                      message)
+        self.assertIn('6 SL calls in 0.600s', message)
+        self.assertIn('\n    +0.100s 0.100s [queue] ', message)
+        self.assertEquals(message.count('\n'), len(calls))
+        self.assertEquals(slowlog.REPEATED_CALLS.labels(
+            ROUTE, 'Hardware_Server.getPowerState').count, 1)
+
+    def test_route_threshold(self, log):
+        log_ = slowlog.SlowRequestLog(1.0, {ROUTE: '0', '/other': '5'})
+
+        log_.record(make_req(), ROUTE, 1000.0, 10.0, [])
+        log_.record(make_req(), '/other', 1000.0, 4.0, [])
+        self.assertFalse(log.warning.called)
+
+        log_.record(make_req(), '/other', 1000.0, 6.0, [])
+        self.assertTrue(log.warning.called)
+
+    def test_over_budget(self, log):
+        log_ = slowlog.SlowRequestLog(0, call_budgets={ROUTE: '1'})
+
+        log_.record(make_req(), ROUTE, 1000.0, 0.1,
+                    make_calls('Account.getHardware', '[fanout] branch'))
+        self.assertFalse(log.warning.called)
+
+        log_.record(make_req(), ROUTE, 1000.0, 0.1,
+                    make_calls('Account.getHardware', 'Account.getObject'))
+        message = log.warning.call_args[0][0] % log.warning.call_args[0][1:]
+        self.assertIn('over its budget of 1 calls', message)
+
+    def test_enforced_budget(self, log):
+        log_ = slowlog.SlowRequestLog(0, call_budgets={ROUTE: '1'},
+                                      enforce_budgets=True)
+
+        self.assertRaises(slowlog.CallBudgetExceeded, log_.record,
+                          make_req(), ROUTE, 1000.0, 0.1,
+                          make_calls('Account.getHardware',
+                                     'Account.getObject'))
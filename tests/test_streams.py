@@ -0,0 +1,52 @@
+import unittest
+
+import six
+
+from jumpgate.common.streams import ChunkedStream, copy_stream
+
+
+class TestChunkedStream(unittest.TestCase):
+    def test_iter_chunks(self):
+        stream = ChunkedStream(six.BytesIO(six.b('0123456789')), chunk_size=4)
+
+        self.assertEquals(list(stream),
+                          [six.b('0123'), six.b('4567'), six.b('89')])
+
+    def test_iter_with_length(self):
+        source = six.BytesIO(six.b('0123456789'))
+        source.seek(2)
+        stream = ChunkedStream(source, chunk_size=4, length=5)
+
+        self.assertEquals(list(stream), [six.b('2345'), six.b('6')])
+        self.assertEquals(stream.read(), six.b(''))
+
+    def test_read_bounded_by_length(self):
+        stream = ChunkedStream(six.BytesIO(six.b('0123456789')),
+                               chunk_size=4, length=3)
+
+        self.assertEquals(stream.read(), six.b('012'))
+        self.assertEquals(stream.read(10), six.b(''))
+
+    def test_close(self):
+        source = six.BytesIO(six.b('data'))
+        ChunkedStream(source).close()
+
+        self.assertTrue(source.closed)
+
+
+class TestCopyStream(unittest.TestCase):
+    def test_copy_stream(self):
+        dest = six.BytesIO()
+        written = copy_stream(six.BytesIO(six.b('x' * 10)), dest,
+                              chunk_size=3)
+
+        self.assertEquals(written, 10)
+        self.assertEquals(dest.getvalue(), six.b('x' * 10))
+
+    def test_copy_stream_with_length(self):
+        dest = six.BytesIO()
+        written = copy_stream(six.BytesIO(six.b('x' * 10)), dest,
+                              chunk_size=3, length=4)
+
+        self.assertEquals(written, 4)
+        self.assertEquals(dest.getvalue(), six.b('x' * 4))
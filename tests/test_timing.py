@@ -0,0 +1,102 @@
+import json
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import timing
+from jumpgate.common.exceptions import Forbidden, ResponseException
+from jumpgate.common.hooks import APIHooks
+from jumpgate.common.hooks.core import hook_format
+
+
+def make_req(body=None, is_admin=True):
+    req = MagicMock()
+    req.env = {'is_admin': is_admin}
+    if body is not None:
+        req.stream.read.return_value = body.encode()
+    return req
+
+
+class TestTimed(unittest.TestCase):
+    def setUp(self):
+        timing.set_enabled(True)
+        self.addCleanup(timing.set_enabled, False)
+
+    def test_records(self):
+        req = make_req()
+        hook = MagicMock(return_value='result')
+
+        wrapped = timing.timed('phase', hook)
+
+        self.assertEquals(wrapped(req, 'resp', {'id': 1}), 'result')
+        hook.assert_called_once_with(req, 'resp', {'id': 1})
+        [(phase, duration)] = timing.get_timings(req)
+        self.assertEquals(phase, 'phase')
+        self.assertTrue(duration >= 0)
+        self.assertEquals(
+            timing.PHASE_DURATION.labels('phase').count, 1)
+
+    def test_records_errors(self):
+        req = make_req()
+        wrapped = timing.timed('failing', MagicMock(side_effect=ValueError))
+
+        self.assertRaises(ValueError, wrapped, req, 'resp')
+        self.assertEquals([p for p, _ in timing.get_timings(req)],
+                          ['failing'])
+
+    def test_disabled(self):
+        timing.set_enabled(False)
+        req = make_req()
+
+        timing.timed('phase', MagicMock())(req, 'resp')
+
+        self.assertEquals(timing.get_timings(req), [])
+
+    def test_phase_name(self):
+        self.assertEquals(timing.phase_name(hook_format), 'core.hook_format')
+
+    def test_instrument_hooks(self):
+        req = make_req()
+        req.env['REQUEST_ID'] = 'req-1'
+        req.method = 'GET'
+        resp = MagicMock(body=None, status=200)
+
+        [wrapped] = APIHooks().instrument_hooks([hook_format])
+        wrapped(req, resp)
+
+        self.assertEquals([p for p, _ in timing.get_timings(req)],
+                          ['core.hook_format'])
+
+
+class TestTimingResource(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(timing.set_enabled, False)
+        self.resource = timing.TimingResource()
+
+    def test_get(self):
+        timing.set_enabled(True)
+        resp = MagicMock()
+
+        self.resource.on_get(make_req(), resp)
+
+        self.assertEquals(resp.body, {'timing': {'enabled': True}})
+
+    def test_put(self):
+        resp = MagicMock()
+
+        self.resource.on_put(make_req(json.dumps({'enabled': True})), resp)
+
+        self.assertTrue(timing.enabled())
+        self.assertEquals(resp.body, {'timing': {'enabled': True}})
+
+    def test_put_invalid(self):
+        self.assertRaises(ResponseException, self.resource.on_put,
+                          make_req('{}'), MagicMock())
+
+    @patch('jumpgate.common.timing.set_enabled')
+    def test_admin_only(self, set_enabled):
+        req = make_req(json.dumps({'enabled': True}), is_admin=False)
+
+        self.assertRaises(Forbidden, self.resource.on_get, req, MagicMock())
+        self.assertRaises(Forbidden, self.resource.on_put, req, MagicMock())
+        self.assertFalse(set_enabled.called)
@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from mock import MagicMock, patch
+
+from jumpgate.common import tracing
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+def make_req(traceparent=None):
+    req = MagicMock()
+    req.method = 'GET'
+    req.path = '/v2/1/servers'
+    req.headers = {}
+    if traceparent:
+        req.headers['TRACEPARENT'] = traceparent
+    req.env = {'REQUEST_ID': 'req-1'}
+    return req
+
+
+class TestTraceparent(unittest.TestCase):
+    def test_parse(self):
+        self.assertEquals(
+            tracing.parse_traceparent('00-%s-%s-01' % (TRACE_ID, PARENT_ID)),
+            (TRACE_ID, PARENT_ID, True))
+        self.assertEquals(
+            tracing.parse_traceparent('00-%s-%s-00' % (TRACE_ID, PARENT_ID)),
+            (TRACE_ID, PARENT_ID, False))
+
+    def test_invalid(self):
+        for header in ['', 'garbage', '00-%s-%s-01' % ('0' * 32, PARENT_ID),
+                       'ff-%s-%s-01' % (TRACE_ID, PARENT_ID),
+                       '00-%s-%s-01' % (TRACE_ID, '0' * 16)]:
+            self.assertIsNone(tracing.parse_traceparent(header))
+
+
+class TestSpans(unittest.TestCase):
+    def setUp(self):
+        self.root = tracing.Trace().start('root')
+
+    def test_no_trace(self):
+        with tracing.span('ignored') as span:
+            self.assertIsNone(span)
+        wrapped = tracing.traced('hook', MagicMock(return_value=1))
+        self.assertEquals(wrapped('req'), 1)
+
+    def test_nesting(self):
+        with tracing.activate(self.root):
+            with tracing.span('outer', key='value') as outer:
+                tracing.traced('inner', lambda: None)()
+        self.assertIsNone(tracing.current_span())
+
+        root, outer, inner = self.root.trace.spans
+        self.assertEquals(outer.parent_id, root.span_id)
+        self.assertEquals(outer.attributes, {'key': 'value'})
+        self.assertEquals(inner.name, 'inner')
+        self.assertEquals(inner.parent_id, outer.span_id)
+        self.assertTrue(inner.duration is not None)
+
+    def test_error(self):
+        def fail():
+            with tracing.activate(self.root):
+                with tracing.span('failing'):
+                    raise ValueError('boom')
+
+        self.assertRaises(ValueError, fail)
+        self.assertEquals(self.root.trace.spans[1].error, 'ValueError: boom')
+
+    def test_other_thread(self):
+        def branch():
+            with tracing.activate(self.root):
+                with tracing.span('branch'):
+                    pass
+
+        thread = threading.Thread(target=branch)
+        thread.start()
+        thread.join(5)
+
+        self.assertEquals(self.root.trace.spans[1].parent_id,
+                          self.root.span_id)
+
+
+class TestTraceHooks(unittest.TestCase):
+    def setUp(self):
+        self.exporter = MagicMock()
+        conf = {'tracing': {'enabled': True, 'sample_ratio': 0.0,
+                            'trust_traceparent': True}}
+        for p in [patch('jumpgate.common.tracing.CONF', conf),
+                  patch('jumpgate.common.tracing.get_exporter',
+                        return_value=self.exporter)]:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_incoming_sampled(self):
+        req = make_req('00-%s-%s-01' % (TRACE_ID, PARENT_ID))
+        resp = MagicMock(status='200 OK')
+
+        tracing.start_trace(req, resp, {})
+        root = tracing.current_span()
+        tracing.traced('hook', lambda: None)()
+        req.env['jumpgate.route'] = '/v2/{tenant_id}/servers'
+        tracing.finish_trace(req, resp)
+
+        self.assertIsNone(tracing.current_span())
+        self.assertEquals(root.trace.trace_id, TRACE_ID)
+        self.assertEquals(root.parent_id, PARENT_ID)
+        self.assertEquals(root.attributes['status'], '200')
+        self.assertEquals(root.attributes['route'],
+                          '/v2/{tenant_id}/servers')
+        self.exporter.export.assert_called_once_with(root.trace)
+        self.assertEquals(len(root.trace.finished_spans()), 2)
+
+    def test_incoming_not_sampled(self):
+        req = make_req('00-%s-%s-00' % (TRACE_ID, PARENT_ID))
+
+        tracing.start_trace(req, MagicMock(), {})
+
+        self.assertIsNone(tracing.current_span())
+        tracing.finish_trace(req, MagicMock())
+        self.assertFalse(self.exporter.export.called)
+
+    def test_untrusted_sampled(self):
+        req = make_req('00-%s-%s-01' % (TRACE_ID, PARENT_ID))
+        tracing.CONF['tracing']['trust_traceparent'] = False
+
+        tracing.start_trace(req, MagicMock(), {})
+
+        self.assertIsNone(tracing.current_span())
+        tracing.finish_trace(req, MagicMock())
+        self.assertFalse(self.exporter.export.called)
+
+    @patch('random.random', return_value=0.005)
+    def test_untrusted_joins_trace(self, _):
+        req = make_req('00-%s-%s-00' % (TRACE_ID, PARENT_ID))
+        tracing.CONF['tracing'].update(sample_ratio=0.01,
+                                       trust_traceparent=False)
+
+        tracing.start_trace(req, MagicMock(), {})
+
+        root = tracing.current_span()
+        self.assertEquals(root.trace.trace_id, TRACE_ID)
+        self.assertEquals(root.parent_id, PARENT_ID)
+        tracing.finish_trace(req, MagicMock(status='200 OK'))
+
+    @patch('random.random', return_value=0.005)
+    def test_head_sampling(self, _):
+        req = make_req()
+        tracing.CONF['tracing']['sample_ratio'] = 0.01
+
+        tracing.start_trace(req, MagicMock(), {})
+
+        self.assertEquals(len(tracing.current_span().trace.trace_id), 32)
+        tracing.finish_trace(req, MagicMock(status='200 OK'))
+
+    def test_forgets_leftover_span(self):
+        tracing._local.span = tracing.Trace().start('leftover')
+
+        tracing.start_trace(make_req(), MagicMock(), {})
+
+        self.assertIsNone(tracing.current_span())
+
+
+class TestJsonLinesExporter(unittest.TestCase):
+    def test_export(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'traces.jsonl')
+        root = tracing.Trace(TRACE_ID).start('root', method='GET')
+        root.child('unfinished')
+        root.finish()
+
+        tracing.JsonLinesExporter(path).export(root.trace)
+
+        with open(path) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEquals(len(spans), 1)
+        self.assertEquals(spans[0]['trace_id'], TRACE_ID)
+        self.assertEquals(spans[0]['name'], 'root')
+        self.assertEquals(spans[0]['attributes'], {'method': 'GET'})
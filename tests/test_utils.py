@@ -1,5 +1,6 @@
 import unittest
 
+from jumpgate.common import utils
 from jumpgate.common.utils import lookup
 
 
@@ -10,3 +11,15 @@ class TestLookup(unittest.TestCase):
         self.assertEquals(lookup({'key': 'value'}, 'key'), 'value')
         self.assertEquals(
             lookup({'key': {'key': 'value'}}, 'key', 'key'), 'value')
+
+
+class TestResetState(unittest.TestCase):
+    def test_reset_state(self):
+        calls = []
+        func = utils.on_reset(lambda: calls.append(1))
+        try:
+            utils.reset_state()
+        finally:
+            utils._reset_handlers.remove(func)
+
+        self.assertEqual(calls, [1])
@@ -1,10 +1,12 @@
 from mock import patch
+import logging
 import os.path
 import unittest
 
 import falcon
 
-from jumpgate.wsgi import make_api
+from jumpgate.common.sl import scheduler
+from jumpgate.wsgi import make_api, PROJECT
 
 DIR_PATH = os.path.dirname(__file__)
 TEST_CFG_LOC = os.path.join(DIR_PATH, 'test.jumpgate.conf')
@@ -17,3 +19,13 @@ class TestWSGI(unittest.TestCase):
 
         self.assertTrue(hasattr(new_api, '__call__'))
         self.assertIsInstance(new_api, falcon.API)
+
+    @patch('os.environ', {'JUMPGATE_CONFIG': TEST_CFG_LOC})
+    def test_make_api_again(self):
+        make_api()
+        scheduler.get_scheduler()
+        make_api()
+
+        self.assertIsNone(scheduler._scheduler)
+        handlers = logging.getLogger(PROJECT).handlers
+        self.assertEqual(len(handlers), 1)
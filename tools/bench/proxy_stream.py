@@ -0,0 +1,181 @@
+"""Benchmark streaming a large body through the OpenStack proxy path.
+
+Starts a local upstream server and a Jumpgate OpenStackResponder in this
+process, then downloads and uploads a body of the requested size through
+the proxy while sampling the resident set size. With the proxy streaming
+through fixed-size buffers RSS should stay flat regardless of body size.
+
+    python tools/bench/proxy_stream.py --size 4096 --chunked
+"""
+import argparse
+import os
+import resource
+import sys
+import threading
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+import falcon
+import requests
+from six.moves import socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from jumpgate.common.hooks.core import hook_format, hook_set_uuid  # noqa
+from jumpgate.common.openstack import OpenStackResponder  # noqa
+
+MB = 1024 * 1024
+CHUNK = 64 * 1024
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def serve(app):
+    server = make_server('127.0.0.1', 0, app,
+                         server_class=ThreadingWSGIServer,
+                         handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def upstream_app(size, chunked):
+    block = b'\0' * CHUNK
+
+    def app(environ, start_response):
+        if environ['REQUEST_METHOD'] == 'PUT':
+            received = 0
+            stream = environ['wsgi.input']
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            while received < length:
+                data = stream.read(min(CHUNK, length - received))
+                if not data:
+                    break
+                received += len(data)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [str(received).encode()]
+
+        headers = [('Content-Type', 'application/octet-stream')]
+        if not chunked:
+            headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+
+        def body():
+            remaining = size
+            while remaining > 0:
+                yield block[:min(CHUNK, remaining)]
+                remaining -= CHUNK
+        return body()
+    return app
+
+
+def sample(label, samples, transferred):
+    samples.append(rss_mb())
+    sys.stdout.write('\r%s: %6d MB transferred, RSS %.1f MB' %
+                     (label, transferred // MB, samples[-1]))
+    sys.stdout.flush()
+
+
+def download(url, size):
+    samples = [rss_mb()]
+    start = time.time()
+    received = 0
+    resp = requests.get(url, stream=True)
+    for chunk in resp.iter_content(CHUNK):
+        received += len(chunk)
+        if received % (256 * MB) == 0:
+            sample('download', samples, received)
+    elapsed = time.time() - start
+    sample('download', samples, received)
+    print('')
+    assert received == size, 'received %s of %s bytes' % (received, size)
+    return elapsed, samples
+
+
+class ZeroStream(object):
+    """File-like request body of the given size which samples RSS as it
+    is read.
+    """
+
+    def __init__(self, size, samples):
+        self.size = size
+        self.sent = 0
+        self.samples = samples
+
+    def __len__(self):
+        return self.size
+
+    def read(self, amt=CHUNK):
+        amt = min(amt, self.size - self.sent)
+        before = self.sent
+        self.sent += amt
+        if self.sent // (256 * MB) != before // (256 * MB):
+            sample('upload', self.samples, self.sent)
+        return b'\0' * amt
+
+
+def upload(url, size):
+    samples = [rss_mb()]
+    body = ZeroStream(size, samples)
+
+    start = time.time()
+    resp = requests.put(url, data=body)
+    elapsed = time.time() - start
+    sample('upload', samples, body.sent)
+    print('')
+    assert int(resp.text) == size, 'upstream got %s bytes' % resp.text
+    return elapsed, samples
+
+
+def report(label, size, elapsed, samples):
+    print('%s: %.1f MB/s, RSS min %.1f MB, max %.1f MB, growth %.1f MB' % (
+        label, size / MB / elapsed, min(samples), max(samples),
+        max(samples) - samples[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=2048,
+                        help='body size in MB (default 2048)')
+    parser.add_argument('--chunked', action='store_true',
+                        help='have the upstream send a chunked response')
+    args = parser.parse_args()
+    size = args.size * MB
+
+    upstream = serve(upstream_app(size, args.chunked))
+    upstream_url = 'http://127.0.0.1:%s' % upstream.server_port
+
+    api = falcon.API(before=[hook_set_uuid], after=[hook_format])
+    api.add_route('/blob', OpenStackResponder(None, upstream_url))
+    proxy = serve(api)
+    url = 'http://127.0.0.1:%s/blob' % proxy.server_port
+
+    try:
+        report('download', size, *download(url, size))
+        report('upload', size, *upload(url, size))
+    finally:
+        proxy.shutdown()
+        upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()